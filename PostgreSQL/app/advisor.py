@@ -0,0 +1,303 @@
+import argparse
+import json
+import os
+import re
+import sys
+
+import psycopg2
+from psycopg2 import sql
+
+from .databases import TemplateDatabase, search_path_options
+from .models import (
+    SELECT_ALL_NAMES,
+    DELETE_NAME_BY_ID,
+    DELETE_BY_REF_ID,
+    LEFT_JOIN_ON_ID,
+    UPDATE_NAME_BY_ID,
+    INNER_JOIN_ON_ID,
+    RIGHT_JOIN_ON_ID,
+    FULL_OUTER_JOIN_ON_ID,
+)
+
+PLANNED_QUERIES = {
+    "SELECT_ALL_NAMES": (SELECT_ALL_NAMES, None),
+    "LEFT_JOIN_ON_ID": (LEFT_JOIN_ON_ID, None),
+    "INNER_JOIN_ON_ID": (INNER_JOIN_ON_ID, None),
+    "RIGHT_JOIN_ON_ID": (RIGHT_JOIN_ON_ID, None),
+    "FULL_OUTER_JOIN_ON_ID": (FULL_OUTER_JOIN_ON_ID, None),
+    "UPDATE_NAME_BY_ID": (UPDATE_NAME_BY_ID, ("advisor", 1)),
+    "DELETE_NAME_BY_ID": (DELETE_NAME_BY_ID, (1,)),
+    "DELETE_BY_REF_ID": (DELETE_BY_REF_ID, (1,)),
+}
+
+SEED_EXAMPLES = """
+INSERT INTO example (name)
+SELECT md5(i::text) FROM generate_series(1, %s) AS i;
+"""
+
+SEED_ANOTHER_EXAMPLES = """
+INSERT INTO another_example (ref_id, description)
+SELECT id, 'Description for ' || name FROM example WHERE id % 2 = 0;
+"""
+
+TABLE_ROWS = """
+SELECT relname, reltuples::bigint FROM pg_class WHERE relkind = 'r';
+"""
+
+INDEXED_COLUMNS = """
+SELECT t.relname, a.attname
+FROM pg_index i
+JOIN pg_class t ON t.oid = i.indrelid
+JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = i.indkey[0]
+WHERE t.relname = ANY(%s);
+"""
+
+DEFAULT_ROWS = 10000
+DEFAULT_MIN_ROWS = 1000
+COST_TOLERANCE = 1.25
+
+_QUALIFIED_COLUMN = re.compile(r"\b(\w+)\.(\w+)\b")
+_FILTER_COLUMN = re.compile(r"\(?(\w+) = ")
+
+
+def seed(conn, rows=DEFAULT_ROWS):
+    with conn.cursor() as cursor:
+        cursor.execute(SEED_EXAMPLES, (rows,))
+        cursor.execute(SEED_ANOTHER_EXAMPLES)
+        cursor.execute("ANALYZE example;")
+        cursor.execute("ANALYZE another_example;")
+    conn.commit()
+
+
+def capture_plan(conn, query, params=None):
+    with conn.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + query.strip(), params)
+        plan = cursor.fetchone()[0][0]["Plan"]
+    return plan
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def summarize(plan):
+    return {
+        "cost": plan["Total Cost"],
+        "nodes": sorted(
+            (
+                "%s on %s" % (node["Node Type"], node["Relation Name"])
+                if "Relation Name" in node
+                else node["Node Type"]
+            )
+            for node in plan_nodes(plan)
+        ),
+    }
+
+
+def table_rows(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(TABLE_ROWS)
+        return dict(cursor.fetchall())
+
+
+def find_issues(plan, rows_by_table, min_rows=DEFAULT_MIN_ROWS):
+    issues = []
+    for node in plan_nodes(plan):
+        if node["Node Type"] == "Seq Scan":
+            rows = rows_by_table.get(node["Relation Name"], node["Plan Rows"])
+            if rows < min_rows:
+                continue
+            issues.append(
+                {
+                    "node": "Seq Scan",
+                    "relation": node["Relation Name"],
+                    "rows": rows,
+                    "filter": node.get("Filter"),
+                }
+            )
+        elif node["Node Type"] == "Sort" and node["Plan Rows"] >= min_rows:
+            issues.append(
+                {
+                    "node": "Sort",
+                    "rows": node["Plan Rows"],
+                    "sort_key": node["Sort Key"],
+                    "relation": next(
+                        (
+                            child["Relation Name"]
+                            for child in plan_nodes(node)
+                            if "Relation Name" in child
+                        ),
+                        None,
+                    ),
+                }
+            )
+    return issues
+
+
+def _candidate_columns(plan, issue):
+    if issue["node"] == "Sort":
+        for key in issue["sort_key"]:
+            column = key.split(".")[-1].split(" ")[0]
+            yield issue["relation"], column
+        return
+    if issue["filter"]:
+        for column in _FILTER_COLUMN.findall(issue["filter"]):
+            yield issue["relation"], column
+    for node in plan_nodes(plan):
+        for key in ("Hash Cond", "Merge Cond", "Join Filter"):
+            for table, column in _QUALIFIED_COLUMN.findall(node.get(key, "")):
+                if table == issue["relation"]:
+                    yield table, column
+
+
+def indexed_columns(conn, tables):
+    with conn.cursor() as cursor:
+        cursor.execute(INDEXED_COLUMNS, (list(tables),))
+        indexed = set(cursor.fetchall())
+    return indexed
+
+
+def propose_indexes(conn, plans, min_rows=DEFAULT_MIN_ROWS):
+    rows_by_table = table_rows(conn)
+    candidates = []
+    for plan in plans.values():
+        for issue in find_issues(plan, rows_by_table, min_rows):
+            for candidate in _candidate_columns(plan, issue):
+                if candidate not in candidates:
+                    candidates.append(candidate)
+    indexed = indexed_columns(conn, {table for table, _ in candidates})
+    return [candidate for candidate in candidates if candidate not in indexed]
+
+
+def index_statement(table, column, concurrently=False):
+    create = "CREATE INDEX CONCURRENTLY" if concurrently else "CREATE INDEX"
+    return sql.SQL(create + " IF NOT EXISTS {} ON {} ({});").format(
+        sql.Identifier("%s_%s_idx" % (table, column)),
+        sql.Identifier(table),
+        sql.Identifier(column),
+    )
+
+
+def capture_plans(conn, queries=PLANNED_QUERIES):
+    return {
+        name: capture_plan(conn, query, params)
+        for name, (query, params) in queries.items()
+    }
+
+
+def advise(conn, min_rows=DEFAULT_MIN_ROWS, keep=False):
+    plans = capture_plans(conn)
+    rows_by_table = table_rows(conn)
+    report = {
+        "queries": {
+            name: dict(
+                summarize(plan), issues=find_issues(plan, rows_by_table, min_rows)
+            )
+            for name, plan in plans.items()
+        },
+        "proposals": [],
+    }
+    for table, column in propose_indexes(conn, plans, min_rows):
+        statement = index_statement(table, column)
+        proposal = {
+            "table": table,
+            "column": column,
+            "statement": statement.as_string(conn),
+            "improves": [],
+        }
+        with conn.cursor() as cursor:
+            cursor.execute(statement)
+            cursor.execute(sql.SQL("ANALYZE {};").format(sql.Identifier(table)))
+        after = capture_plans(conn)
+        # A freshly built index looks cheaper than one maintained by inserts,
+        # so small gains here don't survive in a live table.
+        proposal["improves"] = sorted(
+            name
+            for name in plans
+            if after[name]["Total Cost"] * COST_TOLERANCE <= plans[name]["Total Cost"]
+        )
+        if keep and proposal["improves"]:
+            conn.commit()
+            plans = after
+        else:
+            conn.rollback()
+        report["proposals"].append(proposal)
+    return report
+
+
+def is_regression(baseline, current, tolerance=COST_TOLERANCE):
+    if current["cost"] > baseline["cost"] * tolerance:
+        return True
+    lost_index = any(
+        node.startswith("Index") and node not in current["nodes"]
+        for node in baseline["nodes"]
+    )
+    return lost_index
+
+
+def apply_proposals(url, proposals):
+    # CONCURRENTLY builds each index without blocking writes to the live
+    # table, which needs autocommit.
+    applied = []
+    conn = psycopg2.connect(url)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            for proposal in proposals:
+                if not proposal["improves"]:
+                    continue
+                statement = index_statement(
+                    proposal["table"], proposal["column"], concurrently=True
+                )
+                cursor.execute(statement)
+                applied.append(statement.as_string(conn))
+    finally:
+        conn.close()
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Seed a scratch database and review the models.py query plans."
+    )
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS)
+    parser.add_argument("--min-rows", type=int, default=DEFAULT_MIN_ROWS)
+    parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="Create the indexes that lowered a cost in DATABASE_URL itself.",
+    )
+    parser.add_argument("--write-baseline")
+    args = parser.parse_args(argv)
+
+    template = TemplateDatabase(os.environ["DATABASE_URL"]).build()
+    url = template.create()
+    try:
+        conn = psycopg2.connect(url, **search_path_options("public"))
+        try:
+            seed(conn, args.rows)
+            report = advise(conn, args.min_rows, keep=args.apply)
+            if args.write_baseline:
+                baseline = {
+                    name: summarize(plan) for name, plan in capture_plans(conn).items()
+                }
+                with open(args.write_baseline, "w") as f:
+                    json.dump(baseline, f, indent=2, sort_keys=True)
+                    f.write("\n")
+        finally:
+            conn.close()
+    finally:
+        template.drop(url)
+        template.destroy()
+    if args.apply:
+        report["applied"] = apply_proposals(
+            os.environ["DATABASE_URL"], report["proposals"]
+        )
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
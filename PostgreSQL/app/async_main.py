@@ -0,0 +1,282 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from itertools import islice
+from uuid import uuid4
+from psycopg_pool import AsyncConnectionPool
+from .databases import search_path_options
+from .models import (
+    ADD_FOREIGN_KEY_CONSTRAINT,
+    DELETE_BY_REF_ID,
+    INSERT_INVALID_DATE_FORMAT,
+    INSERT_INVALID_FOREIGN_KEY,
+    INSERT_NAME,
+    INVALID_JOIN_QUERY,
+    REMOVE_FOREIGN_KEY_CONSTRAINT,
+    SELECT_ALL_NAMES,
+    DELETE_NAME_BY_ID,
+    INSERT_DESCRIPTION,
+    LEFT_JOIN_ON_ID,
+    UPDATE_NAME_BY_ID,
+    INNER_JOIN_ON_ID,
+    RIGHT_JOIN_ON_ID,
+    FULL_OUTER_JOIN_ON_ID,
+    INSERT_NAMES_BULK,
+    COPY_DESCRIPTIONS,
+)
+
+DATABASE_URL = os.environ["DATABASE_URL"]
+DATABASE_SCHEMA = os.environ.get("DATABASE_SCHEMA")
+
+POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+POOL_IDLE_TIMEOUT = float(os.environ.get("DB_POOL_IDLE_TIMEOUT", "300"))
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get("DB_POOL_CHECKOUT_TIMEOUT", "30"))
+
+DEFAULT_ITERSIZE = 2000
+
+_pool = None
+_pool_lock = None
+_shared_connection = ContextVar("shared_connection", default=None)
+
+
+def _get_pool_lock():
+    # Created lazily so the lock binds to the running event loop.
+    global _pool_lock
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    return _pool_lock
+
+
+async def get_pool():
+    global _pool
+    if _pool is None:
+        async with _get_pool_lock():
+            if _pool is None:
+                pool = AsyncConnectionPool(
+                    DATABASE_URL,
+                    min_size=POOL_MIN_SIZE,
+                    max_size=POOL_MAX_SIZE,
+                    max_idle=POOL_IDLE_TIMEOUT,
+                    timeout=POOL_CHECKOUT_TIMEOUT,
+                    check=AsyncConnectionPool.check_connection,
+                    kwargs=search_path_options(DATABASE_SCHEMA),
+                    open=False,
+                )
+                await pool.open()
+                _pool = pool
+    return _pool
+
+
+async def close_pool():
+    global _pool, _pool_lock
+    async with _get_pool_lock():
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
+    _pool_lock = None
+
+
+async def use_database(url):
+    global DATABASE_URL
+    await close_pool()
+    DATABASE_URL = url
+
+
+async def use_schema(schema):
+    global DATABASE_SCHEMA
+    await close_pool()
+    DATABASE_SCHEMA = schema
+
+
+async def pool_stats():
+    return (await get_pool()).get_stats()
+
+
+@asynccontextmanager
+async def connect():
+    shared = _shared_connection.get()
+    if shared is not None:
+        yield shared
+        return
+    pool = await get_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def unit_of_work():
+    shared = _shared_connection.get()
+    if shared is not None:
+        async with shared.transaction():
+            yield shared
+        return
+    async with connect() as conn:
+        token = _shared_connection.set(conn)
+        try:
+            async with conn.transaction():
+                yield conn
+        finally:
+            _shared_connection.reset(token)
+
+
+async def remove_foreign_key_constraint():
+    async with connect() as conn:
+        await conn.execute(REMOVE_FOREIGN_KEY_CONSTRAINT)
+
+
+async def add_foreign_key_constraint():
+    async with connect() as conn:
+        await conn.execute(ADD_FOREIGN_KEY_CONSTRAINT)
+
+
+async def delete_another_example_by_ref_id(ref_id):
+    async with connect() as conn:
+        await conn.execute(DELETE_BY_REF_ID, (ref_id,))
+
+
+async def create_example(name):
+    async with connect() as conn:
+        cursor = await conn.execute(INSERT_NAME, (name,))
+        id_of_new_row = (await cursor.fetchone())[0]
+    return id_of_new_row
+
+
+async def list_examples():
+    async with connect() as conn:
+        cursor = await conn.execute(SELECT_ALL_NAMES)
+        result = await cursor.fetchall()
+    return result
+
+
+async def create_another_example(ref_id, description):
+    async with connect() as conn:
+        await conn.execute(INSERT_DESCRIPTION, (ref_id, description))
+
+
+async def create_examples_bulk(names, chunk_size=1000):
+    ids = []
+    iterator = iter(names)
+    async with connect() as conn:
+        async with conn.cursor() as cursor:
+            while True:
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                query = INSERT_NAMES_BULK % ", ".join(["(%s)"] * len(chunk))
+                await cursor.execute(query, chunk)
+                ids.extend(row[0] for row in await cursor.fetchall())
+    return ids
+
+
+async def create_another_examples_bulk(rows, chunk_size=1000):
+    count = 0
+    async with connect() as conn:
+        async with conn.cursor() as cursor:
+            async with cursor.copy(COPY_DESCRIPTIONS) as copy:
+                for row in rows:
+                    await copy.write_row(row)
+                    count += 1
+                    if count % chunk_size == 0:
+                        # Yield to the event loop between chunks.
+                        await asyncio.sleep(0)
+    return count
+
+
+async def get_left_join_on_id():
+    async with connect() as conn:
+        cursor = await conn.execute(LEFT_JOIN_ON_ID)
+        results = await cursor.fetchall()
+    return results
+
+
+async def update_example_by_id(id, new_name):
+    async with connect() as conn:
+        cursor = await conn.execute(UPDATE_NAME_BY_ID, (new_name, id))
+        if cursor.rowcount == 0:
+            raise Exception("Record not found")
+
+
+async def delete_example_by_id(id):
+    async with connect() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(DELETE_BY_REF_ID, (id,))
+            await cursor.execute(DELETE_NAME_BY_ID, (id,))
+            if cursor.rowcount == 0:
+                raise Exception("Record not found")
+
+
+async def get_inner_join_on_id():
+    async with connect() as conn:
+        cursor = await conn.execute(INNER_JOIN_ON_ID)
+        results = await cursor.fetchall()
+    return results
+
+
+async def get_right_join_on_id():
+    async with connect() as conn:
+        cursor = await conn.execute(RIGHT_JOIN_ON_ID)
+        results = await cursor.fetchall()
+    return results
+
+
+async def get_full_outer_join_on_id():
+    async with connect() as conn:
+        cursor = await conn.execute(FULL_OUTER_JOIN_ON_ID)
+        results = await cursor.fetchall()
+    return results
+
+
+async def _stream(query, itersize):
+    async with connect() as conn:
+        async with conn.cursor(name="stream_%s" % uuid4().hex) as cursor:
+            cursor.itersize = itersize
+            await cursor.execute(query)
+            async for row in cursor:
+                yield row
+
+
+def iter_examples(itersize=DEFAULT_ITERSIZE):
+    return _stream(SELECT_ALL_NAMES, itersize)
+
+
+def iter_left_join_on_id(itersize=DEFAULT_ITERSIZE):
+    return _stream(LEFT_JOIN_ON_ID, itersize)
+
+
+def iter_inner_join_on_id(itersize=DEFAULT_ITERSIZE):
+    return _stream(INNER_JOIN_ON_ID, itersize)
+
+
+def iter_right_join_on_id(itersize=DEFAULT_ITERSIZE):
+    return _stream(RIGHT_JOIN_ON_ID, itersize)
+
+
+def iter_full_outer_join_on_id(itersize=DEFAULT_ITERSIZE):
+    return _stream(FULL_OUTER_JOIN_ON_ID, itersize)
+
+
+async def execute_invalid_join_query(conn):
+    await conn.execute(INVALID_JOIN_QUERY)
+    await conn.commit()
+
+
+async def insert_invalid_foreign_key(conn):
+    await conn.execute(INSERT_INVALID_FOREIGN_KEY)
+    await conn.commit()
+
+
+async def insert_invalid_date_format(conn):
+    await conn.execute(INSERT_INVALID_DATE_FORMAT)
+    await conn.commit()
+
+
+async def insert_duplicate_user(conn):
+    await conn.execute(
+        "INSERT INTO users (username, email) VALUES ('testuser', 'test@email.com');"
+    )
+
+    await conn.execute(
+        "INSERT INTO users (username, email) VALUES ('testuser', 'test2@email.com');"
+    )
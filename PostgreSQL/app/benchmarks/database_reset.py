@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import psycopg2
+from app.databases import TemplateDatabase, create_schema, truncate_tables
+from app.models import INSERT_NAME
+
+DATABASE_URL = os.environ["DATABASE_URL"]
+
+
+def seed(conn, rows):
+    with conn.cursor() as cursor:
+        for i in range(rows):
+            cursor.execute(INSERT_NAME, ("reset %d" % i,))
+    conn.commit()
+
+
+def drop_and_create(rows):
+    conn = psycopg2.connect(DATABASE_URL)
+    create_schema(conn)
+    seed(conn, rows)
+    with conn.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS another_example;")
+        cursor.execute("DROP TABLE IF EXISTS example;")
+    conn.commit()
+    conn.close()
+
+
+def from_template(template, rows):
+    url = template.create()
+    conn = psycopg2.connect(url)
+    seed(conn, rows)
+    conn.close()
+    template.drop(url)
+
+
+def truncate(conn, rows):
+    seed(conn, rows)
+    truncate_tables(conn)
+
+
+def measure(label, reset, cycles):
+    start = time.perf_counter()
+    for _ in range(cycles):
+        reset()
+    elapsed = (time.perf_counter() - start) / cycles * 1000
+    print("%-20s %10.2f ms/test" % (label, elapsed))
+
+
+def main(cycles=20, rows=100):
+    template = TemplateDatabase(DATABASE_URL).build()
+    conn = psycopg2.connect(DATABASE_URL)
+    create_schema(conn)
+    truncate_tables(conn)
+
+    print("%d cycles, %d rows seeded per test" % (cycles, rows))
+    measure("create/drop tables", lambda: drop_and_create(rows), cycles)
+    measure("template database", lambda: from_template(template, rows), cycles)
+    create_schema(conn)
+    measure("truncate", lambda: truncate(conn, rows), cycles)
+
+    conn.close()
+    template.destroy()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import psycopg2
+from app import statements
+from app.models import (
+    CREATE_ANOTHER_TABLE,
+    CREATE_TABLE,
+    FULL_OUTER_JOIN_ON_ID,
+    INSERT_NAME,
+    LEFT_JOIN_ON_ID,
+    UPDATE_NAME_BY_ID,
+)
+
+DATABASE_URL = os.environ["DATABASE_URL"]
+
+
+def time_calls(conn, execute, query, params, iterations):
+    with conn.cursor() as cursor:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            execute(cursor, query, params)
+        elapsed = time.perf_counter() - start
+    conn.rollback()
+    return elapsed / iterations * 1e6
+
+
+def main(iterations=2000):
+    conn = psycopg2.connect(DATABASE_URL)
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        cursor.execute(CREATE_ANOTHER_TABLE)
+        cursor.execute(INSERT_NAME, ("benchmark",))
+        id = cursor.fetchone()[0]
+    conn.commit()
+
+    cache = statements.PreparedStatementCache()
+    cases = [
+        ("INSERT_NAME", INSERT_NAME, ("benchmark",)),
+        ("UPDATE_NAME_BY_ID", UPDATE_NAME_BY_ID, ("benchmark", id)),
+        ("LEFT_JOIN_ON_ID", LEFT_JOIN_ON_ID, None),
+        ("FULL_OUTER_JOIN_ON_ID", FULL_OUTER_JOIN_ON_ID, None),
+    ]
+
+    print("%-24s %12s %12s %10s" % ("statement", "plain (us)", "prepared", "saved"))
+    for name, query, params in cases:
+        plain = time_calls(
+            conn,
+            lambda cursor, q, p: cursor.execute(q, p),
+            query,
+            params,
+            iterations,
+        )
+        prepared = time_calls(conn, cache.execute, query, params, iterations)
+        print(
+            "%-24s %12.1f %12.1f %9.1f%%"
+            % (name, plain, prepared, (plain - prepared) / plain * 100)
+        )
+
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM example WHERE id = %s;", (id,))
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
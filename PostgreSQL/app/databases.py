@@ -0,0 +1,175 @@
+import os
+import re
+from urllib.parse import urlsplit, urlunsplit
+from uuid import uuid4
+
+import psycopg2
+from psycopg2 import sql
+
+from .models import (
+    CREATE_ANOTHER_TABLE,
+    CREATE_INDEX_ANOTHER_EXAMPLE_REF_ID,
+    CREATE_TABLE,
+    CREATE_TABLE_EVENTS,
+    CREATE_TABLE_USERS,
+    CREATE_TABLE_ORDERS,
+)
+
+SCHEMA = (
+    CREATE_TABLE,
+    CREATE_ANOTHER_TABLE,
+    CREATE_INDEX_ANOTHER_EXAMPLE_REF_ID,
+    CREATE_TABLE_USERS,
+    CREATE_TABLE_ORDERS,
+    CREATE_TABLE_EVENTS,
+)
+
+TABLES = ("another_example", "example", "orders", "users", "events")
+
+_SCHEMA_NAME = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def database_name(url):
+    return urlsplit(url).path.lstrip("/")
+
+
+def with_database(url, name):
+    return urlunsplit(urlsplit(url)._replace(path="/" + name))
+
+
+def worker_schema():
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    return "test_%s" % worker if worker else None
+
+
+def search_path_options(schema):
+    if not schema:
+        return {}
+    if not _SCHEMA_NAME.match(schema):
+        raise ValueError("Invalid schema name: %r" % schema)
+    return {"options": "-c search_path=%s" % schema}
+
+
+def create_namespace(url, schema):
+    conn = psycopg2.connect(url)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("CREATE SCHEMA IF NOT EXISTS {};").format(
+                    sql.Identifier(schema)
+                )
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def drop_namespace(url, schema):
+    conn = psycopg2.connect(url)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE;").format(
+                    sql.Identifier(schema)
+                )
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def create_schema(conn):
+    with conn.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    conn.commit()
+
+
+def truncate_tables(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            sql.SQL("TRUNCATE {} RESTART IDENTITY CASCADE;").format(
+                sql.SQL(", ").join(map(sql.Identifier, TABLES))
+            )
+        )
+    conn.commit()
+
+
+class TemplateDatabase:
+    def __init__(self, url, name=None):
+        self.url = url
+        self.name = name or "%s_template" % database_name(url)
+
+    def _admin(self):
+        conn = psycopg2.connect(self.url)
+        conn.autocommit = True
+        return conn
+
+    def _drop(self, cursor, name):
+        cursor.execute(
+            sql.SQL("DROP DATABASE IF EXISTS {};").format(sql.Identifier(name))
+        )
+
+    def build(self):
+        self.destroy()
+        admin = self._admin()
+        try:
+            with admin.cursor() as cursor:
+                cursor.execute(
+                    sql.SQL("CREATE DATABASE {};").format(sql.Identifier(self.name))
+                )
+            conn = psycopg2.connect(
+                with_database(self.url, self.name), **search_path_options("public")
+            )
+            try:
+                create_schema(conn)
+            finally:
+                conn.close()
+            with admin.cursor() as cursor:
+                cursor.execute(
+                    sql.SQL("ALTER DATABASE {} IS_TEMPLATE true;").format(
+                        sql.Identifier(self.name)
+                    )
+                )
+        finally:
+            admin.close()
+        return self
+
+    def create(self, name=None):
+        name = name or "%s_%s" % (self.name, uuid4().hex[:12])
+        admin = self._admin()
+        try:
+            with admin.cursor() as cursor:
+                cursor.execute(
+                    sql.SQL("CREATE DATABASE {} TEMPLATE {};").format(
+                        sql.Identifier(name), sql.Identifier(self.name)
+                    )
+                )
+        finally:
+            admin.close()
+        return with_database(self.url, name)
+
+    def drop(self, url):
+        admin = self._admin()
+        try:
+            with admin.cursor() as cursor:
+                self._drop(cursor, database_name(url))
+        finally:
+            admin.close()
+
+    def destroy(self):
+        admin = self._admin()
+        try:
+            with admin.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM pg_database WHERE datname = %s;", (self.name,)
+                )
+                if cursor.fetchone():
+                    cursor.execute(
+                        sql.SQL("ALTER DATABASE {} IS_TEMPLATE false;").format(
+                            sql.Identifier(self.name)
+                        )
+                    )
+                    self._drop(cursor, self.name)
+        finally:
+            admin.close()
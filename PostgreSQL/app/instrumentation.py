@@ -0,0 +1,213 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("DB_INSTRUMENTATION", "1") != "0"
+SLOW_QUERY_MS = (
+    float(os.environ["DB_SLOW_QUERY_MS"])
+    if os.environ.get("DB_SLOW_QUERY_MS")
+    else None
+)
+SAMPLE_SIZE = 10000
+SLOW_LOG_SIZE = 100
+
+QUANTILES = (0.5, 0.95, 0.99)
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(sorted_samples, quantile):
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(quantile * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+class _Series:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.rows = 0
+        self.errors = 0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, elapsed, rows=0, error=False):
+        self.count += 1
+        self.total += elapsed
+        self.rows += max(rows, 0)
+        self.errors += int(error)
+        self.samples.append(elapsed)
+
+    def summary(self):
+        samples = sorted(self.samples)
+        summary = {
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total": self.total,
+        }
+        for quantile in QUANTILES:
+            summary["p%d" % int(quantile * 100)] = percentile(samples, quantile)
+        return summary
+
+
+class QueryRecorder:
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._statements = {}
+        self._connect = _Series()
+        self._slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+
+    def record(self, name, elapsed, rows=0, error=False):
+        with self._lock:
+            series = self._statements.get(name)
+            if series is None:
+                series = self._statements[name] = _Series()
+            series.add(elapsed, rows, error)
+
+    def record_connect(self, elapsed):
+        with self._lock:
+            self._connect.add(elapsed)
+
+    def is_slow(self, elapsed):
+        return self.slow_query_ms is not None and elapsed * 1000 >= self.slow_query_ms
+
+    def record_slow_query(self, name, elapsed, plan):
+        entry = {
+            "statement": name,
+            "duration": elapsed,
+            "plan": plan,
+            "timestamp": time.time(),
+        }
+        with self._lock:
+            self._slow_queries.append(entry)
+        logger.warning("Slow query %s took %.1f ms", name, elapsed * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "statements": {
+                    name: series.summary()
+                    for name, series in sorted(self._statements.items())
+                },
+                "connect": self._connect.summary(),
+                "slow_queries": list(self._slow_queries),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._connect = _Series()
+            self._slow_queries.clear()
+
+
+def explain(conn, query, params=None):
+    # EXPLAIN ANALYZE executes the statement, so undo its side effects.
+    with conn.cursor() as cursor:
+        cursor.execute("SAVEPOINT explain_slow_query;")
+        try:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query.strip(), params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query;")
+            cursor.execute("RELEASE SAVEPOINT explain_slow_query;")
+    return plan
+
+
+recorder = QueryRecorder()
+
+
+@contextmanager
+def measure(name, cursor, query, params=None):
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        recorder.record(name, time.perf_counter() - start, error=True)
+        raise
+    elapsed = time.perf_counter() - start
+    recorder.record(name, elapsed, cursor.rowcount)
+    if recorder.is_slow(elapsed) and query.lstrip().upper().startswith(EXPLAINABLE):
+        try:
+            plan = explain(cursor.connection, query, params)
+        except Exception:
+            logger.exception("Could not explain slow query %s", name)
+            plan = None
+        recorder.record_slow_query(name, elapsed, plan)
+
+
+class JsonFileExporter:
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, snapshot):
+        with open(self.path, "w") as f:
+            json.dump(snapshot, f, indent=2, sort_keys=True)
+
+
+class PrometheusExporter:
+    def __init__(self, path=None, prefix="db"):
+        self.path = path
+        self.prefix = prefix
+
+    def _labels(self, labels):
+        if not labels:
+            return ""
+        return "{%s}" % ",".join('%s="%s"' % label for label in labels)
+
+    def _summary(self, lines, metric, labels, summary):
+        for quantile in QUANTILES:
+            lines.append(
+                "%s%s %.9f"
+                % (
+                    metric,
+                    self._labels(labels + [("quantile", quantile)]),
+                    summary["p%d" % int(quantile * 100)],
+                )
+            )
+        lines.append("%s_sum%s %.9f" % (metric, self._labels(labels), summary["total"]))
+        lines.append("%s_count%s %d" % (metric, self._labels(labels), summary["count"]))
+
+    def render(self, snapshot):
+        query_metric = "%s_query_duration_seconds" % self.prefix
+        rows_metric = "%s_query_rows_total" % self.prefix
+        errors_metric = "%s_query_errors_total" % self.prefix
+        connect_metric = "%s_connect_duration_seconds" % self.prefix
+        lines = [
+            "# HELP %s Statement execution time by models.py constant." % query_metric,
+            "# TYPE %s summary" % query_metric,
+        ]
+        for name, summary in snapshot["statements"].items():
+            self._summary(lines, query_metric, [("statement", name)], summary)
+        for metric, key, help_text in (
+            (rows_metric, "rows", "Rows returned or affected by statement."),
+            (errors_metric, "errors", "Statements that raised an error."),
+        ):
+            lines.append("# HELP %s %s" % (metric, help_text))
+            lines.append("# TYPE %s counter" % metric)
+            for name, summary in snapshot["statements"].items():
+                lines.append(
+                    "%s%s %d"
+                    % (metric, self._labels([("statement", name)]), summary[key])
+                )
+        lines.append("# HELP %s Time spent opening connections." % connect_metric)
+        lines.append("# TYPE %s summary" % connect_metric)
+        self._summary(lines, connect_metric, [], snapshot["connect"])
+        return "\n".join(lines) + "\n"
+
+    def export(self, snapshot):
+        text = self.render(snapshot)
+        if self.path:
+            with open(self.path, "w") as f:
+                f.write(text)
+        return text
@@ -1,5 +1,9 @@
-import psycopg2
 import os
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from uuid import uuid4
+from psycopg2.extras import execute_values
 from .models import (
     ADD_FOREIGN_KEY_CONSTRAINT,
     DELETE_BY_REF_ID,
@@ -17,40 +21,163 @@ from .models import (
     INNER_JOIN_ON_ID,
     RIGHT_JOIN_ON_ID,
     FULL_OUTER_JOIN_ON_ID,
+    INSERT_NAMES_BULK,
+    COPY_DESCRIPTIONS,
 )
+from . import instrumentation, statements
+from .databases import search_path_options
+from .pool import ConnectionPool
 
 DATABASE_URL = os.environ["DATABASE_URL"]
+DATABASE_SCHEMA = os.environ.get("DATABASE_SCHEMA")
 
+POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+POOL_IDLE_TIMEOUT = float(os.environ.get("DB_POOL_IDLE_TIMEOUT", "300"))
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get("DB_POOL_CHECKOUT_TIMEOUT", "30"))
 
+COPY_BUFFER_SIZE = 65536
+DEFAULT_ITERSIZE = 2000
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=POOL_MIN_SIZE,
+                    max_size=POOL_MAX_SIZE,
+                    idle_timeout=POOL_IDLE_TIMEOUT,
+                    checkout_timeout=POOL_CHECKOUT_TIMEOUT,
+                    on_connect=instrumentation.recorder.record_connect,
+                    **search_path_options(DATABASE_SCHEMA),
+                )
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def use_database(url):
+    global DATABASE_URL
+    close_pool()
+    DATABASE_URL = url
+
+
+def use_schema(schema):
+    global DATABASE_SCHEMA
+    close_pool()
+    DATABASE_SCHEMA = schema
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def query_stats():
+    return instrumentation.recorder.snapshot()
+
+
+def export_query_stats(exporter):
+    return exporter.export(query_stats())
+
+
+class _SharedConnection:
+    # Helpers commit after every call; inside a unit of work the commit is
+    # deferred to the end of the outermost block.
+    def __init__(self, conn):
+        self._conn = conn
+        self.savepoints = 0
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        pass
+
+
+@contextmanager
 def connect():
-    return psycopg2.connect(DATABASE_URL)
+    shared = getattr(_local, "connection", None)
+    if shared is not None:
+        yield shared
+        return
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn:
+            yield conn
+    finally:
+        pool.putconn(conn)
+
+
+@contextmanager
+def unit_of_work():
+    shared = getattr(_local, "connection", None)
+    if shared is None:
+        with connect() as conn:
+            _local.connection = _SharedConnection(conn)
+            try:
+                yield _local.connection
+            finally:
+                _local.connection = None
+        return
+
+    shared.savepoints += 1
+    savepoint = "unit_of_work_%d" % shared.savepoints
+    with shared.cursor() as cursor:
+        cursor.execute("SAVEPOINT %s;" % savepoint)
+    try:
+        yield shared
+    except BaseException:
+        with shared.cursor() as cursor:
+            cursor.execute("ROLLBACK TO SAVEPOINT %s;" % savepoint)
+        raise
+    else:
+        with shared.cursor() as cursor:
+            cursor.execute("RELEASE SAVEPOINT %s;" % savepoint)
+    finally:
+        shared.savepoints -= 1
 
 
 def remove_foreign_key_constraint():
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(REMOVE_FOREIGN_KEY_CONSTRAINT)
+            statements.execute(cursor, REMOVE_FOREIGN_KEY_CONSTRAINT)
             conn.commit()
+    statements.invalidate_all()
 
 
 def add_foreign_key_constraint():
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(ADD_FOREIGN_KEY_CONSTRAINT)
+            statements.execute(cursor, ADD_FOREIGN_KEY_CONSTRAINT)
             conn.commit()
+    statements.invalidate_all()
 
 
 def delete_another_example_by_ref_id(ref_id):
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(DELETE_BY_REF_ID, (ref_id,))
+            statements.execute(cursor, DELETE_BY_REF_ID, (ref_id,))
             conn.commit()
 
 
 def create_example(name):
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(INSERT_NAME, (name,))
+            statements.execute(cursor, INSERT_NAME, (name,))
             id_of_new_row = cursor.fetchone()[0]
             conn.commit()
     return id_of_new_row
@@ -59,7 +186,7 @@ def create_example(name):
 def list_examples():
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(SELECT_ALL_NAMES)
+            statements.execute(cursor, SELECT_ALL_NAMES)
             result = cursor.fetchall()
     return result
 
@@ -67,14 +194,85 @@ def list_examples():
 def create_another_example(ref_id, description):
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(INSERT_DESCRIPTION, (ref_id, description))
+            statements.execute(cursor, INSERT_DESCRIPTION, (ref_id, description))
             conn.commit()
 
 
+def _chunks(iterable, chunk_size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _copy_text_value(value):
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class _CopyBuffer:
+    def __init__(self, rows, chunk_size):
+        self._chunks = _chunks(rows, chunk_size)
+        self._buffer = ""
+        self.rowcount = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self.rowcount += len(chunk)
+            self._buffer += "".join(
+                "\t".join(_copy_text_value(value) for value in row) + "\n"
+                for row in chunk
+            )
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def create_examples_bulk(names, chunk_size=1000):
+    ids = []
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            for chunk in _chunks(names, chunk_size):
+                with statements.measure(cursor, INSERT_NAMES_BULK):
+                    rows = execute_values(
+                        cursor,
+                        INSERT_NAMES_BULK,
+                        [(name,) for name in chunk],
+                        page_size=len(chunk),
+                        fetch=True,
+                    )
+                ids.extend(row[0] for row in rows)
+            conn.commit()
+    return ids
+
+
+def create_another_examples_bulk(rows, chunk_size=1000):
+    buffer = _CopyBuffer(rows, chunk_size)
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            with statements.measure(cursor, COPY_DESCRIPTIONS):
+                cursor.copy_expert(COPY_DESCRIPTIONS, buffer, size=COPY_BUFFER_SIZE)
+            conn.commit()
+    return buffer.rowcount
+
+
 def get_left_join_on_id():
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(LEFT_JOIN_ON_ID)
+            statements.execute(cursor, LEFT_JOIN_ON_ID)
             results = cursor.fetchall()
     return results
 
@@ -82,7 +280,7 @@ def get_left_join_on_id():
 def update_example_by_id(id, new_name):
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(UPDATE_NAME_BY_ID, (new_name, id))
+            statements.execute(cursor, UPDATE_NAME_BY_ID, (new_name, id))
             if cursor.rowcount == 0:
                 raise Exception("Record not found")
             conn.commit()
@@ -91,8 +289,8 @@ def update_example_by_id(id, new_name):
 def delete_example_by_id(id):
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(DELETE_BY_REF_ID, (id,))
-            cursor.execute(DELETE_NAME_BY_ID, (id,))
+            statements.execute(cursor, DELETE_BY_REF_ID, (id,))
+            statements.execute(cursor, DELETE_NAME_BY_ID, (id,))
             if cursor.rowcount == 0:
                 raise Exception("Record not found")
             conn.commit()
@@ -101,7 +299,7 @@ def delete_example_by_id(id):
 def get_inner_join_on_id():
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(INNER_JOIN_ON_ID)
+            statements.execute(cursor, INNER_JOIN_ON_ID)
             results = cursor.fetchall()
     return results
 
@@ -109,7 +307,7 @@ def get_inner_join_on_id():
 def get_right_join_on_id():
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(RIGHT_JOIN_ON_ID)
+            statements.execute(cursor, RIGHT_JOIN_ON_ID)
             results = cursor.fetchall()
     return results
 
@@ -117,11 +315,39 @@ def get_right_join_on_id():
 def get_full_outer_join_on_id():
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(FULL_OUTER_JOIN_ON_ID)
+            statements.execute(cursor, FULL_OUTER_JOIN_ON_ID)
             results = cursor.fetchall()
     return results
 
 
+def _stream(query, itersize):
+    with connect() as conn:
+        with conn.cursor(name="stream_%s" % uuid4().hex) as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query)
+            yield from cursor
+
+
+def iter_examples(itersize=DEFAULT_ITERSIZE):
+    return _stream(SELECT_ALL_NAMES, itersize)
+
+
+def iter_left_join_on_id(itersize=DEFAULT_ITERSIZE):
+    return _stream(LEFT_JOIN_ON_ID, itersize)
+
+
+def iter_inner_join_on_id(itersize=DEFAULT_ITERSIZE):
+    return _stream(INNER_JOIN_ON_ID, itersize)
+
+
+def iter_right_join_on_id(itersize=DEFAULT_ITERSIZE):
+    return _stream(RIGHT_JOIN_ON_ID, itersize)
+
+
+def iter_full_outer_join_on_id(itersize=DEFAULT_ITERSIZE):
+    return _stream(FULL_OUTER_JOIN_ON_ID, itersize)
+
+
 def execute_invalid_join_query(conn):
     with conn.cursor() as cursor:
         cursor.execute(INVALID_JOIN_QUERY)
@@ -27,6 +27,8 @@ CREATE TABLE IF NOT EXISTS events (
 """
 INSERT_NAME = "INSERT INTO example (name) VALUES (%s) RETURNING id;"
 
+INSERT_NAMES_BULK = "INSERT INTO example (name) VALUES %s RETURNING id;"
+
 SELECT_ALL_NAMES = "SELECT * FROM example ORDER BY name;"
 
 DELETE_NAME_BY_ID = "DELETE FROM example WHERE id = %s;"
@@ -40,8 +42,14 @@ CREATE TABLE IF NOT EXISTS another_example (
 );
 """
 
+CREATE_INDEX_ANOTHER_EXAMPLE_REF_ID = (
+    "CREATE INDEX IF NOT EXISTS another_example_ref_id_idx ON another_example (ref_id);"
+)
+
 INSERT_DESCRIPTION = "INSERT INTO another_example (ref_id, description) VALUES (%s, %s) RETURNING ref_id;"
 
+COPY_DESCRIPTIONS = "COPY another_example (ref_id, description) FROM STDIN;"
+
 LEFT_JOIN_ON_ID = """
 SELECT example.name, another_example.description
 FROM example
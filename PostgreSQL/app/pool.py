@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        dsn,
+        min_size=1,
+        max_size=10,
+        idle_timeout=300.0,
+        checkout_timeout=30.0,
+        health_check_after=30.0,
+        on_connect=None,
+        **connect_kwargs,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(
+                "Invalid pool size: min_size=%s max_size=%s" % (min_size, max_size)
+            )
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self.on_connect = on_connect
+        self.connect_kwargs = connect_kwargs
+
+        self._idle = deque()
+        self._in_use = set()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "checkins": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "health_check_failures": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "connect_time_total": 0.0,
+        }
+
+        for _ in range(min_size):
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    def _new_connection(self):
+        start = time.perf_counter()
+        conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats["connections_created"] += 1
+            self._stats["connect_time_total"] += elapsed
+        if self.on_connect is not None:
+            self.on_connect(elapsed)
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._lock:
+            self._stats["connections_closed"] += 1
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _reap_idle(self):
+        # Called with the lock held; keeps at least min_size connections around.
+        expired = []
+        now = time.monotonic()
+        while (
+            self._idle
+            and len(self._idle) + len(self._in_use) > self.min_size
+            and now - self._idle[0][1] > self.idle_timeout
+        ):
+            expired.append(self._idle.popleft()[0])
+        return expired
+
+    def getconn(self):
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self._available:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                expired = self._reap_idle()
+                candidate = None
+                reserve = False
+                if self._idle:
+                    candidate = self._idle.pop()
+                elif len(self._in_use) < self.max_size:
+                    reserve = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            "Timed out waiting for a connection after %.1fs"
+                            % self.checkout_timeout
+                        )
+                    self._available.wait(remaining)
+                    continue
+                # Hold the slot while connecting or health checking so
+                # concurrent checkouts never exceed max_size.
+                placeholder = object()
+                self._in_use.add(placeholder)
+
+            for conn in expired:
+                self._discard(conn)
+
+            try:
+                if reserve:
+                    conn = self._new_connection()
+                else:
+                    conn, idle_since = candidate
+                    if not self._is_healthy(conn, idle_since):
+                        with self._lock:
+                            self._stats["health_check_failures"] += 1
+                        self._discard(conn)
+                        conn = self._new_connection()
+            except BaseException:
+                with self._available:
+                    self._in_use.discard(placeholder)
+                    self._available.notify()
+                raise
+
+            waited = time.perf_counter() - start
+            with self._lock:
+                self._in_use.discard(placeholder)
+                self._in_use.add(conn)
+                self._stats["checkouts"] += 1
+                self._stats["wait_time_total"] += waited
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+            return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+        with self._available:
+            self._in_use.discard(conn)
+            self._stats["checkins"] += 1
+            discard = discard or self._closed or conn.closed
+            if not discard:
+                self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+        if discard:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_use"] = len(self._in_use)
+            stats["idle"] = len(self._idle)
+        checkouts = stats["checkouts"]
+        stats["wait_time_avg"] = (
+            stats["wait_time_total"] / checkouts if checkouts else 0.0
+        )
+        return stats
+
+    def closeall(self):
+        with self._available:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._available.notify_all()
+        for conn in idle:
+            self._discard(conn)
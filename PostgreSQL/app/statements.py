@@ -0,0 +1,122 @@
+import os
+import re
+import threading
+import weakref
+from collections import OrderedDict
+
+from . import instrumentation, models
+
+STATEMENT_NAMES = {
+    value: name
+    for name, value in vars(models).items()
+    if name.isupper() and isinstance(value, str)
+}
+
+PREPARABLE = {
+    models.INSERT_NAME,
+    models.SELECT_ALL_NAMES,
+    models.DELETE_NAME_BY_ID,
+    models.DELETE_BY_REF_ID,
+    models.INSERT_DESCRIPTION,
+    models.UPDATE_NAME_BY_ID,
+    models.LEFT_JOIN_ON_ID,
+    models.INNER_JOIN_ON_ID,
+    models.RIGHT_JOIN_ON_ID,
+    models.FULL_OUTER_JOIN_ON_ID,
+}
+
+ENABLED = os.environ.get("DB_PREPARED_STATEMENTS", "1") != "0"
+CACHE_SIZE = int(os.environ.get("DB_PREPARED_CACHE_SIZE", "32"))
+
+_PLACEHOLDER = re.compile(r"%s")
+
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+_generation = 0
+
+
+def to_server_placeholders(query):
+    counter = iter(range(1, query.count("%s") + 1))
+    return _PLACEHOLDER.sub(lambda _: "$%d" % next(counter), query).strip()
+
+
+def invalidate_all():
+    global _generation
+    with _caches_lock:
+        _generation += 1
+
+
+class PreparedStatementCache:
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self.generation = _generation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._prepared = OrderedDict()
+
+    def __len__(self):
+        return len(self._prepared)
+
+    def _deallocate(self, cursor, name):
+        cursor.execute("DEALLOCATE %s;" % name)
+
+    def invalidate(self, cursor):
+        if self._prepared:
+            cursor.execute("DEALLOCATE ALL;")
+        self._prepared.clear()
+        self.generation = _generation
+
+    def execute(self, cursor, query, params=None):
+        if self.generation != _generation:
+            self.invalidate(cursor)
+
+        name = self._prepared.get(query)
+        if name is None:
+            self.misses += 1
+            while len(self._prepared) >= self.max_size:
+                _, evicted = self._prepared.popitem(last=False)
+                self._deallocate(cursor, evicted)
+                self.evictions += 1
+            name = STATEMENT_NAMES[query].lower()
+            cursor.execute("PREPARE %s AS %s" % (name, to_server_placeholders(query)))
+            self._prepared[query] = name
+        else:
+            self.hits += 1
+            self._prepared.move_to_end(query)
+
+        if params:
+            cursor.execute(
+                "EXECUTE %s (%s);" % (name, ", ".join(["%s"] * len(params))), params
+            )
+        else:
+            cursor.execute("EXECUTE %s;" % name)
+
+    def stats(self):
+        return {
+            "prepared": len(self._prepared),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def get_cache(conn):
+    with _caches_lock:
+        cache = _caches.get(conn)
+        if cache is None:
+            cache = _caches[conn] = PreparedStatementCache()
+    return cache
+
+
+def measure(cursor, query, params=None):
+    name = STATEMENT_NAMES.get(query, "OTHER")
+    return instrumentation.measure(name, cursor, query, params)
+
+
+def execute(cursor, query, params=None):
+    with measure(cursor, query, params):
+        if ENABLED and query in PREPARABLE:
+            get_cache(cursor.connection).execute(cursor, query, params)
+        else:
+            cursor.execute(query, params)
@@ -0,0 +1,74 @@
+import os
+import psycopg2
+import pytest
+from app.databases import (
+    TemplateDatabase,
+    create_namespace,
+    create_schema,
+    database_name,
+    drop_namespace,
+    search_path_options,
+    truncate_tables,
+    worker_schema,
+)
+from app.main import use_database, use_schema
+
+DATABASE_URL = os.environ["DATABASE_URL"]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def worker_namespace():
+    schema = worker_schema()
+    if schema is None:
+        yield None
+        return
+
+    # PGOPTIONS also covers the connections tests open themselves.
+    create_namespace(DATABASE_URL, schema)
+    os.environ["PGOPTIONS"] = search_path_options(schema)["options"]
+    use_schema(schema)
+
+    yield schema
+
+    use_schema(None)
+    del os.environ["PGOPTIONS"]
+    drop_namespace(DATABASE_URL, schema)
+
+
+@pytest.fixture(scope="session")
+def template_database(worker_namespace):
+    name = "%s_template" % database_name(DATABASE_URL)
+    if worker_namespace:
+        name = "%s_%s" % (name, worker_namespace)
+    template = TemplateDatabase(DATABASE_URL, name).build()
+
+    yield template
+
+    template.destroy()
+
+
+@pytest.fixture
+def fresh_database(template_database, worker_namespace):
+    url = template_database.create()
+    use_database(url)
+    if worker_namespace:
+        use_schema("public")
+
+    yield url
+
+    use_database(DATABASE_URL)
+    if worker_namespace:
+        use_schema(worker_namespace)
+    template_database.drop(url)
+
+
+@pytest.fixture
+def truncated_database():
+    conn = psycopg2.connect(DATABASE_URL)
+    create_schema(conn)
+    truncate_tables(conn)
+
+    yield conn
+
+    conn.rollback()
+    conn.close()
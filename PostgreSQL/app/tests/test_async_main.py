@@ -0,0 +1,142 @@
+import asyncio
+import os
+import psycopg
+import psycopg2
+import pytest
+from app import async_main
+from app.models import (
+    CREATE_ANOTHER_TABLE,
+    CREATE_INDEX_ANOTHER_EXAMPLE_REF_ID,
+    CREATE_TABLE,
+    CREATE_TABLE_EVENTS,
+    CREATE_TABLE_USERS,
+    CREATE_TABLE_ORDERS,
+)
+
+DATABASE_URL = os.environ["DATABASE_URL"]
+
+
+def run(coroutine):
+    async def run_and_close():
+        try:
+            return await coroutine
+        finally:
+            await async_main.close_pool()
+
+    return asyncio.run(run_and_close())
+
+
+@pytest.fixture(scope="module")
+def db_connection():
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+    cursor.execute(CREATE_TABLE)
+    cursor.execute(CREATE_ANOTHER_TABLE)
+    cursor.execute(CREATE_INDEX_ANOTHER_EXAMPLE_REF_ID)
+    cursor.execute(CREATE_TABLE_USERS)
+    cursor.execute(CREATE_TABLE_ORDERS)
+    cursor.execute(CREATE_TABLE_EVENTS)
+    conn.commit()
+
+    yield conn
+
+    cursor.execute("DROP TABLE IF EXISTS another_example;")
+    cursor.execute("DROP TABLE IF EXISTS example;")
+    conn.commit()
+    conn.close()
+
+
+class TestAsyncDatabaseOperations:
+    def test_insert_update_delete(self, db_connection):
+        async def scenario():
+            id = await async_main.create_example("Async Alice")
+            assert id > 0
+            await async_main.update_example_by_id(id, "Async Updated")
+            names = [row[1] for row in await async_main.list_examples()]
+            assert "Async Updated" in names
+            assert "Async Alice" not in names
+            await async_main.delete_example_by_id(id)
+            names = [row[1] for row in await async_main.list_examples()]
+            assert "Async Updated" not in names
+
+        run(scenario())
+
+    def test_update_non_existent_record(self, db_connection):
+        with pytest.raises(Exception) as excinfo:
+            run(async_main.update_example_by_id(99999, "Nobody"))
+        assert "Record not found" in str(excinfo.value)
+
+    def test_concurrent_queries(self, db_connection):
+        async def scenario():
+            names = ["Concurrent %d" % i for i in range(200)]
+            ids = await asyncio.gather(*map(async_main.create_example, names))
+            assert len(set(ids)) == len(names)
+            stats = await async_main.pool_stats()
+            assert stats["pool_size"] <= async_main.POOL_MAX_SIZE
+            return ids
+
+        run(scenario())
+
+    def test_joins(self, db_connection):
+        async def scenario():
+            id = await async_main.create_example("Async Bob")
+            await async_main.create_another_example(id, "Description for Async Bob")
+            for query in (
+                async_main.get_left_join_on_id,
+                async_main.get_inner_join_on_id,
+                async_main.get_right_join_on_id,
+                async_main.get_full_outer_join_on_id,
+            ):
+                assert ("Async Bob", "Description for Async Bob") in await query()
+
+        run(scenario())
+
+    def test_bulk_and_streaming(self, db_connection):
+        async def scenario():
+            names = ["Async Bulk %d" % i for i in range(10)]
+            ids = await async_main.create_examples_bulk(names, chunk_size=3)
+            assert len(ids) == len(names)
+            count = await async_main.create_another_examples_bulk(
+                [(id, "bulk\tdescription") for id in ids], chunk_size=4
+            )
+            assert count == len(ids)
+            streamed = [
+                row async for row in async_main.iter_inner_join_on_id(itersize=2)
+            ]
+            assert sorted(streamed) == sorted(await async_main.get_inner_join_on_id())
+            assert [row async for row in async_main.iter_examples()] == (
+                await async_main.list_examples()
+            )
+
+        run(scenario())
+
+    def test_unit_of_work(self, db_connection):
+        async def scenario():
+            async with async_main.unit_of_work():
+                id = await async_main.create_example("Async Unit Carl")
+                await async_main.update_example_by_id(id, "Async Unit Updated")
+                with pytest.raises(Exception):
+                    async with async_main.unit_of_work():
+                        await async_main.create_example("Async Unit Dora")
+                        await async_main.delete_example_by_id(99999)
+            names = [row[1] for row in await async_main.list_examples()]
+            assert "Async Unit Updated" in names
+            assert "Async Unit Dora" not in names
+
+            with pytest.raises(RuntimeError):
+                async with async_main.unit_of_work():
+                    await async_main.create_example("Async Unit Emil")
+                    raise RuntimeError("abort")
+            names = [row[1] for row in await async_main.list_examples()]
+            assert "Async Unit Emil" not in names
+
+        run(scenario())
+
+    def test_error_query(self, db_connection):
+        async def scenario():
+            async with await psycopg.AsyncConnection.connect(DATABASE_URL) as conn:
+                await async_main.insert_invalid_date_format(conn)
+
+        with pytest.raises(psycopg.DataError) as excinfo:
+            run(scenario())
+        assert "invalid input syntax for type date" in str(excinfo.value)
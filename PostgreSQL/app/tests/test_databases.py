@@ -0,0 +1,27 @@
+import os
+from app.databases import database_name
+from app.main import create_example, list_examples, pool_stats
+
+DATABASE_URL = os.environ["DATABASE_URL"]
+
+
+class TestTemplateDatabase:
+    def test_fresh_database_has_schema_and_no_rows(self, fresh_database):
+        assert list_examples() == []
+        id = create_example("Template Alice")
+        assert id == 1
+        assert list_examples() == [(1, "Template Alice")]
+
+    def test_fresh_database_does_not_see_previous_test(self, fresh_database):
+        assert list_examples() == []
+        assert database_name(fresh_database).endswith(tuple("0123456789abcdef"))
+        assert pool_stats()["connections_created"] == 1
+
+
+class TestTruncateReset:
+    def test_first_insert(self, truncated_database):
+        assert create_example("Truncate Bob") == 1
+
+    def test_identity_restarts_after_truncate(self, truncated_database):
+        assert create_example("Truncate Bob") == 1
+        assert [row[1] for row in list_examples()] == ["Truncate Bob"]
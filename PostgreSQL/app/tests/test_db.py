@@ -18,9 +18,20 @@ from app.main import (
     insert_invalid_foreign_key,
     insert_invalid_date_format,
     insert_duplicate_user,
+    create_examples_bulk,
+    create_another_examples_bulk,
+    iter_examples,
+    iter_left_join_on_id,
+    iter_inner_join_on_id,
+    iter_right_join_on_id,
+    iter_full_outer_join_on_id,
+    pool_stats,
+    unit_of_work,
 )
+from app.databases import truncate_tables
 from app.models import (
     CREATE_ANOTHER_TABLE,
+    CREATE_INDEX_ANOTHER_EXAMPLE_REF_ID,
     CREATE_TABLE,
     CREATE_TABLE_EVENTS,
     CREATE_TABLE_USERS,
@@ -36,6 +47,7 @@ def db_connection():
     cursor = conn.cursor()
     cursor.execute(CREATE_TABLE)
     cursor.execute(CREATE_ANOTHER_TABLE)
+    cursor.execute(CREATE_INDEX_ANOTHER_EXAMPLE_REF_ID)
     cursor.execute(CREATE_TABLE_USERS)
     cursor.execute(CREATE_TABLE_ORDERS)
     cursor.execute(CREATE_TABLE_EVENTS)
@@ -57,6 +69,7 @@ def run_around_tests(db_connection):
 
     db_connection.rollback()
     trans.close()
+    truncate_tables(db_connection)
 
 
 class TestBasicDatabaseOperations:
@@ -177,6 +190,121 @@ class TestCRUDOperationsForAnotherExample:
         assert description not in descriptions
 
 
+class TestBulkOperations:
+    @pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+    def test_create_examples_bulk(self, chunk_size, db_connection):
+        names = ["Bulk %d" % i for i in range(25)]
+        ids = create_examples_bulk(iter(names), chunk_size=chunk_size)
+        assert len(ids) == len(names)
+        assert ids == sorted(ids)
+        rows = dict((row[0], row[1]) for row in list_examples())
+        assert [rows[id] for id in ids] == names
+
+    def test_create_examples_bulk_empty(self, db_connection):
+        assert create_examples_bulk([]) == []
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+    def test_create_another_examples_bulk(self, chunk_size, db_connection):
+        id = create_example("Bulk Owner")
+        descriptions = [
+            "plain",
+            "tab\there",
+            "new\nline",
+            "back\\slash",
+            "",
+        ]
+        count = create_another_examples_bulk(
+            ((id, description) for description in descriptions),
+            chunk_size=chunk_size,
+        )
+        assert count == len(descriptions)
+        results = get_inner_join_on_id()
+        stored = [row[1] for row in results if row[0] == "Bulk Owner"]
+        for description in descriptions:
+            assert description in stored
+        delete_example_by_id(id)
+
+    def test_create_another_examples_bulk_null_ref(self, db_connection):
+        count = create_another_examples_bulk([(None, "Orphan bulk row")])
+        assert count == 1
+        results = get_right_join_on_id()
+        assert (None, "Orphan bulk row") in results
+
+
+class TestStreamingQueries:
+    @pytest.mark.parametrize("itersize", [1, 5, 2000])
+    def test_iter_examples_matches_list(self, itersize, db_connection):
+        create_examples_bulk(["Stream %d" % i for i in range(12)])
+        assert list(iter_examples(itersize=itersize)) == list_examples()
+
+    @pytest.mark.parametrize(
+        "streaming, buffered",
+        [
+            (iter_left_join_on_id, get_left_join_on_id),
+            (iter_inner_join_on_id, get_inner_join_on_id),
+            (iter_right_join_on_id, get_right_join_on_id),
+            (iter_full_outer_join_on_id, get_full_outer_join_on_id),
+        ],
+    )
+    def test_iter_joins_match_buffered(self, streaming, buffered, db_connection):
+        id = create_example("Streamer")
+        create_another_example(id, "Description for Streamer")
+        assert sorted(streaming(itersize=3), key=repr) == sorted(buffered(), key=repr)
+
+    def test_partial_iteration_releases_connection(self, db_connection):
+        create_examples_bulk(["Partial %d" % i for i in range(5)])
+        rows = iter_examples(itersize=2)
+        assert next(rows) is not None
+        rows.close()
+        assert pool_stats()["in_use"] == 0
+
+
+class TestUnitOfWork:
+    def test_helpers_share_one_connection(self, db_connection):
+        checkouts = pool_stats()["checkouts"]
+        with unit_of_work():
+            id = create_example("Unit Kate")
+            update_example_by_id(id, "Unit Updated Kate")
+            create_another_example(id, "Description for Kate")
+            names = [row[1] for row in list_examples()]
+            delete_example_by_id(id)
+        assert pool_stats()["checkouts"] == checkouts + 1
+        assert "Unit Updated Kate" in names
+        assert "Unit Updated Kate" not in [row[1] for row in list_examples()]
+
+    def test_rolls_back_on_error(self, db_connection):
+        with pytest.raises(RuntimeError):
+            with unit_of_work():
+                create_example("Unit Liam")
+                assert "Unit Liam" in [row[1] for row in list_examples()]
+                raise RuntimeError("abort")
+        assert "Unit Liam" not in [row[1] for row in list_examples()]
+
+    def test_nested_failure_rolls_back_to_savepoint(self, db_connection):
+        with unit_of_work():
+            create_example("Unit Mia")
+            with pytest.raises(Exception) as excinfo:
+                with unit_of_work():
+                    create_example("Unit Noah")
+                    delete_example_by_id(99999)
+            assert "Record not found" in str(excinfo.value)
+            with unit_of_work():
+                create_example("Unit Olivia")
+        names = [row[1] for row in list_examples()]
+        assert "Unit Mia" in names
+        assert "Unit Noah" not in names
+        assert "Unit Olivia" in names
+
+    def test_nested_database_error_keeps_transaction_usable(self, db_connection):
+        with unit_of_work():
+            id = create_example("Unit Paul")
+            with pytest.raises(psycopg2.Error):
+                with unit_of_work() as conn:
+                    execute_invalid_join_query(conn)
+            update_example_by_id(id, "Unit Updated Paul")
+        assert "Unit Updated Paul" in [row[1] for row in list_examples()]
+
+
 class TestErrorCases:
     @pytest.mark.parametrize(
         "non_existent_id, new_name",
@@ -0,0 +1,79 @@
+import json
+import pytest
+from app import instrumentation
+from app.instrumentation import JsonFileExporter, PrometheusExporter, percentile
+from app.main import (
+    close_pool,
+    create_example,
+    export_query_stats,
+    list_examples,
+    query_stats,
+    update_example_by_id,
+)
+
+
+@pytest.fixture(autouse=True)
+def recorder(truncated_database):
+    close_pool()
+    instrumentation.recorder.reset()
+
+    yield instrumentation.recorder
+
+    instrumentation.recorder.reset()
+
+
+class TestQueryInstrumentation:
+    @pytest.mark.parametrize(
+        "quantile, expected", [(0.5, 50), (0.95, 95), (0.99, 99), (1.0, 100)]
+    )
+    def test_percentile(self, quantile, expected):
+        assert percentile(list(range(1, 101)), quantile) == expected
+
+    def test_records_statements_by_constant_name(self, recorder):
+        id = create_example("Instrumented Alice")
+        create_example("Instrumented Bob")
+        update_example_by_id(id, "Instrumented Alicia")
+        list_examples()
+        stats = query_stats()
+        assert stats["statements"]["INSERT_NAME"]["count"] == 2
+        assert stats["statements"]["INSERT_NAME"]["rows"] == 2
+        assert stats["statements"]["UPDATE_NAME_BY_ID"]["count"] == 1
+        assert stats["statements"]["SELECT_ALL_NAMES"]["rows"] == 2
+        summary = stats["statements"]["SELECT_ALL_NAMES"]
+        assert 0 < summary["p50"] <= summary["p95"] <= summary["p99"]
+        assert stats["connect"]["count"] == 1
+
+    def test_missing_record_is_not_a_statement_error(self, recorder):
+        with pytest.raises(Exception):
+            update_example_by_id(99999, "Nobody")
+        assert query_stats()["statements"]["UPDATE_NAME_BY_ID"]["errors"] == 0
+        assert query_stats()["statements"]["UPDATE_NAME_BY_ID"]["rows"] == 0
+
+    def test_slow_query_is_explained_without_side_effects(self, recorder):
+        recorder.slow_query_ms = 0
+        try:
+            create_example("Slow Carol")
+        finally:
+            recorder.slow_query_ms = None
+        slow = query_stats()["slow_queries"]
+        assert [entry["statement"] for entry in slow] == ["INSERT_NAME"]
+        assert "actual time" in slow[0]["plan"]
+        assert [row[1] for row in list_examples()] == ["Slow Carol"]
+
+    def test_json_exporter(self, recorder, tmp_path):
+        create_example("Exported Dave")
+        path = tmp_path / "query_stats.json"
+        export_query_stats(JsonFileExporter(str(path)))
+        exported = json.loads(path.read_text())
+        assert exported["statements"]["INSERT_NAME"]["count"] == 1
+
+    def test_prometheus_exporter(self, recorder):
+        create_example("Exported Eve")
+        text = export_query_stats(PrometheusExporter())
+        assert "# TYPE db_query_duration_seconds summary" in text
+        assert (
+            'db_query_duration_seconds{statement="INSERT_NAME",quantile="0.99"}' in text
+        )
+        assert 'db_query_duration_seconds_count{statement="INSERT_NAME"} 1' in text
+        assert 'db_query_rows_total{statement="INSERT_NAME"} 1' in text
+        assert "db_connect_duration_seconds_count 1" in text
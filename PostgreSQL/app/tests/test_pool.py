@@ -0,0 +1,86 @@
+import os
+import threading
+import psycopg2
+import pytest
+from app.pool import ConnectionPool, PoolTimeout
+
+DATABASE_URL = os.environ["DATABASE_URL"]
+
+
+@pytest.fixture
+def pool():
+    pool = ConnectionPool(DATABASE_URL, min_size=1, max_size=2, checkout_timeout=0.5)
+
+    yield pool
+
+    pool.closeall()
+
+
+class TestConnectionPool:
+    def test_reuses_connections(self, pool):
+        for _ in range(5):
+            conn = pool.getconn()
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+                assert cursor.fetchone()[0] == 1
+            pool.putconn(conn)
+        stats = pool.stats()
+        assert stats["checkouts"] == 5
+        assert stats["connections_created"] == 1
+        assert stats["in_use"] == 0
+        assert stats["idle"] == 1
+
+    def test_checkout_times_out_when_exhausted(self, pool):
+        first = pool.getconn()
+        second = pool.getconn()
+        with pytest.raises(PoolTimeout):
+            pool.getconn()
+        assert pool.stats()["timeouts"] == 1
+        pool.putconn(first)
+        pool.putconn(second)
+
+    def test_waiter_gets_released_connection(self, pool):
+        first = pool.getconn()
+        second = pool.getconn()
+        threading.Timer(0.1, pool.putconn, args=(first,)).start()
+        conn = pool.getconn()
+        assert conn is first
+        assert pool.stats()["wait_time_max"] > 0
+        pool.putconn(conn)
+        pool.putconn(second)
+
+    def test_replaces_closed_connection(self, pool):
+        conn = pool.getconn()
+        conn.close()
+        pool.putconn(conn)
+        conn = pool.getconn()
+        assert not conn.closed
+        pool.putconn(conn)
+        assert pool.stats()["connections_closed"] == 1
+
+    def test_health_check_replaces_dead_connection(self):
+        pool = ConnectionPool(
+            DATABASE_URL, min_size=1, max_size=1, health_check_after=0
+        )
+        conn = pool.getconn()
+        pid = conn.get_backend_pid()
+        pool.putconn(conn)
+        killer = psycopg2.connect(DATABASE_URL)
+        with killer.cursor() as cursor:
+            cursor.execute("SELECT pg_terminate_backend(%s);", (pid,))
+        killer.commit()
+        killer.close()
+        conn = pool.getconn()
+        assert conn.get_backend_pid() != pid
+        assert pool.stats()["health_check_failures"] == 1
+        pool.putconn(conn)
+        pool.closeall()
+
+    def test_rolls_back_open_transaction_on_checkin(self, pool):
+        conn = pool.getconn()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+        pool.putconn(conn)
+        conn = pool.getconn()
+        assert conn.get_transaction_status() == 0
+        pool.putconn(conn)
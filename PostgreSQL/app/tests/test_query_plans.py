@@ -0,0 +1,61 @@
+import json
+import os
+import psycopg2
+import pytest
+from app.advisor import (
+    PLANNED_QUERIES,
+    capture_plan,
+    capture_plans,
+    is_regression,
+    seed,
+    summarize,
+)
+from app.databases import create_schema, truncate_tables
+from app.models import DELETE_BY_REF_ID
+
+DATABASE_URL = os.environ["DATABASE_URL"]
+BASELINE_ROWS = 5000
+
+with open(os.path.join(os.path.dirname(__file__), "query_plans.json")) as f:
+    BASELINE = json.load(f)
+
+
+@pytest.fixture(scope="module")
+def seeded_connection():
+    conn = psycopg2.connect(DATABASE_URL)
+    create_schema(conn)
+    truncate_tables(conn)
+    seed(conn, BASELINE_ROWS)
+
+    yield conn
+
+    conn.rollback()
+    truncate_tables(conn)
+    conn.close()
+
+
+@pytest.fixture(scope="module")
+def current_plans(seeded_connection):
+    plans = capture_plans(seeded_connection)
+    seeded_connection.rollback()
+    return {name: summarize(plan) for name, plan in plans.items()}
+
+
+class TestQueryPlans:
+    @pytest.mark.parametrize("name", sorted(PLANNED_QUERIES))
+    def test_plan_is_not_worse_than_baseline(self, name, current_plans):
+        assert not is_regression(
+            BASELINE[name], current_plans[name]
+        ), "Plan for %s regressed: baseline %s, current %s" % (
+            name,
+            BASELINE[name],
+            current_plans[name],
+        )
+
+    def test_missing_index_is_a_regression(self, seeded_connection):
+        with seeded_connection.cursor() as cursor:
+            cursor.execute("DROP INDEX another_example_ref_id_idx;")
+        plan = summarize(capture_plan(seeded_connection, DELETE_BY_REF_ID, (1,)))
+        seeded_connection.rollback()
+        assert "Seq Scan on another_example" in plan["nodes"]
+        assert is_regression(BASELINE["DELETE_BY_REF_ID"], plan)
@@ -0,0 +1,85 @@
+import os
+import psycopg2
+import pytest
+from app import statements
+from app.models import (
+    CREATE_ANOTHER_TABLE,
+    CREATE_TABLE,
+    INSERT_NAME,
+    INNER_JOIN_ON_ID,
+    LEFT_JOIN_ON_ID,
+    SELECT_ALL_NAMES,
+    UPDATE_NAME_BY_ID,
+)
+
+DATABASE_URL = os.environ["DATABASE_URL"]
+
+
+@pytest.fixture
+def conn():
+    conn = psycopg2.connect(DATABASE_URL)
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        cursor.execute(CREATE_ANOTHER_TABLE)
+    conn.commit()
+
+    yield conn
+
+    conn.rollback()
+    conn.close()
+
+
+def prepared_names(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM pg_prepared_statements ORDER BY name;")
+        return [row[0] for row in cursor.fetchall()]
+
+
+class TestPreparedStatementCache:
+    def test_server_placeholders(self):
+        assert (
+            statements.to_server_placeholders(UPDATE_NAME_BY_ID)
+            == "UPDATE example SET name = $1 WHERE id = $2;"
+        )
+
+    def test_prepares_once_and_reuses(self, conn):
+        cache = statements.PreparedStatementCache()
+        with conn.cursor() as cursor:
+            cache.execute(cursor, INSERT_NAME, ("Prepared",))
+            id = cursor.fetchone()[0]
+            cache.execute(cursor, UPDATE_NAME_BY_ID, ("Prepared again", id))
+            assert cursor.rowcount == 1
+            cache.execute(cursor, UPDATE_NAME_BY_ID, ("Prepared twice", id))
+            assert cursor.rowcount == 1
+        assert cache.stats() == {
+            "prepared": 2,
+            "hits": 1,
+            "misses": 2,
+            "evictions": 0,
+        }
+        assert prepared_names(conn) == ["insert_name", "update_name_by_id"]
+
+    def test_lru_eviction(self, conn):
+        cache = statements.PreparedStatementCache(max_size=2)
+        with conn.cursor() as cursor:
+            cache.execute(cursor, SELECT_ALL_NAMES)
+            cache.execute(cursor, LEFT_JOIN_ON_ID)
+            cache.execute(cursor, SELECT_ALL_NAMES)
+            cache.execute(cursor, INNER_JOIN_ON_ID)
+        assert cache.stats()["evictions"] == 1
+        assert prepared_names(conn) == ["inner_join_on_id", "select_all_names"]
+
+    def test_invalidated_after_ddl(self, conn):
+        cache = statements.PreparedStatementCache()
+        with conn.cursor() as cursor:
+            cache.execute(cursor, SELECT_ALL_NAMES)
+            statements.invalidate_all()
+            cache.execute(cursor, LEFT_JOIN_ON_ID)
+        assert cache.stats()["misses"] == 2
+        assert prepared_names(conn) == ["left_join_on_id"]
+
+    def test_unknown_statements_run_directly(self, conn):
+        with conn.cursor() as cursor:
+            statements.execute(cursor, "SELECT %s;", (1,))
+            assert cursor.fetchone()[0] == 1
+        assert prepared_names(conn) == []
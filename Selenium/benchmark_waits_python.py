@@ -0,0 +1,111 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+from selenium import webdriver
+from selenium.webdriver.support.ui import WebDriverWait as Wait
+
+from custom_selenium_python import CustomSelenium
+
+PAGE = """data:text/html,<body><div id="status">idle</div><script>
+window.schedule = (kind, id, delay) => setTimeout(() => {
+  if (kind === "appear") {
+    const element = document.createElement("div");
+    element.id = id;
+    element.textContent = "ready";
+    document.body.appendChild(element);
+  } else if (kind === "text") {
+    document.getElementById("status").textContent = id;
+  } else if (kind === "hide") {
+    document.getElementById(id).style.display = "none";
+  }
+}, delay);
+</script></body>"""
+
+
+class FixedPollSelenium(CustomSelenium):
+    # The previous behaviour: WebDriverWait with its fixed 0.5 s poll.
+    def _wait(self, condition, locator, timeout, fallback, text=""):
+        return Wait(self.driver, timeout).until(fallback)
+
+    def _until(self, condition, timeout, message=""):
+        return Wait(self.driver, timeout).until(condition)
+
+
+MODES = {
+    "fixed": FixedPollSelenium,
+    "polling": lambda driver: CustomSelenium(driver, event_waits=False),
+    "event": CustomSelenium,
+}
+
+
+def run_suite(custom_selenium, steps, max_delay, seed=0):
+    # Every step makes the page change after a random delay and waits for
+    # it. Whatever the suite takes beyond those delays is wait overhead.
+    rng = random.Random(seed)
+    driver = custom_selenium.driver
+    driver.get(PAGE)
+    scheduled = 0.0
+    started = time.perf_counter()
+    for step in range(steps):
+        for kind, wait in (
+            ("appear", lambda: custom_selenium.wait_for_element(f"#e{step}")),
+            (
+                "text",
+                lambda: custom_selenium.wait_for_text_in_element(
+                    "#status", f"done{step}"
+                ),
+            ),
+            ("hide", lambda: custom_selenium.wait_until_element_invisible(f"#e{step}")),
+        ):
+            delay = rng.uniform(0, max_delay)
+            target = f"e{step}" if kind != "text" else f"done{step}"
+            driver.execute_script(
+                "window.schedule(arguments[0], arguments[1], arguments[2]);",
+                kind,
+                target,
+                delay * 1000,
+            )
+            scheduled += delay
+            assert wait(), (kind, step)
+    elapsed = time.perf_counter() - started
+    waits = steps * 3
+    return {
+        "waits": waits,
+        "seconds": elapsed,
+        "overhead_seconds": elapsed - scheduled,
+        "overhead_ms_per_wait": (elapsed - scheduled) / waits * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare wait overhead of fixed, adaptive and in-page waits."
+    )
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument(
+        "--max-delay", type=float, default=0.5, help="Seconds before a change."
+    )
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--headed", action="store_true")
+    args = parser.parse_args(argv)
+
+    options = webdriver.ChromeOptions()
+    if not args.headed:
+        options.add_argument("--headless=new")
+    driver = webdriver.Chrome(options=options)
+    try:
+        results = {
+            mode: run_suite(MODES[mode](driver), args.steps, args.max_delay)
+            for mode in args.modes
+        }
+    finally:
+        driver.quit()
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,472 @@
+import base64
+import hashlib
+import io
 import os
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait as Wait
 from selenium.webdriver import ActionChains
 from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.common.exceptions import (
     NoSuchElementException,
     TimeoutException,
     ElementClickInterceptedException,
+    WebDriverException,
+    StaleElementReferenceException,
 )
 from selenium.webdriver.remote.webelement import WebElement
 from datetime import datetime
 import logging
 
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
 driver = WebDriver | WebElement
 default_timeout = 10
 
+# Mirrors WebDriver's rules closely enough for batch reads: hidden elements
+# have no visible text.
+DOM_HELPERS_SCRIPT = """
+const isVisible = (element) =>
+  element.checkVisibility
+    ? element.checkVisibility({ checkOpacity: true, checkVisibilityCSS: true })
+    : !!(element.offsetWidth || element.offsetHeight || element.getClientRects().length);
+const textOf = (element, readHidden) =>
+  readHidden ? element.textContent : isVisible(element) ? element.innerText.trim() : "";
+"""
+
+QUERY_ELEMENTS_SCRIPT = DOM_HELPERS_SCRIPT + """
+const [locators, attributes, readHidden] = arguments;
+const result = {};
+for (const locator of locators) {
+  result[locator] = Array.from(document.querySelectorAll(locator), (element) => {
+    const rect = element.getBoundingClientRect();
+    return {
+      element,
+      text: textOf(element, readHidden),
+      attributes: Object.fromEntries(
+        attributes.map((name) => [name, element.getAttribute(name)])
+      ),
+      visible: isVisible(element),
+      rect: { x: rect.x, y: rect.y, width: rect.width, height: rect.height },
+    };
+  });
+}
+return result;
+"""
+
+ELEMENT_TEXT_SCRIPT = DOM_HELPERS_SCRIPT + """
+const [elements, readHidden] = arguments;
+return elements.map((element) => textOf(element, readHidden));
+"""
+
+# Resolves as soon as a DOM mutation makes the condition true. The interval
+# catches changes that don't mutate the DOM, such as stylesheet animations.
+WAIT_SCRIPT = DOM_HELPERS_SCRIPT + """
+const [condition, locator, text, timeout] = arguments;
+const done = arguments[arguments.length - 1];
+const check = () => {
+  const element = document.querySelector(locator);
+  const all = () => Array.from(document.querySelectorAll(locator));
+  switch (condition) {
+    case "present":
+      return element;
+    case "all_present": {
+      const elements = all();
+      return elements.length ? elements : null;
+    }
+    case "all_visible": {
+      const elements = all();
+      return elements.length && elements.every(isVisible) ? elements : null;
+    }
+    case "invisible":
+      return !element || !isVisible(element);
+    case "clickable":
+      return element && isVisible(element) && !element.disabled ? element : null;
+    case "text":
+      return !!element && textOf(element, false).includes(text);
+  }
+  throw new Error("Unknown wait condition: " + condition);
+};
+const initial = check();
+if (initial) {
+  done({ ok: true, value: initial });
+  return;
+}
+let finished = false;
+const finish = (value) => {
+  if (finished) return;
+  finished = true;
+  observer.disconnect();
+  clearInterval(interval);
+  clearTimeout(timer);
+  done({ ok: !!value, value: value || null });
+};
+const onChange = () => {
+  const value = check();
+  if (value) finish(value);
+};
+const observer = new MutationObserver(onChange);
+observer.observe(document.documentElement, {
+  subtree: true,
+  childList: true,
+  attributes: true,
+  characterData: true,
+});
+const interval = setInterval(onChange, 100);
+const timer = setTimeout(() => finish(null), timeout);
+"""
+
+CLEAR_STORAGE_SCRIPT = """
+try {
+  window.localStorage.clear();
+  window.sessionStorage.clear();
+} catch (e) {}
+return window.location.origin;
+"""
+
+# Counts DOM mutations in the page and returns the matches for a locator only
+# when something changed since the caller's generation. A new document starts
+# a new token, so navigation and reloads invalidate as well.
+CACHED_ELEMENTS_SCRIPT = """
+const [locator, generation] = arguments;
+let state = document.__customSeleniumGeneration;
+if (!state) {
+  state = document.__customSeleniumGeneration = {
+    token: Math.random().toString(36).slice(2),
+    count: 0,
+  };
+  new MutationObserver(() => state.count++).observe(document, {
+    subtree: true,
+    childList: true,
+    attributes: true,
+  });
+}
+const current = state.token + ":" + state.count;
+if (current === generation) {
+  return {generation: current, hit: true};
+}
+return {
+  generation: current,
+  hit: false,
+  elements: Array.from(document.querySelectorAll(locator)),
+};
+"""
+
+FIND_SPECIFIC_ELEMENT_SCRIPT = """
+const [locator, index] = arguments;
+const elements = document.querySelectorAll(locator);
+return elements[index < 0 ? elements.length + index : index] || null;
+"""
+
+
+# In-page waits are split into slices shorter than the default 30 s script
+# timeout.
+WAIT_SLICE_SECONDS = 5
+MIN_POLL_INTERVAL = 0.01
+MAX_POLL_INTERVAL = 0.25
+POLL_BACKOFF = 1.5
+
+DEFAULT_SCREENSHOT_DIR = "folder_name"
+SCREENSHOT_FORMATS = {"png": "png", "webp": "webp", "jpeg": "jpg"}
+
+
+class ScreenshotWriter:
+    # Decodes, converts and writes screenshots on background threads, so a
+    # test only pays for the capture itself.
+    def __init__(
+        self,
+        directory: str = DEFAULT_SCREENSHOT_DIR,
+        workers: int = 2,
+        max_pending: int = 32,
+        image_format: str = "png",
+        max_width: int = None,
+        quality: int = 80,
+        max_remembered: int = 1000,
+    ):
+        if image_format not in SCREENSHOT_FORMATS:
+            raise ValueError(f"Unsupported screenshot format {image_format}")
+        if Image is None and (image_format != "png" or max_width):
+            logging.warning("Pillow is not installed, saving screenshots as PNG")
+            image_format, max_width = "png", None
+        self.directory = directory
+        self.image_format = image_format
+        self.max_width = max_width
+        self.quality = quality
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="screenshot"
+        )
+        # Blocks the caller once `max_pending` screenshots wait to be
+        # written, instead of holding an unbounded number in memory.
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        # Paths of the `max_remembered` most recent distinct frames, for
+        # deduplication.
+        self.max_remembered = max_remembered
+        self._paths = OrderedDict()
+        # Paths only collide within the same second, so only the current
+        # second's are kept.
+        self._names = set()
+        self._names_timestamp = None
+        self._futures = set()
+        self.submitted = 0
+        self.written = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.bytes_captured = 0
+        self.bytes_written = 0
+        self.write_seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _reserve_path(self, name: str) -> str:
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        if timestamp != self._names_timestamp:
+            self._names.clear()
+            self._names_timestamp = timestamp
+        extension = SCREENSHOT_FORMATS[self.image_format]
+        file_name = f"test_{name}_{timestamp}"
+        path = os.path.join(self.directory, f"{file_name}.{extension}")
+        number = 1
+        while path in self._names:
+            number += 1
+            path = os.path.join(self.directory, f"{file_name}_{number}.{extension}")
+        self._names.add(path)
+        return path
+
+    def submit(self, screenshot: str, name: str = "") -> str:
+        # Takes a base64 PNG as returned by get_screenshot_as_base64 and
+        # returns the path it will be written to. A frame identical to an
+        # earlier one isn't written again; its earlier path is returned.
+        digest = hashlib.sha1(screenshot.encode("ascii")).hexdigest()
+        with self._lock:
+            self.submitted += 1
+            self.bytes_captured += len(screenshot) * 3 // 4
+            if digest in self._paths:
+                self.deduplicated += 1
+                self._paths.move_to_end(digest)
+                return self._paths[digest]
+            path = self._paths[digest] = self._reserve_path(name)
+            if len(self._paths) > self.max_remembered:
+                self._paths.popitem(last=False)
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._write, screenshot, path, digest)
+        except BaseException:
+            self._slots.release()
+            self._forget(digest, path)
+            raise
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+        return path
+
+    def _forget(self, digest: str, path: str):
+        # The next identical frame gets written instead of pointing at a
+        # file that does not exist.
+        with self._lock:
+            if self._paths.get(digest) == path:
+                del self._paths[digest]
+
+    def _done(self, future):
+        with self._lock:
+            self._futures.discard(future)
+        self._slots.release()
+
+    def _encode(self, data: bytes) -> bytes:
+        if self.image_format == "png" and not self.max_width:
+            return data
+        with Image.open(io.BytesIO(data)) as image:
+            if self.max_width and image.width > self.max_width:
+                height = round(image.height * self.max_width / image.width)
+                image = image.resize((self.max_width, height), Image.LANCZOS)
+            if self.image_format == "jpeg":
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            image.save(output, self.image_format.upper(), quality=self.quality)
+            return output.getvalue()
+
+    def _write(self, screenshot: str, path: str, digest: str):
+        started = time.perf_counter()
+        try:
+            data = self._encode(base64.b64decode(screenshot))
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            partial = path + ".part"
+            with open(partial, "wb") as f:
+                f.write(data)
+            os.replace(partial, path)
+        except Exception:
+            logging.exception(f"Failed to write screenshot {path}")
+            with self._lock:
+                self.failed += 1
+            self._forget(digest, path)
+            return
+        with self._lock:
+            self.written += 1
+            self.bytes_written += len(data)
+            self.write_seconds += time.perf_counter() - started
+
+    def flush(self):
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "written": self.written,
+                "deduplicated": self.deduplicated,
+                "failed": self.failed,
+                "pending": len(self._futures),
+                "bytes_captured": self.bytes_captured,
+                "bytes_written": self.bytes_written,
+                "average_write_seconds": (
+                    self.write_seconds / self.written if self.written else 0.0
+                ),
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+_default_screenshots = None
+_default_screenshots_lock = threading.Lock()
+
+
+def default_screenshot_writer() -> ScreenshotWriter:
+    global _default_screenshots
+    with _default_screenshots_lock:
+        if _default_screenshots is None:
+            _default_screenshots = ScreenshotWriter()
+        return _default_screenshots
+
 
 class CustomSelenium:
-    def __init__(self, driver: WebDriver):
+    def __init__(
+        self,
+        driver: WebDriver,
+        event_waits: bool = True,
+        cache_elements: bool = False,
+        screenshots: ScreenshotWriter = None,
+    ):
         self.driver = driver
+        self.screenshots = screenshots
+        self.event_waits = event_waits
+        self.cache_elements = cache_elements
+        self._element_cache = {}
+        self._cache_generations = {}
+        self._cache_stats = {"hits": 0, "misses": 0, "stale_refetches": 0}
+
+    def _cached_elements(self, locator: str) -> list:
+        # One script call either confirms the cached elements are still
+        # current or returns fresh ones. A hit is still a round trip, like
+        # find_element; it saves the query and sending the element
+        # references back, which matters for locators with many matches.
+        result = self.driver.execute_script(
+            CACHED_ELEMENTS_SCRIPT, locator, self._cache_generations.get(locator)
+        )
+        if result["hit"] and locator in self._element_cache:
+            self._cache_stats["hits"] += 1
+            return self._element_cache[locator]
+        self._cache_stats["misses"] += 1
+        self._element_cache[locator] = result["elements"]
+        self._cache_generations[locator] = result["generation"]
+        return result["elements"]
+
+    def _retry_stale(self, action):
+        # Cached elements go stale when the page replaces them. Drop the
+        # cache and run `action` once more, which looks them up again.
+        try:
+            return action()
+        except StaleElementReferenceException:
+            if not self.cache_elements:
+                raise
+            self._cache_stats["stale_refetches"] += 1
+            self.clear_element_cache()
+            return action()
+
+    def clear_element_cache(self, locator: str = None):
+        if locator is None:
+            self._element_cache.clear()
+            self._cache_generations.clear()
+        else:
+            self._element_cache.pop(locator, None)
+            self._cache_generations.pop(locator, None)
+
+    def element_cache_stats(self) -> dict:
+        lookups = self._cache_stats["hits"] + self._cache_stats["misses"]
+        return dict(
+            self._cache_stats,
+            entries=len(self._element_cache),
+            hit_rate=self._cache_stats["hits"] / lookups if lookups else 0.0,
+        )
+
+    def _poll(self, condition, deadline: float, message: str):
+        # Checks often at first and backs off, so short waits end almost as
+        # soon as the condition holds and long ones don't flood the driver.
+        interval = MIN_POLL_INTERVAL
+        while True:
+            try:
+                value = condition(self.driver)
+                if value:
+                    return value
+            except (NoSuchElementException, StaleElementReferenceException):
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutException(message)
+            time.sleep(min(interval, remaining))
+            interval = min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+
+    def _until(self, condition, timeout: float, message: str = ""):
+        return self._poll(condition, time.monotonic() + timeout, message)
+
+    def _wait(
+        self, condition: str, locator: str, timeout: float, fallback, text: str = ""
+    ):
+        # Waits in the browser until the condition holds. Falls back to
+        # polling `fallback` if the script fails, e.g. on navigation.
+        deadline = time.monotonic() + timeout
+        message = f"Timeout waiting for {condition} on {locator}"
+        while self.event_waits:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutException(message)
+            try:
+                result = self.driver.execute_async_script(
+                    WAIT_SCRIPT,
+                    condition,
+                    locator,
+                    text,
+                    int(min(remaining, WAIT_SLICE_SECONDS) * 1000),
+                )
+            except WebDriverException:
+                logging.debug(f"In-page wait failed for {locator}, polling instead")
+                break
+            if result and result["ok"]:
+                return result["value"]
+        return self._poll(fallback, deadline, message)
 
     def find_element(self, locator: str) -> WebElement:
+        if self.cache_elements:
+            elements = self._cached_elements(locator)
+            if elements:
+                return elements[0]
+            logging.error(f"No element found with locator {locator}")
+            return None
         try:
             element = self.driver.find_element(By.CSS_SELECTOR, locator)
             if element:
@@ -31,6 +476,9 @@ class CustomSelenium:
             return None
 
     def find_elements(self, locator: str) -> list:
+        if self.cache_elements:
+            elements = self._cached_elements(locator)
+            return list(elements) if elements else None
         try:
             elements = self.driver.find_elements(By.CSS_SELECTOR, locator)
             if elements:
@@ -40,22 +488,57 @@ class CustomSelenium:
             return []
 
     def find_specific_element(self, locator: str, index: int) -> WebElement:
-        try:
-            element = self.find_elements(locator)[index]
-            if element:
-                return element
-        except IndexError:
-            logging.exception(
-                f"No element found with index {index} in locator {locator}"
+        # Only the requested element is sent back, not every match.
+        if self.cache_elements:
+            elements = self._cached_elements(locator)
+            element = (
+                elements[index] if -len(elements) <= index < len(elements) else None
             )
-            return None
+        else:
+            element = self.driver.execute_script(
+                FIND_SPECIFIC_ELEMENT_SCRIPT, locator, index
+            )
+        if element:
+            return element
+        logging.error(f"No element found with index {index} in locator {locator}")
+        return None
+
+    def query_elements(
+        self,
+        locators: str | list[str],
+        attributes: list[str] = (),
+        read_hidden: bool = False,
+    ) -> dict[str, list[dict]]:
+        # Text, attributes, visibility and bounding box of every match of every
+        # locator in one round trip, instead of one per element and property.
+        if isinstance(locators, str):
+            locators = [locators]
+        result = self.driver.execute_script(
+            QUERY_ELEMENTS_SCRIPT, list(locators), list(attributes), read_hidden
+        )
+        # Every locator gets a list, even if the page went away mid-call.
+        result = result or {}
+        return {locator: result.get(locator) or [] for locator in locators}
+
+    def get_texts_from_elements(
+        self, locator: str, read_hidden: bool = False
+    ) -> list[str]:
+        matches = self.query_elements(locator, read_hidden=read_hidden)[locator]
+        return [match["text"] for match in matches]
+
+    def get_attributes_from_elements(self, locator: str, attribute: str) -> list:
+        matches = self.query_elements(locator, [attribute])[locator]
+        return [match["attributes"][attribute] for match in matches]
 
     def wait_for_element(
         self, locator: str, timeout: int = default_timeout
     ) -> WebElement:
         try:
-            element = Wait(self.driver, timeout).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, locator))
+            element = self._wait(
+                "present",
+                locator,
+                timeout,
+                EC.presence_of_element_located((By.CSS_SELECTOR, locator)),
             )
             if element:
                 return element
@@ -69,8 +552,11 @@ class CustomSelenium:
         self, locator: str, timeout: int = default_timeout
     ) -> list[WebElement]:
         try:
-            elements = Wait(self.driver, timeout).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, locator))
+            elements = self._wait(
+                "all_present",
+                locator,
+                timeout,
+                EC.presence_of_all_elements_located((By.CSS_SELECTOR, locator)),
             )
             if elements:
                 return elements
@@ -84,8 +570,11 @@ class CustomSelenium:
         self, locator: str, index: int = 0, timeout: int = default_timeout
     ) -> WebElement:
         try:
-            elements = Wait(self.driver, timeout).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, locator))
+            elements = self._wait(
+                "all_present",
+                locator,
+                timeout,
+                EC.presence_of_all_elements_located((By.CSS_SELECTOR, locator)),
             )
             if elements:
                 return elements[index]
@@ -99,8 +588,11 @@ class CustomSelenium:
         self, locator: str, timeout: int = default_timeout
     ) -> bool:
         try:
-            return Wait(self.driver, timeout).until(
-                EC.invisibility_of_element_located((By.CSS_SELECTOR, locator))
+            return self._wait(
+                "invisible",
+                locator,
+                timeout,
+                EC.invisibility_of_element_located((By.CSS_SELECTOR, locator)),
             )
         except TimeoutException:
             logging.exception(
@@ -112,8 +604,12 @@ class CustomSelenium:
         self, locator: str, text: str, timeout: int = default_timeout
     ) -> bool:
         try:
-            return Wait(self.driver, timeout).until(
-                EC.text_to_be_present_in_element((By.CSS_SELECTOR, locator), text)
+            return self._wait(
+                "text",
+                locator,
+                timeout,
+                EC.text_to_be_present_in_element((By.CSS_SELECTOR, locator), text),
+                text,
             )
         except TimeoutException:
             logging.exception(
@@ -133,35 +629,50 @@ class CustomSelenium:
 
     def wait_until_url_is(self, url: str, timeout: int = default_timeout):
         try:
-            return Wait(self.driver, timeout).until(EC.url_to_be(url))
+            return self._until(EC.url_to_be(url), timeout)
         except TimeoutException:
             logging.exception(f"Timeout while waiting for URL to be {url}")
             return False
 
     def wait_until_url_contains(self, url: str, timeout: int = default_timeout):
         try:
-            return Wait(self.driver, timeout).until(EC.url_contains(url))
+            return self._until(EC.url_contains(url), timeout)
         except TimeoutException:
             logging.exception(f"Timeout while waiting for URL to contain {url}")
             return False
 
     def wait_until_title_contains(self, title: str, timeout: int = default_timeout):
         try:
-            return Wait(self.driver, timeout).until(EC.title_contains(title))
+            return self._until(EC.title_contains(title), timeout)
         except TimeoutException:
             logging.exception(f"Timeout while waiting for title to contain {title}")
             return False
 
+    def _present_elements(self, locator: str) -> list:
+        # Cached matches skip the wait; only a cache miss with no matches
+        # waits for them to appear.
+        if self.cache_elements:
+            elements = self._cached_elements(locator)
+            if elements:
+                return elements
+        return self.wait_for_elements(locator)
+
     def is_element_displayed(self, locator: str) -> bool:
-        element = self.find_element(locator)
-        return element.is_displayed() if element else False
+        def displayed():
+            element = self.find_element(locator)
+            return element.is_displayed() if element else False
+
+        return self._retry_stale(displayed)
 
     def is_element_clickable(
         self, locator: str, timeout: int = default_timeout
     ) -> WebElement:
         try:
-            element = Wait(self.driver, timeout).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, locator))
+            element = self._wait(
+                "clickable",
+                locator,
+                timeout,
+                EC.element_to_be_clickable((By.CSS_SELECTOR, locator)),
             )
             if element:
                 return element
@@ -171,7 +682,7 @@ class CustomSelenium:
 
     def check_that_title_is(self, title: str, timeout: int = default_timeout):
         try:
-            return Wait(self.driver, timeout).until(EC.title_is(title))
+            return self._until(EC.title_is(title), timeout)
         except TimeoutException:
             logging.exception(f"Timeout while checking if title is {title}")
             return False
@@ -183,8 +694,11 @@ class CustomSelenium:
         self, locator: str, timeout: int = default_timeout
     ) -> list[WebElement]:
         try:
-            elements = Wait(self.driver, timeout).until(
-                EC.visibility_of_all_elements_located((By.CSS_SELECTOR, locator))
+            elements = self._wait(
+                "all_visible",
+                locator,
+                timeout,
+                EC.visibility_of_all_elements_located((By.CSS_SELECTOR, locator)),
             )
             if elements:
                 return elements
@@ -194,33 +708,254 @@ class CustomSelenium:
             )
 
     def get_attribute_from_element(self, locator: str, attribute: str, index: int = 0):
-        elements = self.wait_for_elements(locator)
-        return elements[index].get_attribute(attribute) if elements else None
+        def read():
+            elements = self._present_elements(locator)
+            return elements[index].get_attribute(attribute) if elements else None
+
+        return self._retry_stale(read)
 
     def move_mouse(self, element: WebElement):
         actions = ActionChains(self.driver)
         actions.move_to_element(element).perform()
 
     def scroll_to_element(self, locator, index: int = 0):
-        elements = self.wait_for_elements(locator)
-        if elements:
-            self.driver.execute_script(
-                "arguments[0].scrollIntoView();", elements[index]
-            )
+        def scroll():
+            elements = self._present_elements(locator)
+            if elements:
+                self.driver.execute_script(
+                    "arguments[0].scrollIntoView();", elements[index]
+                )
+
+        self._retry_stale(scroll)
 
     def element_list_to_text(self, list_of_elements, read_hidden=False):
-        return [
-            element.get_attribute("textContent") if read_hidden else element.text
-            for element in list_of_elements
-        ]
+        if not list_of_elements:
+            return []
+        return self.driver.execute_script(
+            ELEMENT_TEXT_SCRIPT, list(list_of_elements), read_hidden
+        )
 
     def refresh_page(self):
+        self.clear_element_cache()
         self.driver.refresh()
 
-    def take_screenshot(self, name: str = ""):
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        file_name = f"test_{name}_{timestamp}.png"
-        folder_name = "folder_name"
-        os.makedirs(folder_name, exist_ok=True)
-        save_as = f"{folder_name}/{file_name}"
-        self.driver.save_screenshot(save_as)
+    def take_screenshot(self, name: str = "") -> str:
+        # Only the capture happens here; the file is written in the
+        # background.
+        screenshots = self.screenshots or default_screenshot_writer()
+        return screenshots.submit(self.driver.get_screenshot_as_base64(), name)
+
+
+class SessionPool:
+    # Keeps up to `size` browsers running and lends each one to a single
+    # thread at a time, so tests don't pay for a browser launch each.
+    def __init__(
+        self,
+        driver_factory: Callable[[], WebDriver],
+        size: int = 4,
+        max_uses: int = 50,
+        blank_url: str = "about:blank",
+        screenshots: ScreenshotWriter = None,
+    ):
+        self.driver_factory = driver_factory
+        self.screenshots = screenshots
+        self.size = size
+        self.max_uses = max_uses
+        self.blank_url = blank_url
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._uses = {}
+        self._leased = {}
+        self._total = 0
+        self._closed = False
+        self.launches = 0
+        self.launch_seconds = 0.0
+        self.recycles = 0
+        self.recycle_seconds = 0.0
+        self.retired = 0
+        self.leases = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _launch(self) -> WebDriver:
+        started = time.perf_counter()
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            with self._condition:
+                self._total -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.launches += 1
+            self.launch_seconds += time.perf_counter() - started
+            self._uses[id(driver)] = 0
+        return driver
+
+    def start(self):
+        # Launches the missing browsers in parallel before the first lease.
+        with self._condition:
+            missing = self.size - self._total
+            self._total += max(missing, 0)
+        if missing > 0:
+            with ThreadPoolExecutor(max_workers=missing) as executor:
+                futures = [executor.submit(self._launch) for _ in range(missing)]
+            errors = []
+            for future in futures:
+                if future.exception():
+                    errors.append(future.exception())
+                    continue
+                with self._condition:
+                    self._idle.append(future.result())
+                    self._condition.notify()
+            if errors:
+                raise errors[0]
+        return self
+
+    def acquire(self, timeout: float = None) -> CustomSelenium:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Session pool is closed")
+                if self._idle:
+                    driver = self._idle.popleft()
+                    break
+                if self._total < self.size:
+                    self._total += 1
+                    driver = None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutException("No browser session became free")
+                self._condition.wait(remaining)
+        if driver is None:
+            driver = self._launch()
+        session = CustomSelenium(driver, screenshots=self.screenshots)
+        with self._condition:
+            self._leased[id(session)] = driver
+            self.leases += 1
+        return session
+
+    def release(self, session: CustomSelenium, healthy: bool = True):
+        with self._condition:
+            driver = self._leased.pop(id(session))
+            self._uses[id(driver)] += 1
+            retire = (
+                not healthy or self._closed or self._uses[id(driver)] >= self.max_uses
+            )
+        returned = False
+        try:
+            if not retire:
+                self._recycle(driver)
+                with self._condition:
+                    # close() may have run while the session was recycled.
+                    if not self._closed:
+                        self._idle.append(driver)
+                        self._condition.notify()
+                        returned = True
+        except WebDriverException:
+            logging.exception("Could not recycle browser session, retiring it")
+        finally:
+            # Whatever went wrong, the slot must be given back.
+            if not returned:
+                self._retire(driver)
+
+    def _recycle(self, driver: WebDriver):
+        # Clearing state is much cheaper than launching a new browser.
+        started = time.perf_counter()
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        origin = driver.execute_script(CLEAR_STORAGE_SCRIPT)
+        driver.delete_all_cookies()
+        if hasattr(driver, "execute_cdp_cmd"):
+            # Chromium can also drop cookies of other domains and IndexedDB,
+            # Cache Storage and service workers of the current origin.
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            if origin and origin != "null":
+                driver.execute_cdp_cmd(
+                    "Storage.clearDataForOrigin",
+                    {"origin": origin, "storageTypes": "all"},
+                )
+        driver.get(self.blank_url)
+        with self._condition:
+            self.recycles += 1
+            self.recycle_seconds += time.perf_counter() - started
+
+    def _retire(self, driver: WebDriver):
+        with self._condition:
+            self._total -= 1
+            self._uses.pop(id(driver), None)
+            self.retired += 1
+            self._condition.notify()
+        try:
+            driver.quit()
+        except WebDriverException:
+            logging.exception("Error while quitting browser session")
+
+    @contextmanager
+    def lease(self, timeout: float = None):
+        session = self.acquire(timeout)
+        healthy = True
+        try:
+            yield session
+        except WebDriverException:
+            healthy = False
+            raise
+        finally:
+            self.release(session, healthy)
+
+    def run(
+        self, tests: Iterable[Callable[[CustomSelenium], object]], workers: int = None
+    ) -> list[dict]:
+        def run_test(test):
+            name = getattr(test, "__name__", repr(test))
+            started = time.perf_counter()
+            error = None
+            try:
+                with self.lease() as session:
+                    test(session)
+            except Exception as e:
+                logging.exception(f"Test {name} failed")
+                error = e
+            return {
+                "name": name,
+                "passed": error is None,
+                "error": error,
+                "seconds": time.perf_counter() - started,
+            }
+
+        with ThreadPoolExecutor(
+            max_workers=workers or self.size, thread_name_prefix="session-pool"
+        ) as executor:
+            return list(executor.map(run_test, tests))
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "size": self.size,
+                "running": self._total,
+                "idle": len(self._idle),
+                "leases": self.leases,
+                "launches": self.launches,
+                "average_launch_seconds": self.launch_seconds / max(self.launches, 1),
+                "recycles": self.recycles,
+                "average_recycle_seconds": self.recycle_seconds / max(self.recycles, 1),
+                "retired": self.retired,
+            }
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            drivers = list(self._idle)
+            self._idle.clear()
+            self._condition.notify_all()
+        for driver in drivers:
+            self._retire(driver)
@@ -0,0 +1,468 @@
+import base64
+import os
+import time
+
+import pytest
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+    WebDriverException,
+)
+
+from custom_selenium_python import (
+    CACHED_ELEMENTS_SCRIPT,
+    ELEMENT_TEXT_SCRIPT,
+    FIND_SPECIFIC_ELEMENT_SCRIPT,
+    QUERY_ELEMENTS_SCRIPT,
+    WAIT_SCRIPT,
+    CustomSelenium,
+    ScreenshotWriter,
+    SessionPool,
+)
+
+
+class StubDriver:
+    def __init__(self, fail_with=None, on_get=None):
+        self.fail_with = fail_with
+        self.on_get = on_get
+        self.window_handles = ["main"]
+        self.switch_to = self
+        self.quit_calls = 0
+        self.frame = b"frame"
+
+    def window(self, handle):
+        pass
+
+    def execute_script(self, script, *args):
+        return "null"
+
+    def delete_all_cookies(self):
+        pass
+
+    def get(self, url):
+        if self.on_get:
+            self.on_get()
+        if self.fail_with:
+            raise self.fail_with
+
+    def quit(self):
+        self.quit_calls += 1
+
+    def get_screenshot_as_base64(self):
+        return base64.b64encode(self.frame).decode("ascii")
+
+
+class StubElement:
+    def __init__(self, name, displayed=True, text="", attributes=None):
+        self.name = name
+        self.displayed = displayed
+        self.text = text
+        self.attributes = attributes or {}
+        self.stale = False
+
+    def text_for(self, read_hidden):
+        return self.text if self.displayed or read_hidden else ""
+
+    def is_displayed(self):
+        if self.stale:
+            raise StaleElementReferenceException(self.name)
+        return self.displayed
+
+
+class PageDriver:
+    # Answers the library's scripts from an in-memory page. `token` and
+    # `mutations` play the part of the page's generation counter.
+    def __init__(self, elements):
+        self.elements = elements
+        self.token = 0
+        self.mutations = 0
+        self.scripts = []
+        # Locators left out of query results, as if the page went away.
+        self.dropped = set()
+        # Applied while the next in-page wait is running, like a mutation.
+        self.scheduled = None
+        self.wait_error = None
+        self.wait_result = None
+
+    def mutate(self, elements):
+        self.elements.update(elements)
+        self.mutations += 1
+
+    def navigate(self, elements):
+        for matches in self.elements.values():
+            for element in matches:
+                element.stale = True
+        self.elements = elements
+        self.token += 1
+        self.mutations = 0
+
+    def refresh(self):
+        self.navigate(
+            {
+                locator: [StubElement(element.name) for element in matches]
+                for locator, matches in self.elements.items()
+            }
+        )
+
+    def execute_script(self, script, *args):
+        self.scripts.append(script)
+        if script == CACHED_ELEMENTS_SCRIPT:
+            locator, generation = args
+            current = f"{self.token}:{self.mutations}"
+            if current == generation:
+                return {"generation": current, "hit": True}
+            return {
+                "generation": current,
+                "hit": False,
+                "elements": list(self.elements.get(locator, [])),
+            }
+        if script == QUERY_ELEMENTS_SCRIPT:
+            locators, attributes, read_hidden = args
+            return {
+                locator: [
+                    {
+                        "element": element,
+                        "text": element.text_for(read_hidden),
+                        "attributes": {
+                            name: element.attributes.get(name) for name in attributes
+                        },
+                        "visible": element.displayed,
+                        "rect": {"x": 0, "y": 0, "width": 10, "height": 10},
+                    }
+                    for element in self.elements.get(locator, [])
+                ]
+                for locator in locators
+                if locator not in self.dropped
+            }
+        if script == ELEMENT_TEXT_SCRIPT:
+            elements, read_hidden = args
+            return [element.text_for(read_hidden) for element in elements]
+        if script == FIND_SPECIFIC_ELEMENT_SCRIPT:
+            locator, index = args
+            elements = self.elements.get(locator, [])
+            return elements[index] if -len(elements) <= index < len(elements) else None
+        raise AssertionError("Unexpected script")
+
+    def find_element(self, by, locator):
+        if not self.elements.get(locator):
+            raise NoSuchElementException(locator)
+        return self.elements[locator][0]
+
+    def find_elements(self, by, locator):
+        return list(self.elements.get(locator, []))
+
+    def _check(self, condition, locator, text):
+        elements = self.elements.get(locator, [])
+        if condition == "present":
+            return elements[0] if elements else None
+        if condition == "all_present":
+            return list(elements) or None
+        if condition == "invisible":
+            return not elements or not elements[0].displayed
+        if condition == "text":
+            return bool(elements) and text in elements[0].text_for(False)
+        raise AssertionError("Unexpected condition")
+
+    def execute_async_script(self, script, condition, locator, text, timeout):
+        assert script == WAIT_SCRIPT
+        self.scripts.append(script)
+        if self.wait_error:
+            raise self.wait_error
+        if self.wait_result is not None:
+            return self.wait_result
+        value = self._check(condition, locator, text)
+        if not value and self.scheduled:
+            self.scheduled()
+            self.scheduled = None
+            value = self._check(condition, locator, text)
+        if not value:
+            time.sleep(timeout / 1000)
+        return {"ok": bool(value), "value": value or None}
+
+
+def _pool(*drivers):
+    drivers = list(drivers)
+    return SessionPool(lambda: drivers.pop(0), size=1)
+
+
+def test_release_reuses_a_recycled_driver():
+    driver = StubDriver()
+    pool = _pool(driver)
+    pool.release(pool.acquire())
+    assert pool.acquire(timeout=1).driver is driver
+    assert pool.recycles == 1
+    assert pool.launches == 1
+
+
+def test_release_retires_a_driver_that_fails_to_recycle():
+    driver = StubDriver(fail_with=WebDriverException("gone"))
+    replacement = StubDriver()
+    pool = _pool(driver, replacement)
+    pool.release(pool.acquire())
+    assert driver.quit_calls == 1
+    assert pool.acquire(timeout=1).driver is replacement
+
+
+def test_release_frees_the_slot_when_recycling_raises():
+    driver = StubDriver(fail_with=RuntimeError("unexpected"))
+    replacement = StubDriver()
+    pool = _pool(driver, replacement)
+    with pytest.raises(RuntimeError):
+        pool.release(pool.acquire())
+    assert driver.quit_calls == 1
+    assert pool.retired == 1
+    assert pool.acquire(timeout=1).driver is replacement
+
+
+def test_close_while_recycling_quits_the_driver():
+    driver = StubDriver()
+    pool = _pool(driver)
+    driver.on_get = pool.close
+    pool.release(pool.acquire())
+    assert driver.quit_calls == 1
+    with pytest.raises(RuntimeError):
+        pool.acquire(timeout=1)
+
+
+def test_screenshots_are_written_by_flush_and_close(tmp_path):
+    driver = StubDriver()
+    writer = ScreenshotWriter(str(tmp_path))
+    session = CustomSelenium(driver, screenshots=writer)
+    first = session.take_screenshot("a")
+    assert session.take_screenshot("a") == first
+    driver.frame = b"other"
+    second = session.take_screenshot("b")
+    writer.flush()
+    assert open(first, "rb").read() == b"frame"
+    assert writer.stats()["written"] == 2
+    assert writer.stats()["deduplicated"] == 1
+
+    driver.frame = b"last"
+    last = session.take_screenshot("c")
+    writer.close()
+    assert open(last, "rb").read() == b"last"
+    assert open(second, "rb").read() == b"other"
+    assert writer.stats()["pending"] == 0
+    driver.frame = b"after close"
+    with pytest.raises(RuntimeError):
+        session.take_screenshot("d")
+    assert len(writer._paths) == 3
+
+
+def test_failed_screenshots_are_not_deduplicated(tmp_path):
+    blocker = tmp_path / "screenshots"
+    blocker.write_text("not a directory")
+    writer = ScreenshotWriter(str(blocker))
+    session = CustomSelenium(StubDriver(), screenshots=writer)
+    failed = session.take_screenshot("a")
+    writer.flush()
+    assert writer.stats()["failed"] == 1
+
+    blocker.unlink()
+    path = session.take_screenshot("a")
+    writer.close()
+    assert path != failed
+    assert os.path.exists(path)
+    assert writer.stats()["deduplicated"] == 0
+
+
+def test_screenshot_dedup_remembers_recent_frames_only(tmp_path):
+    driver = StubDriver()
+    with ScreenshotWriter(str(tmp_path), max_remembered=2) as writer:
+        session = CustomSelenium(driver, screenshots=writer)
+        paths = {}
+        for frame in (b"a", b"b", b"a", b"c", b"b"):
+            driver.frame = frame
+            paths.setdefault(frame, set()).add(session.take_screenshot(frame.decode()))
+    assert len(writer._paths) == 2
+    assert writer.stats()["deduplicated"] == 1
+    assert [len(paths[frame]) for frame in (b"a", b"b", b"c")] == [1, 2, 1]
+
+
+def test_element_cache_hit_reuses_elements():
+    button = StubElement("button")
+    driver = PageDriver({"#b": [button]})
+    session = CustomSelenium(driver, cache_elements=True)
+    assert session.find_element("#b") is button
+    assert session.find_element("#b") is button
+    assert session.find_elements("#b") == [button]
+    stats = session.element_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+    # Every lookup, hit or miss, is one script call.
+    assert len(driver.scripts) == 3
+
+
+def test_element_cache_misses_after_a_mutation():
+    driver = PageDriver({"#b": [StubElement("old")]})
+    session = CustomSelenium(driver, cache_elements=True)
+    session.find_element("#b")
+    new = StubElement("new")
+    driver.mutate({"#b": [new]})
+    assert session.find_element("#b") is new
+    assert session.element_cache_stats()["misses"] == 2
+    assert session.find_element("#missing") is None
+
+
+def test_stale_cached_element_is_refetched():
+    old = StubElement("old")
+    driver = PageDriver({"#b": [old]})
+    session = CustomSelenium(driver, cache_elements=True)
+    assert session.is_element_displayed("#b")
+    # A change the observer can't see, e.g. inside a shadow root.
+    old.stale = True
+    driver.elements = {"#b": [StubElement("new", displayed=False)]}
+    assert session.is_element_displayed("#b") is False
+    stats = session.element_cache_stats()
+    assert stats["stale_refetches"] == 1
+    assert stats["misses"] == 2
+
+
+def test_stale_element_is_raised_without_the_cache():
+    element = StubElement("old")
+    element.stale = True
+    session = CustomSelenium(PageDriver({"#b": [element]}))
+    with pytest.raises(StaleElementReferenceException):
+        session.is_element_displayed("#b")
+
+
+def test_element_cache_is_invalidated_by_navigation_and_refresh():
+    first = StubElement("first")
+    driver = PageDriver({"#b": [first]})
+    session = CustomSelenium(driver, cache_elements=True)
+    session.find_element("#b")
+
+    second = StubElement("second")
+    driver.navigate({"#b": [second]})
+    assert session.find_element("#b") is second
+
+    session.refresh_page()
+    assert session.element_cache_stats()["entries"] == 0
+    refreshed = session.find_element("#b")
+    assert refreshed is not second and refreshed.name == "second"
+    stats = session.element_cache_stats()
+    assert (stats["hits"], stats["misses"]) == (0, 3)
+
+
+def _table():
+    return PageDriver(
+        {
+            "tr": [
+                StubElement("r1", text="one", attributes={"data-id": "1"}),
+                StubElement("r2", text="two"),
+                StubElement("r3", displayed=False, text="three"),
+            ],
+            "h1": [StubElement("h1", text="Title")],
+        }
+    )
+
+
+def test_query_elements_unpacks_every_locator_in_one_call():
+    driver = _table()
+    session = CustomSelenium(driver)
+    result = session.query_elements(["tr", "h1", ".none"], ["data-id"])
+    assert len(driver.scripts) == 1
+    assert [match["text"] for match in result["tr"]] == ["one", "two", ""]
+    assert [match["visible"] for match in result["tr"]] == [True, True, False]
+    assert result["tr"][0]["attributes"] == {"data-id": "1"}
+    assert result["h1"][0]["element"].name == "h1"
+    assert result[".none"] == []
+
+
+def test_query_elements_fills_in_partial_results():
+    driver = _table()
+    driver.dropped = {"h1"}
+    session = CustomSelenium(driver)
+    result = session.query_elements(["tr", "h1"])
+    assert len(result["tr"]) == 3
+    assert result["h1"] == []
+    assert session.get_texts_from_elements("h1") == []
+
+
+def test_batch_readers_return_texts_and_attributes():
+    session = CustomSelenium(_table())
+    assert session.get_texts_from_elements("tr") == ["one", "two", ""]
+    assert session.get_texts_from_elements("tr", read_hidden=True) == [
+        "one",
+        "two",
+        "three",
+    ]
+    assert session.get_attributes_from_elements("tr", "data-id") == ["1", None, None]
+    assert session.get_texts_from_elements(".none") == []
+
+
+def test_element_list_to_text_uses_one_call():
+    driver = _table()
+    session = CustomSelenium(driver)
+    rows = driver.elements["tr"]
+    assert session.element_list_to_text(rows) == ["one", "two", ""]
+    assert session.element_list_to_text(rows, read_hidden=True)[2] == "three"
+    assert len(driver.scripts) == 2
+    assert session.element_list_to_text([]) == []
+    assert session.element_list_to_text(None) == []
+    assert len(driver.scripts) == 2
+
+
+def test_find_specific_element_handles_missing_indexes():
+    driver = _table()
+    session = CustomSelenium(driver)
+    assert session.find_specific_element("tr", 1).name == "r2"
+    assert session.find_specific_element("tr", -1).name == "r3"
+    assert session.find_specific_element("tr", 3) is None
+    assert session.find_specific_element(".none", 0) is None
+    cached = CustomSelenium(driver, cache_elements=True)
+    assert cached.find_specific_element("tr", -3).name == "r1"
+    assert cached.find_specific_element("tr", 5) is None
+
+
+def test_wait_returns_at_once_when_the_condition_holds():
+    driver = _table()
+    session = CustomSelenium(driver)
+    assert session.wait_for_element("h1").name == "h1"
+    assert [e.name for e in session.wait_for_elements("tr")] == ["r1", "r2", "r3"]
+    assert session.wait_for_specific_element("tr", 2).name == "r3"
+    assert session.wait_for_text_in_element("h1", "Tit") is True
+    assert session.wait_until_element_invisible(".none") is True
+    assert len(driver.scripts) == 5
+
+
+def test_wait_resolves_after_a_mutation():
+    driver = _table()
+    session = CustomSelenium(driver)
+    element = StubElement("late", text="ready")
+    driver.scheduled = lambda: driver.mutate({"#late": [element]})
+    assert session.wait_for_element("#late", timeout=5) is element
+    assert len(driver.scripts) == 1
+
+    driver.scheduled = lambda: setattr(element, "displayed", False)
+    assert session.wait_until_element_invisible("#late", timeout=5) is True
+
+
+def test_wait_times_out():
+    driver = _table()
+    session = CustomSelenium(driver)
+    started = time.monotonic()
+    with pytest.raises(TimeoutException):
+        session._wait("present", "#never", 0.05, lambda driver: None)
+    assert time.monotonic() - started < 1
+    assert session.wait_for_element("#never", timeout=0.05) is None
+    assert session.wait_for_elements("#never", timeout=0.05) == []
+    assert session.wait_for_text_in_element("h1", "nope", timeout=0.05) is False
+
+
+def test_wait_keeps_waiting_on_an_empty_result():
+    driver = _table()
+    driver.wait_result = {"ok": False, "value": None}
+    session = CustomSelenium(driver)
+    with pytest.raises(TimeoutException):
+        session._wait("present", "h1", 0.05, lambda driver: None)
+    assert len(driver.scripts) > 1
+
+
+def test_wait_falls_back_to_polling_when_the_script_fails():
+    driver = _table()
+    driver.wait_error = WebDriverException("navigated away")
+    session = CustomSelenium(driver)
+    assert session.wait_for_element("h1", timeout=1).name == "h1"
+    assert session.wait_for_element("#never", timeout=0.05) is None
+    assert CustomSelenium(driver, event_waits=False).wait_for_element("h1").name == "h1"
@@ -1,43 +1,302 @@
-from flask import Flask, jsonify, request
+import math
+import os
+
+from flask import Flask, Response, g, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+import json_codec
+import wire_format
+from metrics import PROFILE_INTERVAL, RequestMetrics, sample_stacks
+from settings import (
+    IMPORT_CHUNK_SIZE,
+    MAX_BATCH_SIZE,
+    PROFILER_ENABLED,
+    create_data_store,
+    create_response_cache,
+)
+
+
+class CodecJSONProvider(DefaultJSONProvider):
+    # Request parsing and jsonify go through json_codec, so both servers
+    # produce the same bytes whichever JSON library is in use.
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return json_codec.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return json_codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            json_codec.dumps(obj) + b"\n", mimetype=self.mimetype
+        )
+
 
 app = Flask(__name__)
+app.json = CodecJSONProvider(app)
+
+response_cache = create_response_cache()
+data_store = create_data_store(on_change=response_cache.invalidate)
+request_metrics = RequestMetrics()
+
+_missing = object()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = request_metrics.start()
+
 
-data_store = {}
+@app.after_request
+def record_request(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    request_metrics.observe(
+        request.method, route, response.status_code, g.request_started
+    )
+    return response
+
+
+@app.teardown_request
+def finish_request(exception):
+    if "request_started" in g:
+        request_metrics.finish()
+
+
+def _ttl(data=None):
+    value = request.args.get("ttl")
+    if value is None and isinstance(data, dict):
+        value = data.get("ttl")
+    if value is None:
+        return None, None
+    try:
+        ttl = float(value)
+    except (TypeError, ValueError):
+        ttl = 0
+    if not (math.isfinite(ttl) and ttl > 0):
+        return None, _reply({"error": "ttl must be a positive number"}, 400)
+    return ttl, None
+
+
+def _negotiate():
+    return wire_format.negotiate(
+        request.headers.get("Accept"), request.headers.get("Accept-Encoding")
+    )
+
+
+def _send(body, media_type, encoding, status=200, etag=None):
+    headers = {"Vary": wire_format.VARY}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if etag:
+        headers["ETag"] = etag
+    return Response(body, status=status, mimetype=media_type, headers=headers)
+
+
+def _reply(data, status=200):
+    media_type, encoding = _negotiate()
+    body, encoding = wire_format.compress(wire_format.dumps(media_type, data), encoding)
+    return _send(body, media_type, encoding, status)
+
+
+def _request_data(silent=False, required=()):
+    # The body must be an object holding the `required` fields. With silent,
+    # anything else comes back as None and the caller reports what it
+    # expected instead.
+    if wire_format.is_plain_json(request.content_type, request.content_encoding):
+        data = request.get_json(silent=True)
+    else:
+        try:
+            data = wire_format.loads(
+                request.content_type, request.content_encoding, request.get_data()
+            )
+        except wire_format.UnsupportedMediaType as e:
+            return None, _reply({"error": str(e)}, 415)
+        except ValueError:
+            if silent:
+                return None, None
+            return None, _reply({"error": "Invalid request body"}, 400)
+    if silent or (isinstance(data, dict) and all(field in data for field in required)):
+        return data, None
+    return None, _reply({"error": "Expected a JSON body"}, 400)
 
 
 @app.route("/api/data/<string:key>", methods=["GET"])
 def get_data(key):
-    if key in data_store:
-        return jsonify({key: data_store[key]})
+    media_type, encoding = _negotiate()
+    variant = wire_format.variant(media_type, encoding)
+    value, version, encoded = data_store.get_encoded(key, _missing)
+    if value is not _missing:
+        etag, body, encoding = response_cache.respond(
+            key,
+            version,
+            request.headers.get("If-None-Match"),
+            lambda: wire_format.compress(
+                wire_format.dumps_entry(media_type, key, value, encoded), encoding
+            ),
+            cache=encoded is None or bool(variant),
+            variant=variant,
+        )
+        if body is None:
+            return Response(
+                status=304, headers={"ETag": etag, "Vary": wire_format.VARY}
+            )
+        return _send(body, media_type, encoding, etag=etag)
     else:
-        return jsonify({"error": "Key not found"}), 404
+        return _reply({"error": "Key not found"}, 404)
 
 
 @app.route("/api/data", methods=["POST"])
 def post_data():
-    data = request.json
-    data_store.update(data)
-    return jsonify(data), 201
+    data, error = _request_data()
+    if error:
+        return error
+    ttl, error = _ttl()
+    if error:
+        return error
+    data_store.update(data, ttl=ttl)
+    return _reply(data, 201)
 
 
 @app.route("/api/data/<string:key>", methods=["PUT"])
 def put_data(key):
-    data = request.json
-    if key in data_store:
-        data_store[key] = data["value"]
-        return jsonify({key: data_store[key]})
+    data, error = _request_data(required=("value",))
+    if error:
+        return error
+    ttl, error = _ttl(data)
+    if error:
+        return error
+    if data_store.replace(key, data["value"], ttl=ttl):
+        return _reply({key: data["value"]})
     else:
-        return jsonify({"error": "Key not found"}), 404
+        return _reply({"error": "Key not found"}, 404)
 
 
 @app.route("/api/data/<string:key>", methods=["DELETE"])
 def delete_data(key):
-    if key in data_store:
-        del data_store[key]
-        return jsonify({"message": "Deleted"}), 200
+    if data_store.pop(key, _missing) is not _missing:
+        return _reply({"message": "Deleted"}, 200)
     else:
-        return jsonify({"error": "Key not found"}), 404
+        return _reply({"error": "Key not found"}, 404)
+
+
+def _batch_keys():
+    data, error = _request_data(silent=True)
+    if error:
+        return None, error
+    keys = data.get("keys") if isinstance(data, dict) else None
+    if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+        return None, (jsonify({"error": "Expected a list of keys"}), 400)
+    if len(keys) > MAX_BATCH_SIZE:
+        return None, (jsonify({"error": "Too many keys"}), 413)
+    return keys, None
+
+
+@app.route("/api/data/batch/get", methods=["POST"])
+def batch_get_data():
+    keys, error = _batch_keys()
+    if error:
+        return error
+    found, missing = data_store.get_many(keys)
+    return jsonify({"found": found, "missing": missing})
+
+
+@app.route("/api/data/batch/put", methods=["POST"])
+def batch_put_data():
+    data, error = _request_data(silent=True)
+    if error:
+        return error
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected an object of key/value pairs"}), 400
+    if len(data) > MAX_BATCH_SIZE:
+        return jsonify({"error": "Too many keys"}), 413
+    ttl, error = _ttl()
+    if error:
+        return error
+    updated, missing = data_store.replace_many(data, ttl=ttl)
+    return jsonify({"updated": updated, "missing": missing})
+
+
+@app.route("/api/data/batch/delete", methods=["POST"])
+def batch_delete_data():
+    keys, error = _batch_keys()
+    if error:
+        return error
+    deleted, missing = data_store.delete_many(keys)
+    return jsonify({"deleted": deleted, "missing": missing})
+
+
+@app.route("/api/data", methods=["GET"])
+def scan_data():
+    limit = request.args.get("limit", type=int)
+    if limit is None or not 0 < limit <= MAX_BATCH_SIZE:
+        limit = MAX_BATCH_SIZE
+    items = data_store.scan(
+        prefix=request.args.get("prefix", ""),
+        start=request.args.get("start"),
+        end=request.args.get("end"),
+        limit=limit + 1,
+    )
+    next_key = items.pop()[0] if len(items) > limit else None
+    return jsonify({"items": dict(items), "next": next_key})
+
+
+@app.route("/api/data/import", methods=["POST"])
+def import_data():
+    # Reads the body line by line so large imports are never held in memory.
+    ttl, error = _ttl()
+    if error:
+        return error
+    imported, errors, chunk = 0, [], {}
+    for number, line in enumerate(request.stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json_codec.loads(line)
+        except ValueError:
+            errors.append({"line": number, "error": "Invalid JSON"})
+            continue
+        if not isinstance(record, dict):
+            errors.append({"line": number, "error": "Expected an object"})
+            continue
+        chunk.update(record)
+        imported += len(record)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            data_store.update(chunk, ttl=ttl)
+            chunk = {}
+    if chunk:
+        data_store.update(chunk, ttl=ttl)
+    status = 201 if imported or not errors else 400
+    return jsonify({"imported": imported, "errors": errors}), status
+
+
+@app.route("/api/stats", methods=["GET"])
+def stats():
+    return jsonify(_stats())
+
+
+def _stats():
+    return dict(data_store.stats(), response_cache=response_cache.stats())
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(
+        request_metrics.render(_stats()), mimetype="text/plain; version=0.0.4"
+    )
+
+
+@app.route("/debug/profile", methods=["GET"])
+def profile():
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "Profiler disabled"}), 404
+    seconds = request.args.get("seconds", 10.0, type=float)
+    interval = request.args.get("interval", PROFILE_INTERVAL, type=float)
+    return Response(sample_stacks(seconds, interval), mimetype="text/plain")
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", "5000")))
@@ -0,0 +1,359 @@
+import math
+import os
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+
+import json_codec
+import wire_format
+from metrics import PROFILE_INTERVAL, RequestMetrics, sample_stacks
+from settings import (
+    BLOCKING_STORE,
+    IMPORT_CHUNK_SIZE,
+    MAX_BATCH_SIZE,
+    PERSISTENCE_DIR,
+    PROFILER_ENABLED,
+    create_data_store,
+    create_response_cache,
+)
+
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", "5000"))
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+response_cache = create_response_cache()
+data_store = create_data_store(on_change=response_cache.invalidate)
+request_metrics = RequestMetrics()
+
+_missing = object()
+
+
+async def _call(func, *args, **kwargs):
+    if not BLOCKING_STORE:
+        return func(*args, **kwargs)
+    return await run_in_threadpool(func, *args, **kwargs)
+
+
+def _dumps(data):
+    # Byte-for-byte the same output as the Flask app's JSON provider.
+    return json_codec.dumps(data) + b"\n"
+
+
+def jsonify(data, status_code=200):
+    return Response(_dumps(data), status_code, media_type="application/json")
+
+
+async def _request_data(request, silent=False, required=()):
+    # Any body the client may send (JSON or MessagePack, optionally
+    # compressed), decoded and checked like the Flask app does.
+    content_type = request.headers.get("content-type")
+    content_encoding = request.headers.get("content-encoding")
+    try:
+        data = wire_format.loads(content_type, content_encoding, await request.body())
+    except wire_format.UnsupportedMediaType as e:
+        return None, _reply(request, {"error": str(e)}, 415)
+    except ValueError:
+        if silent:
+            return None, None
+        if not wire_format.is_plain_json(content_type, content_encoding):
+            return None, _reply(request, {"error": "Invalid request body"}, 400)
+        data = None
+    if silent or (isinstance(data, dict) and all(field in data for field in required)):
+        return data, None
+    return None, _reply(request, {"error": "Expected a JSON body"}, 400)
+
+
+def _negotiate(request):
+    return wire_format.negotiate(
+        request.headers.get("accept"), request.headers.get("accept-encoding")
+    )
+
+
+def _send(body, media_type, encoding, status_code=200, etag=None):
+    headers = {"Vary": wire_format.VARY}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if etag:
+        headers["ETag"] = etag
+    return Response(body, status_code, headers=headers, media_type=media_type)
+
+
+def _reply(request, data, status_code=200):
+    media_type, encoding = _negotiate(request)
+    body, encoding = wire_format.compress(wire_format.dumps(media_type, data), encoding)
+    return _send(body, media_type, encoding, status_code)
+
+
+def _ttl(request, data=None):
+    value = request.query_params.get("ttl")
+    if value is None and isinstance(data, dict):
+        value = data.get("ttl")
+    if value is None:
+        return None, None
+    try:
+        ttl = float(value)
+    except (TypeError, ValueError):
+        ttl = 0
+    if not (math.isfinite(ttl) and ttl > 0):
+        return None, _reply(request, {"error": "ttl must be a positive number"}, 400)
+    return ttl, None
+
+
+async def get_data(request):
+    key = request.path_params["key"]
+    media_type, encoding = _negotiate(request)
+    variant = wire_format.variant(media_type, encoding)
+    value, version, encoded = await _call(data_store.get_encoded, key, _missing)
+    if value is not _missing:
+        etag, body, encoding = response_cache.respond(
+            key,
+            version,
+            request.headers.get("if-none-match"),
+            lambda: wire_format.compress(
+                wire_format.dumps_entry(media_type, key, value, encoded), encoding
+            ),
+            cache=encoded is None or bool(variant),
+            variant=variant,
+        )
+        if body is None:
+            return Response(
+                status_code=304, headers={"ETag": etag, "Vary": wire_format.VARY}
+            )
+        return _send(body, media_type, encoding, etag=etag)
+    else:
+        return _reply(request, {"error": "Key not found"}, 404)
+
+
+async def post_data(request):
+    data, error = await _request_data(request)
+    if error:
+        return error
+    ttl, error = _ttl(request)
+    if error:
+        return error
+    await _call(data_store.update, data, ttl=ttl)
+    return _reply(request, data, 201)
+
+
+async def put_data(request):
+    key = request.path_params["key"]
+    data, error = await _request_data(request, required=("value",))
+    if error:
+        return error
+    ttl, error = _ttl(request, data)
+    if error:
+        return error
+    if await _call(data_store.replace, key, data["value"], ttl=ttl):
+        return _reply(request, {key: data["value"]})
+    else:
+        return _reply(request, {"error": "Key not found"}, 404)
+
+
+async def delete_data(request):
+    key = request.path_params["key"]
+    if await _call(data_store.pop, key, _missing) is not _missing:
+        return _reply(request, {"message": "Deleted"}, 200)
+    else:
+        return _reply(request, {"error": "Key not found"}, 404)
+
+
+async def _batch_keys(request):
+    data, error = await _request_data(request, silent=True)
+    if error:
+        return None, error
+    keys = data.get("keys") if isinstance(data, dict) else None
+    if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+        return None, jsonify({"error": "Expected a list of keys"}, 400)
+    if len(keys) > MAX_BATCH_SIZE:
+        return None, jsonify({"error": "Too many keys"}, 413)
+    return keys, None
+
+
+async def batch_get_data(request):
+    keys, error = await _batch_keys(request)
+    if error:
+        return error
+    found, missing = await _call(data_store.get_many, keys)
+    return jsonify({"found": found, "missing": missing})
+
+
+async def batch_put_data(request):
+    data, error = await _request_data(request, silent=True)
+    if error:
+        return error
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected an object of key/value pairs"}, 400)
+    if len(data) > MAX_BATCH_SIZE:
+        return jsonify({"error": "Too many keys"}, 413)
+    ttl, error = _ttl(request)
+    if error:
+        return error
+    updated, missing = await _call(data_store.replace_many, data, ttl=ttl)
+    return jsonify({"updated": updated, "missing": missing})
+
+
+async def batch_delete_data(request):
+    keys, error = await _batch_keys(request)
+    if error:
+        return error
+    deleted, missing = await _call(data_store.delete_many, keys)
+    return jsonify({"deleted": deleted, "missing": missing})
+
+
+async def scan_data(request):
+    try:
+        limit = int(request.query_params["limit"])
+    except (KeyError, ValueError):
+        limit = None
+    if limit is None or not 0 < limit <= MAX_BATCH_SIZE:
+        limit = MAX_BATCH_SIZE
+    items = await _call(
+        data_store.scan,
+        prefix=request.query_params.get("prefix", ""),
+        start=request.query_params.get("start"),
+        end=request.query_params.get("end"),
+        limit=limit + 1,
+    )
+    next_key = items.pop()[0] if len(items) > limit else None
+    return jsonify({"items": dict(items), "next": next_key})
+
+
+async def _lines(request):
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def import_data(request):
+    ttl, error = _ttl(request)
+    if error:
+        return error
+    imported, errors, chunk, number = 0, [], {}, 0
+    async for line in _lines(request):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json_codec.loads(line)
+        except ValueError:
+            errors.append({"line": number, "error": "Invalid JSON"})
+            continue
+        if not isinstance(record, dict):
+            errors.append({"line": number, "error": "Expected an object"})
+            continue
+        chunk.update(record)
+        imported += len(record)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await _call(data_store.update, chunk, ttl=ttl)
+            chunk = {}
+    if chunk:
+        await _call(data_store.update, chunk, ttl=ttl)
+    status = 201 if imported or not errors else 400
+    return jsonify({"imported": imported, "errors": errors}, status)
+
+
+async def _stats():
+    stats = await _call(data_store.stats)
+    return dict(stats, response_cache=response_cache.stats())
+
+
+async def stats(request):
+    return jsonify(await _stats())
+
+
+async def metrics(request):
+    return Response(
+        request_metrics.render(await _stats()),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+def _float_param(request, name, default):
+    try:
+        return float(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+async def profile(request):
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "Profiler disabled"}, 404)
+    # Sampling sleeps between samples, so keep it off the event loop.
+    stacks = await run_in_threadpool(
+        sample_stacks,
+        _float_param(request, "seconds", 10.0),
+        _float_param(request, "interval", PROFILE_INTERVAL),
+    )
+    return PlainTextResponse(stacks)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = request_metrics.start()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            request_metrics.observe(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status,
+                started,
+            )
+            request_metrics.finish()
+
+
+routes = [
+    Route("/api/data/batch/get", batch_get_data, methods=["POST"]),
+    Route("/api/data/batch/put", batch_put_data, methods=["POST"]),
+    Route("/api/data/batch/delete", batch_delete_data, methods=["POST"]),
+    Route("/api/data/import", import_data, methods=["POST"]),
+    Route("/api/data/{key}", get_data, methods=["GET"]),
+    Route("/api/data/{key}", put_data, methods=["PUT"]),
+    Route("/api/data/{key}", delete_data, methods=["DELETE"]),
+    Route("/api/data", post_data, methods=["POST"]),
+    Route("/api/data", scan_data, methods=["GET"]),
+    Route("/api/stats", stats, methods=["GET"]),
+    Route("/metrics", metrics, methods=["GET"]),
+    Route("/debug/profile", profile, methods=["GET"]),
+]
+
+app = Starlette(routes=routes, middleware=[Middleware(MetricsMiddleware)])
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    if PERSISTENCE_DIR and WORKERS > 1:
+        raise SystemExit("KV_PERSISTENCE_DIR needs a single worker process")
+    # Passing the app object serves the store built above. Worker processes
+    # need an import string instead, and each builds its own store.
+    uvicorn.run(
+        app if WORKERS == 1 else "asgi_app:app",
+        host=HOST,
+        port=PORT,
+        workers=WORKERS,
+        log_level="warning",
+    )
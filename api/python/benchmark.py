@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+from loadgen import LoadGenerator
+
+MIX = "get=80,put=20"
+SERVERS = {
+    "flask": [sys.executable, "app.py"],
+    "uvicorn": [sys.executable, "asgi_app.py"],
+}
+
+
+async def wait_for_server(url, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url + "/_ready"):
+                    return
+            except aiohttp.ClientConnectionError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+
+def drive(url, concurrency, duration, keys):
+    generator = LoadGenerator(
+        url, concurrency=concurrency, duration=duration, keys=keys, mix=MIX
+    )
+    report = asyncio.run(generator.run())
+    percentiles = report["latency"]["percentiles_us"]
+    return {
+        "requests": report["count"],
+        "errors": report["errors"],
+        "rps": report["throughput"],
+        "p50_ms": percentiles["p50"] / 1000,
+        "p99_ms": percentiles["p99"] / 1000,
+    }
+
+
+def run(server, port, concurrency, duration, keys, env=None):
+    url = "http://127.0.0.1:%d/api/data" % port
+    process = subprocess.Popen(
+        SERVERS[server],
+        env=dict(os.environ, PORT=str(port), **(env or {})),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        asyncio.run(wait_for_server(url))
+        return drive(url, concurrency, duration, keys)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the Flask and uvicorn servers under the same load."
+    )
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    results = {
+        "flask": run("flask", args.port, args.concurrency, args.duration, args.keys),
+        "uvicorn": run(
+            "uvicorn",
+            args.port,
+            args.concurrency,
+            args.duration,
+            args.keys,
+            {"WEB_CONCURRENCY": str(args.workers)},
+        ),
+    }
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import json
+import sys
+import timeit
+
+import json_codec
+
+SIZES = (100, 1000, 10000, 100000, 1000000)
+
+
+def payload(size):
+    # Records shaped like typical API values, repeated up to about size bytes.
+    record = {"id": 12345, "name": "item", "price": 9.99, "tags": ["a", "b"]}
+    count = max(1, size // (len(json_codec.dumps(record)) + 1))
+    records = [dict(record, id=i) for i in range(count)]
+    return {"records": records, "total": len(records)}
+
+
+def measure(func, budget):
+    runs = max(1, int(budget / max(timeit.timeit(func, number=1), 1e-7)))
+    return min(timeit.repeat(func, number=runs, repeat=3)) / runs * 1e6
+
+
+def run(size, budget):
+    value = payload(size)
+    encoded = json_codec.dumps(value)
+    return {
+        "bytes": len(encoded),
+        "dumps_us": measure(lambda: json_codec.dumps(value), budget),
+        "loads_us": measure(lambda: json_codec.loads(encoded), budget),
+        "get_reencode_us": measure(
+            lambda: json_codec.dumps_entry("key", value), budget
+        ),
+        "get_preencoded_us": measure(
+            lambda: json_codec.dumps_entry("key", value, encoded), budget
+        ),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time JSON encoding, decoding and GET body building by size."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument(
+        "--budget", type=float, default=0.2, help="Seconds per measurement."
+    )
+    args = parser.parse_args(argv)
+
+    results = {}
+    for library in ("stdlib", "orjson"):
+        if library == "orjson" and json_codec.orjson is None:
+            continue
+        json_codec.use(library)
+        results[library] = {size: run(size, args.budget) for size in args.sizes}
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
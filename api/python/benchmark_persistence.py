@@ -0,0 +1,95 @@
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from bounded import BoundedStorage
+from durable import FSYNC_POLICIES, DurableStorage
+from storage import create_storage
+
+
+def open_store(directory, fsync="no"):
+    return DurableStorage(
+        create_storage("dict"), directory, fsync=fsync, snapshot_interval=0
+    )
+
+
+def write_throughput(directory, fsync, threads, duration):
+    store = BoundedStorage(open_store(directory, fsync), expire_interval=0)
+    counts = [0] * threads
+    deadline = time.perf_counter() + duration
+
+    def write(worker):
+        i = 0
+        while time.perf_counter() < deadline:
+            store.set("key%d-%d" % (worker, i % 10000), i)
+            i += 1
+        counts[worker] = i
+
+    workers = [threading.Thread(target=write, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    stats = store.stats()["persistence"]
+    store.close()
+    return {
+        "writes_per_second": sum(counts) / elapsed,
+        "writes_per_batch": sum(counts) / max(stats["group_commits"], 1),
+    }
+
+
+def recovery_time(directory, keys, snapshot):
+    store = open_store(directory)
+    chunk = 10000
+    for offset in range(0, keys, chunk):
+        store.update({"key%d" % i: i for i in range(offset, offset + chunk)})
+    if snapshot:
+        store.snapshot()
+    store.close()
+    recovered = open_store(directory)
+    assert len(recovered) == keys
+    elapsed = recovered.recovery_time
+    recovered.close()
+    return {
+        "seconds": elapsed,
+        "seconds_per_million_keys": elapsed * 1000000 / keys,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure write throughput per fsync policy and recovery time."
+    )
+    parser.add_argument("--dir", help="Parent directory; should be on a real disk.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--keys", type=int, default=1000000)
+    args = parser.parse_args(argv)
+
+    results = {"write_throughput": {}, "recovery": {}}
+    for fsync in FSYNC_POLICIES:
+        directory = tempfile.mkdtemp(dir=args.dir)
+        try:
+            results["write_throughput"][fsync] = write_throughput(
+                directory, fsync, args.threads, args.duration
+            )
+        finally:
+            shutil.rmtree(directory)
+    for name, snapshot in (("wal", False), ("snapshot", True)):
+        directory = tempfile.mkdtemp(dir=args.dir)
+        try:
+            results["recovery"][name] = recovery_time(directory, args.keys, snapshot)
+        finally:
+            shutil.rmtree(directory)
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
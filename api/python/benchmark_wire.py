@@ -0,0 +1,114 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+import app as api
+import json_codec
+import wire_format
+from bounded import BoundedStorage
+from http_cache import ResponseCache
+from settings import PREENCODE_BYTES
+from storage import create_storage
+
+SIZES = (1000, 10000, 100000)
+WORDS = ("red", "green", "blue", "small", "large", "new", "used", "sale", "stock")
+
+
+def payload(size, seed=0):
+    # Varied records, so compression ratios aren't flattered by repetition.
+    rng = random.Random(seed)
+    records = []
+    while len(json_codec.dumps(records)) < size:
+        records.extend(
+            {
+                "id": rng.randrange(10**9),
+                "name": "%s %s %d" % (*rng.sample(WORDS, 2), rng.randrange(1000)),
+                "price": round(rng.uniform(1, 500), 2),
+                "in_stock": rng.random() < 0.5,
+                "tags": rng.sample(WORDS, rng.randrange(4)),
+            }
+            for _ in range(max(1, size // 1000))
+        )
+    return {"records": records, "total": len(records)}
+
+
+def variants():
+    media_types = [wire_format.JSON]
+    if wire_format.msgpack is not None:
+        media_types.append(wire_format.MSGPACK)
+    for media_type in media_types:
+        for encoding in (None,) + wire_format.encodings():
+            yield media_type, encoding
+
+
+def cpu_per_request(send, requests):
+    started = time.process_time()
+    for _ in range(requests):
+        response = send()
+    return (time.process_time() - started) / requests * 1e6, response
+
+
+def run(client, value, media_type, encoding, requests):
+    headers = {"Accept": media_type, "Accept-Encoding": encoding or "identity"}
+    body, body_encoding = wire_format.compress(
+        wire_format.dumps(media_type, {"value": value}), encoding
+    )
+    put_headers = dict(headers, **{"Content-Type": media_type})
+    if body_encoding:
+        put_headers["Content-Encoding"] = body_encoding
+    put_us, response = cpu_per_request(
+        lambda: client.put("/api/data/key", data=body, headers=put_headers),
+        requests,
+    )
+    assert response.status_code == 200, response.data
+    get_us, response = cpu_per_request(
+        lambda: client.get("/api/data/key", headers=headers), requests
+    )
+    assert response.status_code == 200, response.data
+    return {
+        "get_bytes": len(response.data),
+        "put_bytes": len(body),
+        "get_cpu_us": get_us,
+        "put_cpu_us": put_us,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Bytes on the wire and CPU per request for each wire format."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument(
+        "--response-cache",
+        action="store_true",
+        help="Serve repeated GETs from the response cache.",
+    )
+    args = parser.parse_args(argv)
+
+    api.data_store = BoundedStorage(
+        create_storage("dict"),
+        expire_interval=0,
+        encoder=json_codec.dumps,
+        encode_threshold=PREENCODE_BYTES,
+    )
+    api.response_cache = ResponseCache(enabled=args.response_cache)
+    client = api.app.test_client()
+    results = {"json_library": json_codec.library}
+    for size in args.sizes:
+        value = payload(size)
+        api.data_store["key"] = value
+        results[size] = {}
+        for media_type, encoding in variants():
+            name = media_type + ("+" + encoding if encoding else "")
+            results[size][name] = run(
+                client, value, media_type, encoding, args.requests
+            )
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
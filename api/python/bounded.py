@@ -0,0 +1,390 @@
+import heapq
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from durable import DurableStorage
+from storage import Storage
+
+_missing = object()
+
+
+def estimate_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, list):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class LRUPolicy:
+    def __init__(self):
+        self._order = OrderedDict()
+
+    def add(self, key):
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def touch(self, key):
+        self._order.move_to_end(key)
+
+    def remove(self, key):
+        self._order.pop(key, None)
+
+    def victims(self):
+        return iter(self._order)
+
+
+class LFUPolicy:
+    # Keys grouped by access count; ties are broken least recently used first.
+    def __init__(self):
+        self._counts = {}
+        self._buckets = {}
+        self._min_count = 0
+
+    def add(self, key):
+        self.remove(key)
+        self._counts[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_count = 1
+
+    def touch(self, key):
+        count = self._counts[key]
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+        self._counts[key] = count + 1
+        self._buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def remove(self, key):
+        count = self._counts.pop(key, None)
+        if count is None:
+            return
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+
+    def victims(self):
+        if self._buckets and self._min_count not in self._buckets:
+            self._min_count = min(self._buckets)
+        if self._min_count in self._buckets:
+            yield from self._buckets[self._min_count]
+        for count in sorted(self._buckets):
+            if count != self._min_count:
+                yield from self._buckets[count]
+
+
+POLICIES = {"lru": LRUPolicy, "lfu": LFUPolicy}
+
+
+class BoundedStorage(Storage):
+    def __init__(
+        self,
+        inner,
+        max_keys=None,
+        max_memory=None,
+        policy="lru",
+        expire_interval=1.0,
+        clock=time.monotonic,
+        encoder=None,
+        encode_threshold=4096,
+        on_change=None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError("Unknown eviction policy: %s" % policy)
+        self.inner = inner
+        self.policy = policy
+        self.max_keys = max_keys
+        self.max_memory = max_memory
+        self.expire_interval = expire_interval
+        self.clock = clock
+        self.encoder = encoder
+        self.encode_threshold = encode_threshold
+        # Called with the key after every write, delete, eviction and expiry.
+        self.on_change = on_change
+        self._policy = POLICIES[policy]()
+        self._lock = threading.RLock()
+        self._sizes = {}
+        self._memory = 0
+        self._version = 0
+        self._versions = {}
+        self._encoded = {}
+        self._expires = {}
+        self._deadlines = []
+        self._stop = threading.Event()
+        self._thread = None
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expired_lazy": 0,
+            "expired_background": 0,
+        }
+        # Durable stores keep TTLs as wall-clock times across restarts.
+        self._durable = isinstance(inner, DurableStorage)
+        expirations = inner.expirations() if self._durable else {}
+        for key in list(inner):
+            value = inner.get(key, _missing)
+            if value is not _missing:
+                expires_at = expirations.get(key)
+                ttl = None if expires_at is None else max(expires_at - time.time(), 0)
+                self._track(key, value, ttl)
+
+    def _prepare(self, value):
+        # Called before taking the lock: sizing and encoding large values
+        # shouldn't hold up other writers.
+        size = estimate_size(value)
+        if self.encoder is not None and size >= self.encode_threshold:
+            return size, self.encoder(value)
+        return size, None
+
+    def _track(self, key, value, ttl=None, prepared=None):
+        value_size, encoded = prepared or self._prepare(value)
+        size = estimate_size(key) + value_size
+        if encoded is None:
+            self._encoded.pop(key, None)
+        else:
+            self._encoded[key] = encoded
+            size += len(encoded)
+        self._memory += size - self._sizes.get(key, 0)
+        if key in self._sizes:
+            self._policy.touch(key)
+        else:
+            self._policy.add(key)
+        self._sizes[key] = size
+        self._version += 1
+        self._versions[key] = self._version
+        if self.on_change is not None:
+            self.on_change(key)
+        if ttl is None:
+            self._expires.pop(key, None)
+        else:
+            deadline = self.clock() + ttl
+            self._expires[key] = deadline
+            heapq.heappush(self._deadlines, (deadline, key))
+
+    def _untrack(self, key):
+        self._memory -= self._sizes.pop(key, 0)
+        self._versions.pop(key, None)
+        self._encoded.pop(key, None)
+        self._expires.pop(key, None)
+        self._policy.remove(key)
+        if self.on_change is not None:
+            self.on_change(key)
+
+    def _expiry(self, ttl):
+        # Keyword arguments that pass the TTL on to a durable inner store.
+        if not self._durable:
+            return {}
+        return {"expires_at": None if ttl is None else time.time() + ttl}
+
+    @contextmanager
+    def _writing(self):
+        # Durable stores acknowledge writes after the lock is released, so
+        # concurrent writers can share one fsync.
+        with self.inner.deferred(), self._lock:
+            yield
+
+    def _is_expired(self, key):
+        deadline = self._expires.get(key)
+        return deadline is not None and deadline <= self.clock()
+
+    def _expire_lazily(self, key):
+        if self._is_expired(key):
+            with self._writing():
+                if self._is_expired(key):
+                    self.inner.pop(key, None)
+                    self._untrack(key)
+                    self.counters["expired_lazy"] += 1
+                    return True
+        return False
+
+    def _evict(self, keep=()):
+        # Keys just written are spared while older keys are left, otherwise
+        # LFU would always evict a new key before it could be read. A batch
+        # larger than the limits loses its own oldest keys.
+        while (self.max_keys is not None and len(self._sizes) > self.max_keys) or (
+            self.max_memory is not None and self._memory > self.max_memory
+        ):
+            key = next((k for k in self._policy.victims() if k not in keep), None)
+            if key is None:
+                key = next(self._policy.victims(), None)
+            if key is None:
+                return
+            self.inner.pop(key, None)
+            self._untrack(key)
+            self.counters["evictions"] += 1
+
+    def expire(self):
+        expired = 0
+        with self._writing():
+            now = self.clock()
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline, key = heapq.heappop(self._deadlines)
+                # Entries are left behind when a key's TTL changes.
+                if self._expires.get(key) != deadline:
+                    continue
+                self.inner.pop(key, None)
+                self._untrack(key)
+                expired += 1
+            self.counters["expired_background"] += expired
+        return expired
+
+    def _run(self):
+        while not self._stop.wait(self.expire_interval):
+            self.expire()
+
+    def start(self):
+        if self._thread is None and self.expire_interval:
+            self._thread = threading.Thread(
+                target=self._run, name="data-store-expiry", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.inner.close()
+
+    def __getitem__(self, key):
+        value = self.get(key, _missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def _record_read(self, key, value):
+        if value is _missing:
+            self.counters["misses"] += 1
+            return
+        self.counters["hits"] += 1
+        if key in self._sizes:
+            self._policy.touch(key)
+
+    def get(self, key, default=None):
+        if self._expire_lazily(key):
+            value = _missing
+        else:
+            value = self.inner.get(key, _missing)
+        with self._lock:
+            self._record_read(key, value)
+        return default if value is _missing else value
+
+    def get_versioned(self, key, default=None):
+        return self.get_encoded(key, default)[:2]
+
+    def get_encoded(self, key, default=None):
+        # The value, its version and its encoded form are read together, so a
+        # response can never pair a new value with an old ETag.
+        expired = self._expire_lazily(key)
+        with self._lock:
+            value = _missing if expired else self.inner.get(key, _missing)
+            self._record_read(key, value)
+            if value is _missing:
+                return default, None, None
+            return value, self._versions.get(key), self._encoded.get(key)
+
+    def set(self, key, value, ttl=None):
+        prepared = self._prepare(value)
+        with self._writing():
+            if self._durable:
+                self.inner.set(key, value, **self._expiry(ttl))
+            else:
+                self.inner[key] = value
+            self._track(key, value, ttl, prepared)
+            self._evict((key,))
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        if self.pop(key, _missing) is _missing:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return not self._expire_lazily(key) and key in self.inner
+
+    def __iter__(self):
+        return iter([key for key in self.inner if not self._is_expired(key)])
+
+    def __len__(self):
+        return len(self.inner)
+
+    def update(self, other=(), ttl=None, **kwargs):
+        items = dict(other, **kwargs)
+        prepared = {key: self._prepare(value) for key, value in items.items()}
+        with self._writing():
+            self.inner.update(items, **self._expiry(ttl))
+            for key, value in items.items():
+                self._track(key, value, ttl, prepared[key])
+            self._evict(items)
+
+    def replace(self, key, value, ttl=None):
+        prepared = self._prepare(value)
+        with self._writing():
+            if self._expire_lazily(key) or not self.inner.replace(
+                key, value, **self._expiry(ttl)
+            ):
+                return False
+            self._track(key, value, ttl, prepared)
+            self._evict((key,))
+            return True
+
+    def replace_many(self, items, ttl=None):
+        updated, missing = [], []
+        with self.inner.deferred():
+            for key, value in items.items():
+                (updated if self.replace(key, value, ttl) else missing).append(key)
+        return updated, missing
+
+    def pop(self, key, default=_missing):
+        with self._writing():
+            if self._expire_lazily(key):
+                value = _missing
+            else:
+                value = self.inner.pop(key, _missing)
+                self._untrack(key)
+        if value is _missing:
+            if default is _missing:
+                raise KeyError(key)
+            return default
+        return value
+
+    def scan(self, prefix="", start=None, end=None, limit=None):
+        # Expired keys are dropped after the inner store applied the limit,
+        # so keep reading until the page is full or the range runs out.
+        items = []
+        while True:
+            page = self.inner.scan(prefix=prefix, start=start, end=end, limit=limit)
+            items.extend(
+                (key, value) for key, value in page if not self._is_expired(key)
+            )
+            if limit is None or len(page) < limit or len(items) >= limit:
+                return items[:limit]
+            # The smallest key after the last one read.
+            start = page[-1][0] + "\0"
+
+    def stats(self):
+        with self._lock:
+            stats = dict(
+                self.counters,
+                keys=len(self._sizes),
+                expiring_keys=len(self._expires),
+                encoded_keys=len(self._encoded),
+                memory_estimate=self._memory,
+                max_keys=self.max_keys,
+                max_memory=self.max_memory,
+                policy=self.policy,
+            )
+        if self._durable:
+            stats["persistence"] = self.inner.stats()
+        return stats
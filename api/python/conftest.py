@@ -0,0 +1,46 @@
+import pytest
+from starlette.testclient import TestClient
+
+import app as flask_api
+import asgi_app
+from bounded import BoundedStorage
+from http_cache import ResponseCache
+from metrics import RequestMetrics
+from storage import create_storage
+
+
+def _reset(module, monkeypatch, inner, store_options):
+    response_cache = ResponseCache()
+    data_store = BoundedStorage(
+        inner, on_change=response_cache.invalidate, **store_options
+    )
+    monkeypatch.setattr(module, "response_cache", response_cache)
+    monkeypatch.setattr(module, "data_store", data_store)
+    monkeypatch.setattr(module, "request_metrics", RequestMetrics())
+
+
+@pytest.fixture
+def inner():
+    return create_storage("dict")
+
+
+@pytest.fixture
+def store_options():
+    return {}
+
+
+@pytest.fixture
+def client(inner, store_options, monkeypatch):
+    _reset(flask_api, monkeypatch, inner, store_options)
+    return flask_api.app.test_client()
+
+
+@pytest.fixture
+def asgi_client(store_options, monkeypatch):
+    _reset(asgi_app, monkeypatch, create_storage("dict"), store_options)
+    return TestClient(asgi_app.app)
+
+
+@pytest.fixture
+def clients(client, asgi_client):
+    return client, asgi_client
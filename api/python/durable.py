@@ -0,0 +1,431 @@
+import fcntl
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import json_codec
+from storage import Storage
+
+FSYNC_POLICIES = ("always", "everysec", "no")
+
+_missing = object()
+_SEGMENT = re.compile(r"^wal-(\d{8})\.log$")
+
+
+def _fsync_directory(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    # Record layout: payload length, CRC32 of the payload, JSON payload.
+    HEADER = struct.Struct("<II")
+
+    def __init__(self, directory, segment, fsync="everysec", fsync_interval=1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError("Unknown fsync policy: %s" % fsync)
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.segment = segment
+        self._fd = self._open(segment)
+        self._condition = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._buffer = []
+        self._appended = 0
+        self._written = 0
+        self._durable = 0
+        self._last_fsync = time.monotonic()
+        self._closed = False
+        self._error = None
+        self.group_commits = 0
+        self._thread = threading.Thread(
+            target=self._run, name="data-store-wal", daemon=True
+        )
+        self._thread.start()
+
+    def _open(self, segment):
+        path = os.path.join(self.directory, "wal-%08d.log" % segment)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        _fsync_directory(self.directory)
+        return fd
+
+    @classmethod
+    def encode(cls, operation):
+        payload = json_codec.dumps(operation)
+        return cls.HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    @classmethod
+    def read(cls, path):
+        # Yields operations up to the first torn or corrupt record, then
+        # truncates the file there.
+        with open(path, "r+b") as f:
+            data = f.read()
+            offset = 0
+            while offset + cls.HEADER.size <= len(data):
+                length, checksum = cls.HEADER.unpack_from(data, offset)
+                start = offset + cls.HEADER.size
+                payload = data[start : start + length]
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    break
+                yield json_codec.loads(payload)
+                offset = start + length
+            if offset < len(data):
+                f.truncate(offset)
+
+    def append(self, operation):
+        record = self.encode(operation)
+        with self._condition:
+            if self._error:
+                raise self._error
+            self._buffer.append(record)
+            self._appended += 1
+            self._condition.notify_all()
+            return self._appended
+
+    def wait(self, sequence):
+        if self.fsync != "always":
+            return
+        with self._condition:
+            while self._durable < sequence and not self._error:
+                self._condition.wait()
+            if self._error:
+                raise self._error
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._buffer and not self._closed:
+                if self.fsync != "everysec" or self._written == self._durable:
+                    self._condition.wait()
+                    continue
+                remaining = self._last_fsync + self.fsync_interval - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            records, self._buffer = self._buffer, []
+            return records, self._appended, self._closed
+
+    def _run(self):
+        while True:
+            records, sequence, closed = self._next_batch()
+            if closed and not records and self._written == self._durable:
+                return
+            sync = self.fsync == "always" or closed
+            if self.fsync == "everysec":
+                sync = sync or time.monotonic() - self._last_fsync >= (
+                    self.fsync_interval
+                )
+            try:
+                with self._io_lock:
+                    # Everything queued while the previous batch was being
+                    # written goes out in one write and at most one fsync.
+                    if records:
+                        os.write(self._fd, b"".join(records))
+                    if sync and self.fsync != "no":
+                        os.fsync(self._fd)
+                        self._last_fsync = time.monotonic()
+            except OSError as e:
+                with self._condition:
+                    self._error = e
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self._written = sequence
+                if sync or self.fsync == "no":
+                    self._durable = sequence
+                if records:
+                    self.group_commits += 1
+                self._condition.notify_all()
+
+    def flush(self):
+        with self._condition:
+            sequence = self._appended
+            while self._written < sequence and not self._error:
+                self._condition.wait()
+        with self._io_lock:
+            if self.fsync != "no":
+                os.fsync(self._fd)
+                self._last_fsync = time.monotonic()
+        with self._condition:
+            self._durable = max(self._durable, sequence)
+            self._condition.notify_all()
+
+    def rotate(self):
+        # Called with the store locked, so no appends race the switch.
+        self.flush()
+        with self._io_lock:
+            os.close(self._fd)
+            self.segment += 1
+            self._fd = self._open(self.segment)
+        return self.segment
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        os.close(self._fd)
+
+
+class DirectoryLocked(RuntimeError):
+    pass
+
+
+def _lock_directory(directory):
+    # Two stores on one directory would interleave segments and delete each
+    # other's logs, so a second opener fails instead of waiting.
+    fd = os.open(os.path.join(directory, "LOCK"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        raise DirectoryLocked(
+            "Persistence directory %s is in use by another store" % directory
+        )
+    return fd
+
+
+class DurableStorage(Storage):
+    def __init__(
+        self,
+        inner,
+        directory,
+        fsync="everysec",
+        snapshot_interval=300.0,
+        fsync_interval=1.0,
+    ):
+        self.inner = inner
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        # Wall-clock expiry times, so TTLs mean the same after a restart.
+        self._expires = {}
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._snapshot_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+        self._lock_fd = _lock_directory(directory)
+        try:
+            started = time.perf_counter()
+            segment = self._recover()
+            self.recovery_time = time.perf_counter() - started
+            self._wal = WriteAheadLog(directory, segment, fsync, fsync_interval)
+        except BaseException:
+            os.close(self._lock_fd)
+            raise
+        self.snapshots = 0
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, "snapshot.json")
+
+    def _segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT.match(name)
+            if match:
+                segments.append(int(match.group(1)))
+        return sorted(segments)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, "wal-%08d.log" % segment)
+
+    def _set_expiry(self, keys, expires_at):
+        for key in keys:
+            if expires_at is None:
+                self._expires.pop(key, None)
+            else:
+                self._expires[key] = expires_at
+
+    def _apply(self, operation):
+        # Records only carry an expiry time when the write had a TTL.
+        if operation[0] == "set":
+            self.inner[operation[1]] = operation[2]
+            self._set_expiry([operation[1]], (operation[3:] or [None])[0])
+        elif operation[0] == "update":
+            self.inner.update(operation[1])
+            self._set_expiry(operation[1], (operation[2:] or [None])[0])
+        elif operation[0] == "delete":
+            self.inner.pop(operation[1], None)
+            self._expires.pop(operation[1], None)
+
+    def _recover(self):
+        first_segment = 1
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = json_codec.loads(f.read())
+            self.inner.update(snapshot["data"])
+            self._expires.update(snapshot.get("expires", {}))
+            first_segment = snapshot["segment"]
+        segments = [segment for segment in self._segments() if segment >= first_segment]
+        for segment in segments:
+            for operation in WriteAheadLog.read(self._segment_path(segment)):
+                self._apply(operation)
+        now = time.time()
+        for key, expires_at in list(self._expires.items()):
+            if expires_at <= now:
+                self.inner.pop(key, None)
+                del self._expires[key]
+        # Never append after a tail that may have been torn.
+        return max(segments + [first_segment - 1]) + 1
+
+    def snapshot(self):
+        with self._snapshot_lock:
+            with self._lock:
+                segment = self._wal.rotate()
+                data = dict(self.inner.items())
+                expires = dict(self._expires)
+            path = self.snapshot_path + ".tmp"
+            with open(path, "wb") as f:
+                f.write(
+                    json_codec.dumps(
+                        {"segment": segment, "data": data, "expires": expires}
+                    )
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path, self.snapshot_path)
+            _fsync_directory(self.directory)
+            for old in self._segments():
+                if old < segment:
+                    os.remove(self._segment_path(old))
+            self.snapshots += 1
+            return segment
+
+    def _run(self):
+        while not self._stop.wait(self.snapshot_interval):
+            self.snapshot()
+
+    def start(self):
+        if self._thread is None and self.snapshot_interval:
+            self._thread = threading.Thread(
+                target=self._run, name="data-store-snapshot", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._wal.close()
+        self.inner.close()
+        # Closing the descriptor releases the lock.
+        os.close(self._lock_fd)
+
+    @contextmanager
+    def deferred(self):
+        # Writes inside the block are acknowledged together on exit, so
+        # callers holding their own locks don't wait for fsync under them.
+        if getattr(self._local, "deferred", False):
+            yield
+            return
+        self._local.deferred = True
+        self._local.sequence = 0
+        try:
+            yield
+        finally:
+            self._local.deferred = False
+        self._wal.wait(self._local.sequence)
+
+    def _acknowledge(self, sequence):
+        if getattr(self._local, "deferred", False):
+            self._local.sequence = max(self._local.sequence, sequence)
+        else:
+            self._wal.wait(sequence)
+
+    def __getitem__(self, key):
+        return self.inner[key]
+
+    def get(self, key, default=None):
+        return self.inner.get(key, default)
+
+    def expirations(self):
+        with self._lock:
+            return dict(self._expires)
+
+    def set(self, key, value, expires_at=None):
+        operation = ["set", key, value]
+        if expires_at is not None:
+            operation.append(expires_at)
+        with self._lock:
+            self.inner[key] = value
+            self._set_expiry([key], expires_at)
+            sequence = self._wal.append(operation)
+        self._acknowledge(sequence)
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        if self.pop(key, _missing) is _missing:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.inner
+
+    def __iter__(self):
+        return iter(self.inner)
+
+    def __len__(self):
+        return len(self.inner)
+
+    def update(self, other=(), expires_at=None, **kwargs):
+        items = dict(other, **kwargs)
+        operation = ["update", items]
+        if expires_at is not None:
+            operation.append(expires_at)
+        with self._lock:
+            self.inner.update(items)
+            self._set_expiry(items, expires_at)
+            sequence = self._wal.append(operation)
+        self._acknowledge(sequence)
+
+    def replace(self, key, value, expires_at=None):
+        operation = ["set", key, value]
+        if expires_at is not None:
+            operation.append(expires_at)
+        with self._lock:
+            if not self.inner.replace(key, value):
+                return False
+            self._set_expiry([key], expires_at)
+            sequence = self._wal.append(operation)
+        self._acknowledge(sequence)
+        return True
+
+    def pop(self, key, default=_missing):
+        with self._lock:
+            value = self.inner.pop(key, _missing)
+            if value is not _missing:
+                self._expires.pop(key, None)
+                sequence = self._wal.append(["delete", key])
+        if value is _missing:
+            if default is _missing:
+                raise KeyError(key)
+            return default
+        self._acknowledge(sequence)
+        return value
+
+    def get_many(self, keys):
+        return self.inner.get_many(keys)
+
+    def scan(self, prefix="", start=None, end=None, limit=None):
+        return self.inner.scan(prefix=prefix, start=start, end=end, limit=limit)
+
+    def stats(self):
+        return {
+            "segment": self._wal.segment,
+            "fsync": self._wal.fsync,
+            "group_commits": self._wal.group_commits,
+            "snapshots": self.snapshots,
+            "recovery_time": self.recovery_time,
+        }
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+def content_etag(body):
+    return '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    # Serialized GET bodies keyed by storage version. Versions are only
+    # authoritative when this process owns the data, so shared backends fall
+    # back to hashing the body for the ETag.
+    def __init__(self, enabled=True, max_entries=10000, max_bytes=64 * 1024 * 1024):
+        self.enabled = enabled and max_entries > 0 and max_bytes > 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Versions restart with the process, so tag them with an epoch.
+        self.epoch = os.urandom(4).hex()
+        self._entries = OrderedDict()
+        self._variants = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _remove(self, entry):
+        _, (body, _) = self._entries.pop(entry)
+        self._bytes -= len(body)
+        variants = self._variants[entry[0]]
+        variants.discard(entry[1])
+        if not variants:
+            del self._variants[entry[0]]
+
+    def invalidate(self, key):
+        # Called by the store whenever a key is written or removed, so stale
+        # variants don't hold memory until LRU reaches them.
+        with self._lock:
+            for variant in list(self._variants.get(key, ())):
+                self._remove((key, variant))
+
+    def _body(self, key, variant, version, serialize):
+        entry = (key, variant)
+        with self._lock:
+            cached = self._entries.get(entry)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(entry)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        result = serialize()
+        size = len(result[0])
+        with self._lock:
+            for other in list(self._variants.get(key, ())):
+                if other == variant or self._entries[(key, other)][0] != version:
+                    self._remove((key, other))
+            if size > self.max_bytes:
+                return result
+            self._entries[entry] = (version, result)
+            self._variants.setdefault(key, set()).add(variant)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return result
+
+    def respond(self, key, version, if_none_match, serialize, cache=True, variant=""):
+        # serialize returns the body and its Content-Encoding; respond returns
+        # the ETag with those, or None for the body when the client already
+        # has this version. Each variant (media type, compression) is cached
+        # and tagged separately. Bodies built from pre-encoded values are
+        # cheap to rebuild, so callers pass cache=False rather than hold the
+        # value's bytes twice.
+        if self.enabled and version is not None:
+            etag = '"%s-%x%s"' % (self.epoch, version, variant)
+            if etag_matches(if_none_match, etag):
+                self.not_modified += 1
+                return etag, None, None
+            if not cache:
+                return (etag,) + serialize()
+            return (etag,) + self._body(key, variant, version, serialize)
+        body, encoding = serialize()
+        etag = content_etag(body)
+        if etag_matches(if_none_match, etag):
+            self.not_modified += 1
+            return etag, None, None
+        return etag, body, encoding
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
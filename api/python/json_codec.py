@@ -0,0 +1,95 @@
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LIBRARIES = ("auto", "orjson", "stdlib")
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, separators=(",", ":"), sort_keys=True).encode()
+
+
+def _orjson_dumps(obj):
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    except TypeError:
+        # Integers beyond 64 bits and other types orjson rejects.
+        return _stdlib_dumps(obj)
+
+
+# Integers past 64 bits have at least 19 digits. Mapping every digit to "0"
+# and looking for a run is much cheaper than a regex.
+_DIGITS_TO_ZERO = bytes.maketrans(b"123456789", b"000000000")
+_DIGITS_TO_ZERO_STR = str.maketrans("123456789", "000000000")
+
+
+def _may_hold_long_integers(data):
+    if isinstance(data, str):
+        return "0" * 19 in data.translate(_DIGITS_TO_ZERO_STR)
+    return b"0" * 19 in data.translate(_DIGITS_TO_ZERO)
+
+
+def _finite_float(text):
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError("Non-finite numbers are not supported: %s" % text)
+    return value
+
+
+def _exact_loads(data):
+    # orjson writes NaN and Infinity back as null, so they are refused.
+    return json.loads(data, parse_float=_finite_float, parse_constant=_finite_float)
+
+
+def _orjson_loads(data):
+    if _may_hold_long_integers(data):
+        # orjson would turn integers past 64 bits into floats.
+        return _exact_loads(data)
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # Re-parse so the error reads the same as with the stdlib. This
+        # also refuses NaN, Infinity and numbers past the range of a double.
+        return _exact_loads(data)
+
+
+def _orjson_check(obj):
+    if b"null" in _orjson_dumps(obj):
+        # Could be NaN or Infinity, which orjson writes as null.
+        json.dumps(obj, allow_nan=False)
+
+
+library = "stdlib"
+dumps = _stdlib_dumps
+loads = json.loads
+# Raises ValueError for values dumps cannot write back as they are.
+check = _stdlib_dumps
+
+
+def use(name="auto"):
+    global library, dumps, loads, check
+    if name not in LIBRARIES:
+        raise ValueError("Unknown JSON library: %s" % name)
+    if name == "orjson" and orjson is None:
+        raise ValueError("orjson is not installed")
+    if name != "stdlib" and orjson is not None:
+        library, dumps, loads = "orjson", _orjson_dumps, _orjson_loads
+        check = _orjson_check
+    else:
+        library, dumps, loads = "stdlib", _stdlib_dumps, json.loads
+        check = _stdlib_dumps
+    return library
+
+
+def dumps_entry(key, value, encoded=None):
+    # The same bytes as dumps({key: value}), reusing an already encoded value.
+    if encoded is None:
+        encoded = dumps(value)
+    return b"{" + dumps(key) + b":" + encoded + b"}"
+
+
+use()
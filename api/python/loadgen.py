@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import aiohttp
+
+OPERATIONS = ("get", "post", "put", "delete")
+DEFAULT_MIX = "get=70,post=10,put=15,delete=5"
+QUANTILES = (50, 90, 99, 99.9, 99.99)
+PRELOAD_CHUNK_SIZE = 500
+
+
+class Histogram:
+    # Log-linear buckets in microseconds: values are exact below
+    # 2 ** SUB_BUCKET_BITS and keep SUB_BUCKET_BITS significant bits above,
+    # so every recorded value is within 1/64 (~1.6%) of its bucket.
+    SUB_BUCKET_BITS = 7
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _bucket(self, value):
+        shift = value.bit_length() - self.SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return (value >> shift) << shift
+
+    def record(self, seconds):
+        value = max(int(seconds * 1000000), 0)
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, quantile):
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * quantile // 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(bucket, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "min_us": self.min or 0,
+            "max_us": self.max,
+            "mean_us": self.total / self.count if self.count else 0,
+            "percentiles_us": {
+                "p%s" % quantile: self.percentile(quantile) for quantile in QUANTILES
+            },
+            "buckets": [
+                [bucket, self.counts[bucket]] for bucket in sorted(self.counts)
+            ],
+        }
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip().lower()
+        if name not in OPERATIONS:
+            raise ValueError("Unknown operation in mix: %r" % name)
+        weights[name] = float(weight)
+    if sum(weights.values()) <= 0:
+        raise ValueError("Mix weights must add up to more than zero")
+    return weights
+
+
+class _Stats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = {}
+        self.errors = 0
+
+    def summary(self):
+        return {
+            "requests": self.latency.count,
+            "errors": self.errors,
+            "statuses": {
+                str(status): count for status, count in sorted(self.statuses.items())
+            },
+            "latency": self.latency.summary(),
+        }
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        url,
+        concurrency=16,
+        duration=10.0,
+        keys=1000,
+        mix=DEFAULT_MIX,
+        value_size=16,
+        warmup=1.0,
+        seed=None,
+    ):
+        self.url = url.rstrip("/")
+        self.concurrency = concurrency
+        self.duration = duration
+        self.keys = ["key%d" % i for i in range(keys)]
+        self.mix = parse_mix(mix) if isinstance(mix, str) else dict(mix)
+        self.value = "x" * value_size
+        self.warmup = warmup
+        self.random = random.Random(seed)
+        self.stats = {operation: _Stats() for operation in OPERATIONS}
+
+    def _request(self, session, operation, key):
+        # Values are strings because the Rust service only stores strings.
+        if operation == "get":
+            return session.get("%s/%s" % (self.url, key))
+        if operation == "post":
+            return session.post(self.url, json={key: self.value})
+        if operation == "put":
+            return session.put("%s/%s" % (self.url, key), json={"value": self.value})
+        return session.delete("%s/%s" % (self.url, key))
+
+    async def preload(self, session):
+        for offset in range(0, len(self.keys), PRELOAD_CHUNK_SIZE):
+            chunk = self.keys[offset : offset + PRELOAD_CHUNK_SIZE]
+            async with session.post(
+                self.url, json={key: self.value for key in chunk}
+            ) as response:
+                response.raise_for_status()
+                await response.read()
+
+    async def _worker(self, session, warmup_end, deadline):
+        operations = list(self.mix)
+        weights = [self.mix[operation] for operation in operations]
+        while True:
+            operation = self.random.choices(operations, weights)[0]
+            key = self.random.choice(self.keys)
+            start = time.perf_counter()
+            if start >= deadline:
+                return
+            status = None
+            try:
+                async with self._request(session, operation, key) as response:
+                    await response.read()
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            if start < warmup_end:
+                continue
+            stats = self.stats[operation]
+            stats.latency.record(time.perf_counter() - start)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            if status is None or status >= 500:
+                stats.errors += 1
+
+    async def run(self, preload=True):
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            if preload:
+                await self.preload(session)
+            start = time.perf_counter()
+            warmup_end = start + self.warmup
+            deadline = warmup_end + self.duration
+            await asyncio.gather(
+                *(
+                    self._worker(session, warmup_end, deadline)
+                    for _ in range(self.concurrency)
+                )
+            )
+            elapsed = time.perf_counter() - warmup_end
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        overall = _Stats()
+        for stats in self.stats.values():
+            overall.latency.merge(stats.latency)
+            overall.errors += stats.errors
+        summary = overall.summary()
+        del summary["statuses"]
+        summary.update(
+            {
+                "url": self.url,
+                "concurrency": self.concurrency,
+                "duration": elapsed,
+                "keys": len(self.keys),
+                "mix": self.mix,
+                "throughput": overall.latency.count / elapsed if elapsed else 0,
+                "operations": {
+                    operation: stats.summary()
+                    for operation, stats in self.stats.items()
+                    if stats.latency.count
+                },
+            }
+        )
+        return summary
+
+
+def check_thresholds(report, max_p99_ms=None, min_throughput=None, max_errors=None):
+    failures = []
+    p99_ms = report["latency"]["percentiles_us"]["p99"] / 1000
+    if max_p99_ms is not None and p99_ms > max_p99_ms:
+        failures.append("p99 %.2f ms > %.2f ms" % (p99_ms, max_p99_ms))
+    if min_throughput is not None and report["throughput"] < min_throughput:
+        failures.append(
+            "throughput %.1f req/s < %.1f req/s"
+            % (report["throughput"], min_throughput)
+        )
+    if max_errors is not None and report["errors"] > max_errors:
+        failures.append("errors %d > %d" % (report["errors"], max_errors))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Drive the /api/data routes and report throughput and latency."
+    )
+    parser.add_argument("--url", default="http://localhost:5000/api/data")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--value-size", type=int, default=16)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--no-preload", action="store_true")
+    parser.add_argument("--output")
+    parser.add_argument("--max-p99-ms", type=float)
+    parser.add_argument("--min-throughput", type=float)
+    parser.add_argument("--max-errors", type=int)
+    args = parser.parse_args(argv)
+
+    generator = LoadGenerator(
+        args.url,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        keys=args.keys,
+        mix=args.mix,
+        value_size=args.value_size,
+        warmup=args.warmup,
+        seed=args.seed,
+    )
+    report = asyncio.run(generator.run(preload=not args.no_preload))
+    failures = check_thresholds(
+        report, args.max_p99_ms, args.min_throughput, args.max_errors
+    )
+    report["failures"] = failures
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+PROFILE_INTERVAL = 0.005
+MAX_PROFILE_SECONDS = 60.0
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class RequestMetrics:
+    def __init__(self, prefix="kv"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._latency = {}
+        self.in_flight = 0
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def finish(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def observe(self, method, route, status, started):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._requests[method, route, status] += 1
+            histogram = self._latency.get((method, route))
+            if histogram is None:
+                histogram = self._latency[method, route] = _Histogram()
+            histogram.observe(elapsed)
+
+    def _labels(self, **labels):
+        return "{%s}" % ",".join(
+            '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+            for name, value in labels.items()
+        )
+
+    def render(self, store_stats=None):
+        prefix = self.prefix
+        lines = [
+            "# HELP %s_http_requests_total Requests by route and status." % prefix,
+            "# TYPE %s_http_requests_total counter" % prefix,
+        ]
+        with self._lock:
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(
+                    "%s_http_requests_total%s %d"
+                    % (
+                        prefix,
+                        self._labels(method=method, route=route, status=status),
+                        count,
+                    )
+                )
+            metric = "%s_http_request_duration_seconds" % prefix
+            lines.append("# HELP %s Request latency by route." % metric)
+            lines.append("# TYPE %s histogram" % metric)
+            for (method, route), histogram in sorted(self._latency.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        "%s_bucket%s %d"
+                        % (
+                            metric,
+                            self._labels(method=method, route=route, le=bound),
+                            cumulative,
+                        )
+                    )
+                labels = self._labels(method=method, route=route)
+                lines.append("%s_sum%s %.9f" % (metric, labels, histogram.sum))
+                lines.append("%s_count%s %d" % (metric, labels, histogram.count))
+            lines.append(
+                "# HELP %s_http_requests_in_flight Requests being served." % prefix
+            )
+            lines.append("# TYPE %s_http_requests_in_flight gauge" % prefix)
+            lines.append("%s_http_requests_in_flight %d" % (prefix, self.in_flight))
+        if store_stats:
+            lines.extend(self._store_lines(store_stats))
+        return "\n".join(lines) + "\n"
+
+    def _store_lines(self, stats):
+        prefix = self.prefix
+        for name, key, kind, help_text in (
+            ("data_store_keys", "keys", "gauge", "Keys in data_store."),
+            (
+                "data_store_memory_bytes",
+                "memory_estimate",
+                "gauge",
+                "Estimated size of keys and values.",
+            ),
+            ("data_store_hits_total", "hits", "counter", "Reads that found a key."),
+            ("data_store_misses_total", "misses", "counter", "Reads of missing keys."),
+            ("data_store_evictions_total", "evictions", "counter", "Evicted keys."),
+        ):
+            yield "# HELP %s_%s %s" % (prefix, name, help_text)
+            yield "# TYPE %s_%s %s" % (prefix, name, kind)
+            yield "%s_%s %d" % (prefix, name, stats[key])
+        yield "# HELP %s_data_store_expired_total Expired keys." % prefix
+        yield "# TYPE %s_data_store_expired_total counter" % prefix
+        for mode in ("lazy", "background"):
+            yield "%s_data_store_expired_total%s %d" % (
+                prefix,
+                self._labels(mode=mode),
+                stats["expired_%s" % mode],
+            )
+        cache = stats.get("response_cache")
+        if cache:
+            yield "# HELP %s_response_cache_total GET bodies by cache outcome." % prefix
+            yield "# TYPE %s_response_cache_total counter" % prefix
+            for outcome in ("hits", "misses", "not_modified"):
+                yield "%s_response_cache_total%s %d" % (
+                    prefix,
+                    self._labels(outcome=outcome),
+                    cache[outcome],
+                )
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return "%s (%s:%d)" % (
+        code.co_name,
+        os.path.basename(code.co_filename),
+        code.co_firstlineno,
+    )
+
+
+def sample_stacks(seconds, interval=PROFILE_INTERVAL):
+    # Collapsed stack format (root;...;leaf count), as read by flamegraph.pl
+    # and speedscope.
+    seconds = min(max(seconds, 0.0), MAX_PROFILE_SECONDS)
+    own = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, "thread-%d" % ident))
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "".join("%s %d\n" % (stack, count) for stack, count in stacks.most_common())
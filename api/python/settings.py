@@ -0,0 +1,82 @@
+import os
+
+import json_codec
+from bounded import BoundedStorage
+from durable import DurableStorage
+from http_cache import ResponseCache
+from storage import create_storage
+
+
+def _optional_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+STORAGE_BACKEND = os.environ.get("KV_STORAGE_BACKEND", "dict")
+STORAGE_PATH = os.environ.get("KV_STORAGE_PATH")
+MAX_BATCH_SIZE = int(os.environ.get("KV_MAX_BATCH_SIZE", "10000"))
+IMPORT_CHUNK_SIZE = 1000
+
+MAX_KEYS = _optional_int("KV_MAX_KEYS")
+MAX_MEMORY = _optional_int("KV_MAX_MEMORY")
+EVICTION_POLICY = os.environ.get("KV_EVICTION_POLICY", "lru")
+EXPIRE_INTERVAL = float(os.environ.get("KV_EXPIRE_INTERVAL", "1.0"))
+
+PERSISTENCE_DIR = os.environ.get("KV_PERSISTENCE_DIR")
+FSYNC_POLICY = os.environ.get("KV_FSYNC", "everysec")
+SNAPSHOT_INTERVAL = float(os.environ.get("KV_SNAPSHOT_INTERVAL", "300"))
+
+PROFILER_ENABLED = os.environ.get("KV_PROFILER") == "1"
+RESPONSE_CACHE_SIZE = int(os.environ.get("KV_RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_BYTES = _optional_int("KV_RESPONSE_CACHE_BYTES")
+if RESPONSE_CACHE_BYTES is None:
+    # Cached bodies come on top of the values themselves, so under
+    # KV_MAX_MEMORY they get at most a quarter of it.
+    RESPONSE_CACHE_BYTES = 64 * 1024 * 1024
+    if MAX_MEMORY:
+        RESPONSE_CACHE_BYTES = min(RESPONSE_CACHE_BYTES, MAX_MEMORY // 4)
+JSON_LIBRARY = json_codec.use(os.environ.get("KV_JSON", "auto"))
+PREENCODE_BYTES = int(os.environ.get("KV_PREENCODE_BYTES", "4096"))
+
+IN_MEMORY_BACKENDS = ("dict", "sharded")
+# File-backed stores and fsync-per-write persistence block, so async servers
+# keep them off the event loop.
+BLOCKING_STORE = STORAGE_BACKEND not in IN_MEMORY_BACKENDS or bool(
+    PERSISTENCE_DIR and FSYNC_POLICY == "always"
+)
+
+
+def create_data_store(on_change=None):
+    store = create_storage(STORAGE_BACKEND, STORAGE_PATH)
+    if PERSISTENCE_DIR:
+        if STORAGE_BACKEND not in IN_MEMORY_BACKENDS:
+            raise ValueError(
+                "KV_PERSISTENCE_DIR only applies to the dict and sharded backends"
+            )
+        store = DurableStorage(
+            store, PERSISTENCE_DIR, FSYNC_POLICY, SNAPSHOT_INTERVAL
+        ).start()
+    return BoundedStorage(
+        store,
+        max_keys=MAX_KEYS,
+        max_memory=MAX_MEMORY,
+        policy=EVICTION_POLICY,
+        expire_interval=EXPIRE_INTERVAL,
+        # Values written by other processes would leave stale bytes behind.
+        encoder=(
+            json_codec.dumps
+            if PREENCODE_BYTES and STORAGE_BACKEND in IN_MEMORY_BACKENDS
+            else None
+        ),
+        encode_threshold=PREENCODE_BYTES,
+        on_change=on_change,
+    ).start()
+
+
+def create_response_cache():
+    # Other processes can change shared backends without bumping our versions.
+    return ResponseCache(
+        enabled=STORAGE_BACKEND in IN_MEMORY_BACKENDS,
+        max_entries=RESPONSE_CACHE_SIZE,
+        max_bytes=RESPONSE_CACHE_BYTES,
+    )
@@ -0,0 +1,589 @@
+import mmap
+from bisect import bisect_left
+import os
+import sqlite3
+import struct
+import threading
+from collections.abc import MutableMapping
+from contextlib import nullcontext
+
+import json_codec
+
+_missing = object()
+
+SQLITE_BATCH_SIZE = 500
+
+
+def prefix_end(prefix):
+    # Smallest string greater than every string starting with prefix.
+    while prefix and prefix[-1] == chr(0x10FFFF):
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SortedKeyIndex:
+    # Sorted keys for range scans, so a page is a bisect instead of a sort.
+    # Keys added since the last scan are merged in on the next one. Deleted
+    # keys stay until they make up half the index; scans skip them.
+    def __init__(self, keys=()):
+        self._lock = threading.Lock()
+        self._keys = sorted(set(keys))
+        self._added = set()
+        self._removed = 0
+        # Keys added while a compaction runs, or None.
+        self._rebuild_added = None
+
+    def add(self, key):
+        with self._lock:
+            self._added.add(key)
+            if self._rebuild_added is not None:
+                self._rebuild_added.add(key)
+
+    def discard(self, key):
+        with self._lock:
+            self._added.discard(key)
+            self._removed += 1
+
+    def _compact(self, live_keys):
+        # Writers call add and discard under the store's lock, and live_keys
+        # takes that lock, so it must run without holding ours.
+        try:
+            keys = set(live_keys())
+        except BaseException:
+            with self._lock:
+                self._rebuild_added = None
+            raise
+        with self._lock:
+            keys.update(self._rebuild_added, self._added)
+            self._keys = sorted(keys)
+            self._added.clear()
+            self._rebuild_added = None
+
+    def _snapshot(self, live_keys):
+        with self._lock:
+            compact = (
+                self._rebuild_added is None and self._removed > len(self._keys) // 2
+            )
+            if compact:
+                self._rebuild_added = set()
+                self._removed = 0
+        if compact:
+            self._compact(live_keys)
+        with self._lock:
+            if self._added:
+                # Two sorted runs, which sort() merges in linear time. A new
+                # list, so scans already iterating the old one are unaffected.
+                keys = self._keys + sorted(self._added)
+                keys.sort()
+                self._keys = keys
+                self._added.clear()
+            return self._keys
+
+    def keys_from(self, start, live_keys):
+        # live_keys rebuilds the index from the store when it is compacted.
+        keys = self._snapshot(live_keys)
+        previous = None
+        for position in range(bisect_left(keys, start), len(keys)):
+            key = keys[position]
+            # A key deleted and added again appears twice until compaction.
+            if key != previous:
+                yield key
+            previous = key
+
+
+class Storage(MutableMapping):
+    _key_index = None
+
+    def _keys_from(self, start):
+        if self._key_index is None:
+            return iter(sorted(key for key in self if key >= start))
+        return self._key_index.keys_from(start, lambda: list(self))
+
+    def replace(self, key, value):
+        if key not in self:
+            return False
+        self[key] = value
+        return True
+
+    def get_many(self, keys):
+        found, missing = {}, []
+        for key in keys:
+            value = self.get(key, _missing)
+            if value is _missing:
+                missing.append(key)
+            else:
+                found[key] = value
+        return found, missing
+
+    def replace_many(self, items):
+        updated, missing = [], []
+        for key, value in items.items():
+            (updated if self.replace(key, value) else missing).append(key)
+        return updated, missing
+
+    def delete_many(self, keys):
+        deleted, missing = [], []
+        absent = object()
+        for key in keys:
+            if self.pop(key, absent) is absent:
+                missing.append(key)
+            else:
+                deleted.append(key)
+        return deleted, missing
+
+    def scan(self, prefix="", start=None, end=None, limit=None):
+        start = max(start or prefix, prefix)
+        if prefix:
+            end = min(end, prefix_end(prefix)) if end else prefix_end(prefix)
+        items = []
+        for key in self._keys_from(start):
+            if (end is not None and key >= end) or (
+                limit is not None and len(items) >= limit
+            ):
+                break
+            value = self.get(key, _missing)
+            if value is not _missing:
+                items.append((key, value))
+        return items
+
+    def deferred(self):
+        return nullcontext()
+
+    def close(self):
+        pass
+
+
+class DictStorage(Storage):
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.RLock()
+        self._key_index = SortedKeyIndex()
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            if key not in self._data:
+                self._key_index.add(key)
+            self._data[key] = value
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+            self._key_index.discard(key)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def update(self, other=(), **kwargs):
+        items = dict(other, **kwargs)
+        with self._lock:
+            for key in items.keys() - self._data.keys():
+                self._key_index.add(key)
+            self._data.update(items)
+
+    def replace(self, key, value):
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._data[key] = value
+            return True
+
+    def pop(self, key, default=_missing):
+        with self._lock:
+            value = self._data.pop(key, _missing)
+            if value is not _missing:
+                self._key_index.discard(key)
+        if value is _missing:
+            if default is _missing:
+                raise KeyError(key)
+            return default
+        return value
+
+
+class ShardedDictStorage(Storage):
+    def __init__(self, shards=16):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self._key_index = SortedKeyIndex()
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def __getitem__(self, key):
+        return self._shard(key)[0][key]
+
+    def __setitem__(self, key, value):
+        data, lock = self._shard(key)
+        with lock:
+            if key not in data:
+                self._key_index.add(key)
+            data[key] = value
+
+    def __delitem__(self, key):
+        data, lock = self._shard(key)
+        with lock:
+            del data[key]
+            self._key_index.discard(key)
+
+    def __contains__(self, key):
+        return key in self._shard(key)[0]
+
+    def __iter__(self):
+        keys = []
+        for data, lock in self._shards:
+            with lock:
+                keys.extend(data)
+        return iter(keys)
+
+    def __len__(self):
+        return sum(len(data) for data, _ in self._shards)
+
+    def get(self, key, default=None):
+        return self._shard(key)[0].get(key, default)
+
+    def update(self, other=(), **kwargs):
+        grouped = [{} for _ in self._shards]
+        for key, value in dict(other, **kwargs).items():
+            grouped[hash(key) % len(self._shards)][key] = value
+        for (data, lock), values in zip(self._shards, grouped):
+            if values:
+                with lock:
+                    for key in values.keys() - data.keys():
+                        self._key_index.add(key)
+                    data.update(values)
+
+    def replace(self, key, value):
+        data, lock = self._shard(key)
+        with lock:
+            if key not in data:
+                return False
+            data[key] = value
+            return True
+
+    def pop(self, key, default=_missing):
+        data, lock = self._shard(key)
+        with lock:
+            value = data.pop(key, _missing)
+            if value is not _missing:
+                self._key_index.discard(key)
+        if value is _missing:
+            if default is _missing:
+                raise KeyError(key)
+            return default
+        return value
+
+
+class LogStorage(Storage):
+    # Record layout: key length, value length (-1 for a delete), key, value.
+    HEADER = struct.Struct("<Ii")
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._lock = threading.RLock()
+        self._index = {}
+        self._key_index = SortedKeyIndex()
+        self._map = None
+        self._mapped_size = 0
+        self._end = 0
+        self._refresh()
+
+    def _remap(self, size):
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ) if size else None
+        self._mapped_size = size
+
+    def _refresh(self):
+        # Index records appended since the last look, including ones written
+        # by other processes sharing the same log file.
+        with self._lock:
+            size = os.fstat(self._fd).st_size
+            if size == self._end:
+                return
+            self._remap(size)
+            offset = self._end
+            while offset + self.HEADER.size <= size:
+                key_length, value_length = self.HEADER.unpack_from(self._map, offset)
+                record_end = (
+                    offset + self.HEADER.size + key_length + max(value_length, 0)
+                )
+                if record_end > size:
+                    break
+                key_start = offset + self.HEADER.size
+                key = self._map[key_start : key_start + key_length].decode()
+                if value_length < 0:
+                    if self._index.pop(key, None) is not None:
+                        self._key_index.discard(key)
+                else:
+                    if key not in self._index:
+                        self._key_index.add(key)
+                    self._index[key] = (key_start + key_length, value_length)
+                offset = record_end
+            self._end = offset
+
+    def _record(self, key, value):
+        encoded_key = key.encode()
+        if value is _missing:
+            return self.HEADER.pack(len(encoded_key), -1) + encoded_key
+        encoded_value = json_codec.dumps(value)
+        return (
+            self.HEADER.pack(len(encoded_key), len(encoded_value))
+            + encoded_key
+            + encoded_value
+        )
+
+    def _append(self, key, value):
+        os.write(self._fd, self._record(key, value))
+        self._refresh()
+
+    def _read(self, location):
+        offset, length = location
+        if offset + length > self._mapped_size:
+            self._refresh()
+        return json_codec.loads(self._map[offset : offset + length])
+
+    def __getitem__(self, key):
+        self._refresh()
+        with self._lock:
+            return self._read(self._index[key])
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._append(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._refresh()
+            if key not in self._index:
+                raise KeyError(key)
+            self._append(key, _missing)
+
+    def __contains__(self, key):
+        self._refresh()
+        return key in self._index
+
+    def __iter__(self):
+        self._refresh()
+        with self._lock:
+            return iter(list(self._index))
+
+    def __len__(self):
+        self._refresh()
+        return len(self._index)
+
+    def update(self, other=(), **kwargs):
+        records = b"".join(
+            self._record(key, value) for key, value in dict(other, **kwargs).items()
+        )
+        with self._lock:
+            os.write(self._fd, records)
+            self._refresh()
+
+    def replace(self, key, value):
+        with self._lock:
+            self._refresh()
+            if key not in self._index:
+                return False
+            self._append(key, value)
+            return True
+
+    def pop(self, key, default=_missing):
+        with self._lock:
+            self._refresh()
+            location = self._index.get(key)
+            if location is None:
+                if default is _missing:
+                    raise KeyError(key)
+                return default
+            value = self._read(location)
+            self._append(key, _missing)
+            return value
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            os.close(self._fd)
+
+
+class SQLiteStorage(Storage):
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS data_store "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def __getitem__(self, key):
+        row = (
+            self._connection()
+            .execute("SELECT value FROM data_store WHERE key = ?;", (key,))
+            .fetchone()
+        )
+        if row is None:
+            raise KeyError(key)
+        return json_codec.loads(row[0])
+
+    def __setitem__(self, key, value):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO data_store (key, value) VALUES (?, ?);",
+            (key, json_codec.dumps(value).decode()),
+        )
+
+    def __delitem__(self, key):
+        cursor = self._connection().execute(
+            "DELETE FROM data_store WHERE key = ?;", (key,)
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return (
+            self._connection()
+            .execute("SELECT 1 FROM data_store WHERE key = ?;", (key,))
+            .fetchone()
+            is not None
+        )
+
+    def __iter__(self):
+        rows = self._connection().execute("SELECT key FROM data_store;").fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self):
+        return (
+            self._connection().execute("SELECT COUNT(*) FROM data_store;").fetchone()[0]
+        )
+
+    def update(self, other=(), **kwargs):
+        items = dict(other, **kwargs)
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN;")
+            conn.executemany(
+                "INSERT OR REPLACE INTO data_store (key, value) VALUES (?, ?);",
+                [
+                    (key, json_codec.dumps(value).decode())
+                    for key, value in items.items()
+                ],
+            )
+
+    def replace(self, key, value):
+        cursor = self._connection().execute(
+            "UPDATE data_store SET value = ? WHERE key = ?;",
+            (json_codec.dumps(value).decode(), key),
+        )
+        return cursor.rowcount > 0
+
+    def get_many(self, keys):
+        conn = self._connection()
+        found = {}
+        for offset in range(0, len(keys), SQLITE_BATCH_SIZE):
+            chunk = keys[offset : offset + SQLITE_BATCH_SIZE]
+            rows = conn.execute(
+                "SELECT key, value FROM data_store WHERE key IN (%s);"
+                % ", ".join("?" * len(chunk)),
+                chunk,
+            )
+            found.update((key, json_codec.loads(value)) for key, value in rows)
+        return found, [key for key in keys if key not in found]
+
+    def replace_many(self, items):
+        updated, missing = [], []
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN;")
+            for key, value in items.items():
+                cursor = conn.execute(
+                    "UPDATE data_store SET value = ? WHERE key = ?;",
+                    (json_codec.dumps(value).decode(), key),
+                )
+                (updated if cursor.rowcount else missing).append(key)
+        return updated, missing
+
+    def delete_many(self, keys):
+        deleted, missing = [], []
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN;")
+            for key in keys:
+                cursor = conn.execute("DELETE FROM data_store WHERE key = ?;", (key,))
+                (deleted if cursor.rowcount else missing).append(key)
+        return deleted, missing
+
+    def scan(self, prefix="", start=None, end=None, limit=None):
+        start = max(start or prefix, prefix)
+        if prefix:
+            end = min(end, prefix_end(prefix)) if end else prefix_end(prefix)
+        query = "SELECT key, value FROM data_store WHERE key >= ?"
+        params = [start]
+        if end is not None:
+            query += " AND key < ?"
+            params.append(end)
+        query += " ORDER BY key LIMIT ?;"
+        params.append(-1 if limit is None else limit)
+        rows = self._connection().execute(query, params)
+        return [(key, json_codec.loads(value)) for key, value in rows]
+
+    def pop(self, key, default=_missing):
+        row = (
+            self._connection()
+            .execute("DELETE FROM data_store WHERE key = ? RETURNING value;", (key,))
+            .fetchone()
+        )
+        if row is None:
+            if default is _missing:
+                raise KeyError(key)
+            return default
+        return json_codec.loads(row[0])
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+BACKENDS = {
+    "dict": lambda path: DictStorage(),
+    "sharded": lambda path: ShardedDictStorage(),
+    "log": lambda path: LogStorage(path or "data_store.log"),
+    "sqlite": lambda path: SQLiteStorage(path or "data_store.sqlite3"),
+}
+
+
+def create_storage(backend="dict", path=None):
+    try:
+        factory = BACKENDS[backend]
+    except KeyError:
+        raise ValueError("Unknown storage backend: %s" % backend)
+    return factory(path)
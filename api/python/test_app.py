@@ -1,6 +1,8 @@
+import os
+
 import requests
 
-BASE_URL = "http://localhost:5000/api/data"
+BASE_URL = os.environ.get("API_BASE_URL", "http://localhost:5000/api/data")
 
 
 def test_post_data():
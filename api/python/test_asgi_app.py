@@ -0,0 +1,69 @@
+REQUESTS = [
+    ("POST", "/api/data", {"json": {"test_key": "test_value", "b": [1, "é"]}}),
+    ("GET", "/api/data/test_key", {}),
+    ("GET", "/api/data/missing", {}),
+    ("PUT", "/api/data/test_key", {"json": {"value": {"nested": True}}}),
+    ("PUT", "/api/data/missing", {"json": {"value": 1}}),
+    ("PUT", "/api/data/test_key", {"json": {"value": 1, "ttl": 60}}),
+    ("PUT", "/api/data/test_key?ttl=-1", {"json": {"value": 1}}),
+    ("PUT", "/api/data/test_key?ttl=nan", {"json": {"value": 1}}),
+    ("POST", "/api/data?ttl=inf", {"json": {"c": 1}}),
+    (
+        "POST",
+        "/api/data",
+        {"data": b'{"c": 1}', "headers": {"Content-Type": "text/plain"}},
+    ),
+    ("POST", "/api/data", {"data": b'{"c": 1}'}),
+    (
+        "PUT",
+        "/api/data/test_key",
+        {"data": b"1", "headers": {"Content-Type": "text/csv"}},
+    ),
+    (
+        "POST",
+        "/api/data/batch/get",
+        {"data": b"{}", "headers": {"Content-Type": "text/plain"}},
+    ),
+    (
+        "POST",
+        "/api/data/batch/put",
+        {"data": b"{", "headers": {"Content-Type": "application/json"}},
+    ),
+    ("POST", "/api/data", {"json": [1, 2]}),
+    ("POST", "/api/data", {"json": "text"}),
+    (
+        "POST",
+        "/api/data",
+        {"data": b"{", "headers": {"Content-Type": "application/json"}},
+    ),
+    ("PUT", "/api/data/test_key", {"json": {"val": 1}}),
+    ("PUT", "/api/data/test_key", {"json": [1]}),
+    (
+        "PUT",
+        "/api/data/test_key",
+        {"data": b"{", "headers": {"Content-Type": "application/json"}},
+    ),
+    ("POST", "/api/data/batch/get", {"json": {"keys": ["test_key", "missing"]}}),
+    ("POST", "/api/data/batch/put", {"json": {"b": 2, "missing": 3}}),
+    ("GET", "/api/data?limit=1", {}),
+    ("POST", "/api/data/import", {"data": b'{"c": 1}\nbad\n'}),
+    ("POST", "/api/data/batch/delete", {"json": {"keys": ["c", "missing"]}}),
+    ("DELETE", "/api/data/test_key", {}),
+    ("DELETE", "/api/data/test_key", {}),
+    ("GET", "/api/data/test_key", {}),
+    ("GET", "/api/stats", {}),
+]
+
+
+def test_responses_match_flask(clients):
+    flask_client, asgi_client = clients
+    for method, url, kwargs in REQUESTS:
+        expected = flask_client.open(url, method=method, **kwargs)
+        actual = asgi_client.request(
+            method,
+            url,
+            **{"content" if name == "data" else name: v for name, v in kwargs.items()},
+        )
+        assert actual.status_code == expected.status_code, (method, url)
+        assert actual.content == expected.data, (method, url)
+        assert actual.headers["content-type"] == expected.headers["content-type"]
@@ -0,0 +1,166 @@
+import pytest
+
+from bounded import BoundedStorage, LFUPolicy, LRUPolicy
+from storage import create_storage
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture(params=["dict", "sqlite"])
+def inner(request, tmp_path):
+    return create_storage(request.param, str(tmp_path / "data_store"))
+
+
+@pytest.fixture
+def store_options(clock):
+    return {"clock": clock}
+
+
+def test_ttl_expires_lazily(inner, clock):
+    store = BoundedStorage(inner, clock=clock)
+    store.update({"a": 1, "b": 2}, ttl=10)
+    clock.now = 9
+    assert store.get("a") == 1
+    clock.now = 10
+    assert store.get("a") is None
+    assert "b" not in store
+    assert "a" not in inner
+    assert store.stats()["expired_lazy"] == 2
+
+
+def test_ttl_expires_in_background(inner, clock):
+    store = BoundedStorage(inner, clock=clock)
+    store.set("a", 1, ttl=5)
+    store.set("b", 2, ttl=20)
+    store.set("c", 3)
+    assert store.replace("b", 20, ttl=1)
+    clock.now = 6
+    assert store.expire() == 2
+    assert sorted(inner) == ["c"]
+    assert store.stats()["expired_background"] == 2
+
+
+def test_scan_skips_expired_keys(inner, clock):
+    store = BoundedStorage(inner, clock=clock)
+    store.update({"k%d" % i: i for i in range(6)})
+    store.update({"k1": 1, "k2": 2, "k4": 4}, ttl=5)
+    clock.now = 5
+    assert store.scan(limit=2) == [("k0", 0), ("k3", 3)]
+    assert store.scan(start="k1", limit=3) == [("k3", 3), ("k5", 5)]
+    assert store.scan() == [("k0", 0), ("k3", 3), ("k5", 5)]
+
+
+def test_set_without_ttl_clears_expiry(clock):
+    store = BoundedStorage(create_storage("dict"), clock=clock)
+    store.set("a", 1, ttl=5)
+    store.set("a", 2)
+    clock.now = 10
+    assert store.expire() == 0
+    assert store["a"] == 2
+
+
+def test_lru_eviction(inner):
+    store = BoundedStorage(inner, max_keys=2, policy="lru")
+    store["a"] = 1
+    store["b"] = 2
+    store.get("a")
+    store["c"] = 3
+    assert sorted(store) == ["a", "c"]
+    assert store.stats()["evictions"] == 1
+
+
+def test_lfu_eviction(inner):
+    store = BoundedStorage(inner, max_keys=2, policy="lfu")
+    store["a"] = 1
+    store["b"] = 2
+    store.get("a")
+    store.get("a")
+    store.get("b")
+    store["c"] = 3
+    assert sorted(store) == ["a", "c"]
+
+
+def test_memory_limit_evicts():
+    store = BoundedStorage(create_storage("dict"), max_memory=2000)
+    for i in range(100):
+        store["key%d" % i] = "x" * 100
+    stats = store.stats()
+    assert stats["memory_estimate"] <= 2000
+    assert stats["evictions"] == 100 - stats["keys"]
+    assert "key99" in store
+
+
+@pytest.mark.parametrize("policy", ["lru", "lfu"])
+def test_batch_larger_than_the_limit_keeps_its_newest_keys(inner, policy):
+    store = BoundedStorage(inner, max_keys=3, policy=policy)
+    store["old"] = 0
+    store.update({"k%d" % i: i for i in range(4)})
+    assert sorted(store) == ["k1", "k2", "k3"]
+    assert store.stats()["keys"] == 3
+    assert store.stats()["evictions"] == 2
+
+
+def test_batch_larger_than_memory_limit_stays_within_it():
+    store = BoundedStorage(create_storage("dict"), max_memory=2000)
+    store.update({"key%02d" % i: "x" * 100 for i in range(100)})
+    assert store.stats()["memory_estimate"] <= 2000
+    assert "key99" in store and "key00" not in store
+
+
+def test_existing_keys_are_tracked(tmp_path):
+    inner = create_storage("sqlite", str(tmp_path / "data_store"))
+    inner.update({"a": 1, "b": 2, "c": 3})
+    store = BoundedStorage(inner, max_keys=2)
+    store["d"] = 4
+    assert len(store) == 2
+
+
+@pytest.mark.parametrize("policy", [LRUPolicy, LFUPolicy])
+def test_policy_remove(policy):
+    tracker = policy()
+    tracker.add("a")
+    tracker.add("b")
+    tracker.remove("a")
+    assert list(tracker.victims()) == ["b"]
+    tracker.remove("b")
+    assert list(tracker.victims()) == []
+
+
+def test_ttl_routes(client, clock):
+
+    assert client.post("/api/data?ttl=5", json={"a": 1}).status_code == 201
+    for ttl in ("zero", "0", "nan", "inf", "-inf"):
+        response = client.post("/api/data?ttl=%s" % ttl, json={"b": 1})
+        assert response.status_code == 400, ttl
+    assert client.put("/api/data/a", json={"value": 2, "ttl": "NaN"}).status_code == 400
+    assert client.put("/api/data/a", json={"value": 2, "ttl": 30}).status_code == 200
+    clock.now = 10
+    assert client.get("/api/data/a").get_json() == {"a": 2}
+    clock.now = 30
+    assert client.get("/api/data/a").status_code == 404
+
+    stats = client.get("/api/stats").get_json()
+    assert stats["expired_lazy"] == 1
+    assert stats["keys"] == 0
+
+
+def test_scan_route_pages_past_expired_keys(client, clock):
+    client.post("/api/data", json={"k%d" % i: i for i in range(5)})
+    client.put("/api/data/k1", json={"value": 1, "ttl": 5})
+    clock.now = 5
+
+    response = client.get("/api/data?limit=2")
+    assert response.get_json() == {"items": {"k0": 0, "k2": 2}, "next": "k3"}
+    response = client.get("/api/data?limit=2&start=k3")
+    assert response.get_json() == {"items": {"k3": 3, "k4": 4}, "next": None}
@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+
+import pytest
+
+from bounded import BoundedStorage
+from durable import DirectoryLocked, DurableStorage, WriteAheadLog
+from storage import create_storage
+
+
+def open_store(directory, fsync="always", **kwargs):
+    return DurableStorage(create_storage("dict"), str(directory), fsync=fsync, **kwargs)
+
+
+@pytest.mark.parametrize("fsync", ["always", "everysec", "no"])
+def test_recovers_from_wal(tmp_path, fsync):
+    store = open_store(tmp_path, fsync)
+    store.update({"a": 1, "b": 2, "c": 3})
+    store["d"] = {"nested": [1]}
+    assert store.replace("a", 10)
+    assert not store.replace("missing", 1)
+    del store["b"]
+    store.close()
+
+    recovered = open_store(tmp_path, fsync)
+    assert dict(recovered.items()) == {"a": 10, "c": 3, "d": {"nested": [1]}}
+    recovered.close()
+
+
+def test_directory_has_one_owner(tmp_path):
+    store = open_store(tmp_path)
+    store["a"] = 1
+    with pytest.raises(DirectoryLocked):
+        open_store(tmp_path)
+    store.close()
+
+    recovered = open_store(tmp_path)
+    assert dict(recovered.items()) == {"a": 1}
+    recovered.close()
+
+
+def test_snapshot_compacts_wal(tmp_path):
+    store = open_store(tmp_path)
+    store.update({"a": 1, "b": 2})
+    segment = store.snapshot()
+    store["c"] = 3
+    store.pop("a")
+    store.close()
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "LOCK",
+        "snapshot.json",
+        "wal-%08d.log" % segment,
+    ]
+    recovered = open_store(tmp_path)
+    assert dict(recovered.items()) == {"b": 2, "c": 3}
+    recovered.close()
+
+
+def test_torn_tail_is_discarded(tmp_path):
+    store = open_store(tmp_path)
+    store["a"] = 1
+    store["b"] = 2
+    store.close()
+    path = tmp_path / "wal-00000001.log"
+    size = path.stat().st_size
+    with open(path, "r+b") as f:
+        f.truncate(size - 3)
+
+    recovered = open_store(tmp_path)
+    assert dict(recovered.items()) == {"a": 1}
+    recovered["c"] = 3
+    recovered.close()
+    assert path.stat().st_size < size
+
+    recovered = open_store(tmp_path)
+    assert dict(recovered.items()) == {"a": 1, "c": 3}
+    recovered.close()
+
+
+def test_concurrent_writers_share_fsyncs(tmp_path):
+    store = open_store(tmp_path, "always")
+
+    def write(worker):
+        for i in range(50):
+            store["%d-%d" % (worker, i)] = i
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.stats()["group_commits"] < 400
+    store.close()
+
+    recovered = open_store(tmp_path)
+    assert len(recovered) == 400
+    recovered.close()
+
+
+def test_bounded_store_logs_evictions(tmp_path):
+    store = BoundedStorage(open_store(tmp_path), max_keys=2)
+    store["a"] = 1
+    store["b"] = 2
+    store["c"] = 3
+    assert "persistence" in store.stats()
+    store.close()
+
+    recovered = open_store(tmp_path)
+    assert sorted(recovered) == ["b", "c"]
+    recovered.close()
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_ttls_survive_restart(tmp_path, snapshot):
+    store = BoundedStorage(open_store(tmp_path))
+    store.set("sess", "x", ttl=0.2)
+    store.set("cart", "y", ttl=60)
+    store.update({"a": 1, "b": 2}, ttl=60)
+    store.set("b", 3)
+    assert store.replace("a", 10, ttl=0.2)
+    if snapshot:
+        store.inner.snapshot()
+    store.close()
+    time.sleep(0.3)
+
+    recovered = BoundedStorage(open_store(tmp_path))
+    assert recovered.get("sess") is None
+    assert recovered.get("a") is None
+    assert "sess" not in recovered.inner
+    assert dict(recovered.items()) == {"cart": "y", "b": 3}
+    assert recovered.stats()["expiring_keys"] == 1
+    assert 59 < recovered.inner.expirations()["cart"] - time.time() <= 60
+    recovered.close()
+
+
+def test_wal_record_round_trip(tmp_path):
+    path = tmp_path / "wal.log"
+    path.write_bytes(
+        WriteAheadLog.encode(["set", "a", 1]) + WriteAheadLog.encode(["delete", "a"])
+    )
+    assert list(WriteAheadLog.read(str(path))) == [["set", "a", 1], ["delete", "a"]]
@@ -0,0 +1,117 @@
+import pytest
+
+import app as api
+from bounded import BoundedStorage
+from http_cache import ResponseCache, etag_matches
+from storage import create_storage
+
+
+def test_versions_bump_on_write():
+    store = BoundedStorage(create_storage("dict"))
+    store["a"] = 1
+    _, first = store.get_versioned("a")
+    store.update({"a": 2})
+    _, second = store.get_versioned("a")
+    store.replace("a", 3)
+    value, third = store.get_versioned("a")
+    assert value == 3
+    assert first < second < third
+    del store["a"]
+    assert store.get_versioned("a") == (None, None)
+    store["a"] = 3
+    assert store.get_versioned("a")[1] > third
+
+
+def test_get_sends_etag_and_304(client):
+    client.post("/api/data", json={"a": "value"})
+    response = client.get("/api/data/a")
+    etag = response.headers["ETag"]
+    assert response.get_json() == {"a": "value"}
+
+    response = client.get("/api/data/a", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+
+    response = client.get(
+        "/api/data/a", headers={"If-None-Match": '"other", W/%s' % etag}
+    )
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize(
+    "method, url, body",
+    [
+        ("PUT", "/api/data/a", {"value": "new"}),
+        ("POST", "/api/data", {"a": "new"}),
+    ],
+)
+def test_write_invalidates_etag_and_cache(client, method, url, body):
+    client.post("/api/data", json={"a": "value"})
+    etag = client.get("/api/data/a").headers["ETag"]
+    client.open(url, method=method, json=body)
+
+    response = client.get("/api/data/a", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json() == {"a": "new"}
+    assert response.headers["ETag"] != etag
+
+
+def test_delete_then_recreate_changes_etag(client):
+    client.post("/api/data", json={"a": "value"})
+    etag = client.get("/api/data/a").headers["ETag"]
+    client.delete("/api/data/a")
+    assert client.get("/api/data/a", headers={"If-None-Match": etag}).status_code == 404
+    client.post("/api/data", json={"a": "value"})
+    assert client.get("/api/data/a", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_serialized_bodies_are_reused(client):
+    client.post("/api/data", json={"a": "value"})
+    for _ in range(3):
+        client.get("/api/data/a")
+    stats = client.get("/api/stats").get_json()["response_cache"]
+    assert stats["misses"] == 1
+    assert stats["hits"] == 2
+
+
+def test_cache_is_bounded_by_bytes():
+    cache = ResponseCache(max_bytes=250)
+    for version, key in enumerate("abc", 1):
+        cache.respond(key, version, None, lambda: (b"x" * 100, None))
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] == 200
+    cache.respond("d", 4, None, lambda: (b"x" * 300, None))
+    assert cache.stats()["bytes"] == 200
+
+
+def test_writes_drop_every_variant(client):
+    cache = api.response_cache
+    client.post("/api/data", json={"a": "x" * 2000, "b": 1})
+    for encoding in ("identity", "gzip"):
+        client.get("/api/data/a", headers={"Accept-Encoding": encoding})
+    client.get("/api/data/b")
+    assert cache.stats()["entries"] == 3
+
+    client.put("/api/data/a", json={"value": "new"})
+    assert cache.stats()["entries"] == 1
+    client.delete("/api/data/b")
+    assert cache.stats() == dict(cache.stats(), entries=0, bytes=0)
+
+
+def test_disabled_cache_uses_content_etag(client, monkeypatch):
+    monkeypatch.setattr(api, "response_cache", ResponseCache(enabled=False))
+    client.post("/api/data", json={"a": "value"})
+    first = client.get("/api/data/a").headers["ETag"]
+    client.put("/api/data/a", json={"value": "value"})
+    assert client.get("/api/data/a").headers["ETag"] == first
+    assert (
+        client.get("/api/data/a", headers={"If-None-Match": first}).status_code == 304
+    )
+
+
+def test_etag_matches():
+    assert etag_matches("*", '"a"')
+    assert etag_matches('W/"a"', '"a"')
+    assert not etag_matches(None, '"a"')
+    assert not etag_matches('"b"', '"a"')
@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+import app as api
+import json_codec
+from bounded import BoundedStorage
+from storage import create_storage
+
+SAMPLES = [
+    {"b": 1, "a": [1.5, None, True, "x"]},
+    {"key": "café", "nested": {"z": {}, "y": []}},
+    "plain",
+]
+
+
+@pytest.fixture(params=["stdlib", "orjson"])
+def library(request):
+    if request.param == "orjson" and json_codec.orjson is None:
+        pytest.skip("orjson is not installed")
+    previous = json_codec.library
+    json_codec.use(request.param)
+    yield request.param
+    json_codec.use(previous)
+
+
+@pytest.mark.parametrize("value", SAMPLES)
+def test_round_trip_is_compact_and_sorted(library, value):
+    encoded = json_codec.dumps(value)
+    assert isinstance(encoded, bytes)
+    assert json_codec.loads(encoded) == value
+    compact = {"separators": (",", ":"), "sort_keys": True}
+    assert encoded.decode() in (
+        json.dumps(value, **compact),
+        json.dumps(value, ensure_ascii=False, **compact),
+    )
+
+
+def test_invalid_json_raises_value_error(library):
+    for data in (b"", b"{", b"[1,]"):
+        with pytest.raises(ValueError):
+            json_codec.loads(data)
+
+
+def test_integers_past_64_bits_still_encode(library):
+    assert json.loads(json_codec.dumps({"big": 2**70})) == {"big": 2**70}
+
+
+BIG = b'{"big":123456789012345678901234567890}'
+
+
+def test_integers_past_64_bits_round_trip(library):
+    assert json_codec.loads(BIG) == {"big": 123456789012345678901234567890}
+    assert json_codec.loads(BIG.decode()) == {"big": 123456789012345678901234567890}
+    assert json_codec.dumps(json_codec.loads(BIG)) == BIG
+    assert json_codec.loads(b'{"id":"12345678901234567890123","n":1.5}') == {
+        "id": "12345678901234567890123",
+        "n": 1.5,
+    }
+
+
+@pytest.mark.parametrize("data", [b'{"n":NaN}', b"[Infinity]", b"[1e400]"])
+def test_non_finite_numbers_round_trip_or_are_refused(library, data):
+    if library == "orjson":
+        with pytest.raises(ValueError):
+            json_codec.loads(data)
+    else:
+        assert (
+            json_codec.dumps(json_codec.loads(data))
+            == json.dumps(json.loads(data), separators=(",", ":")).encode()
+        )
+
+
+def test_check_refuses_what_dumps_cannot_write_back(library):
+    json_codec.check({"a": [1, None, "x"]})
+    with pytest.raises(TypeError):
+        json_codec.check({"a": object()})
+    if library == "orjson":
+        with pytest.raises(ValueError):
+            json_codec.check({"n": float("nan")})
+
+
+def test_values_round_trip_through_the_api(library, client):
+    headers = {"Content-Type": "application/json"}
+    assert client.post("/api/data", data=BIG, headers=headers).status_code == 201
+    assert client.get("/api/data/big").data == BIG + b"\n"
+
+    response = client.post("/api/data", data=b'{"n":NaN}', headers=headers)
+    if library == "orjson":
+        assert response.status_code == 400
+        assert client.get("/api/data/n").status_code == 404
+    else:
+        assert response.status_code == 201
+        assert client.get("/api/data/n").data == b'{"n":NaN}\n'
+
+
+def test_dumps_entry_matches_dumps(library):
+    value = {"b": [1, 2], "a": "x"}
+    expected = json_codec.dumps({"k": value})
+    assert json_codec.dumps_entry("k", value) == expected
+    assert json_codec.dumps_entry("k", value, json_codec.dumps(value)) == expected
+
+
+def test_use_rejects_unknown_library():
+    with pytest.raises(ValueError):
+        json_codec.use("simplejson")
+
+
+def test_large_values_are_stored_encoded():
+    store = BoundedStorage(
+        create_storage("dict"), encoder=json_codec.dumps, encode_threshold=1000
+    )
+    store["small"] = "x"
+    store["large"] = "x" * 2000
+    assert store.get_encoded("small")[2] is None
+    value, version, encoded = store.get_encoded("large")
+    assert encoded == json_codec.dumps(value)
+    assert store.stats()["encoded_keys"] == 1
+
+    store.replace("large", "y")
+    assert store.get_encoded("large") == ("y", version + 1, None)
+    store.update({"large": ["z"] * 1000})
+    assert json_codec.loads(store.get_encoded("large")[2]) == ["z"] * 1000
+    del store["large"]
+    assert store.get_encoded("large") == (None, None, None)
+    assert store.stats()["encoded_keys"] == 0
+
+
+@pytest.mark.parametrize(
+    "store_options", [{"encoder": json_codec.dumps, "encode_threshold": 1000}]
+)
+def test_get_serves_pre_encoded_values(client):
+    value = {"text": "café" * 500, "items": list(range(100))}
+    client.post("/api/data", json={"a": value})
+
+    response = client.get("/api/data/a")
+    assert response.data == json_codec.dumps({"a": value}) + b"\n"
+    assert response.get_json() == {"a": value}
+    etag = response.headers["ETag"]
+    assert client.get("/api/data/a", headers={"If-None-Match": etag}).status_code == 304
+    # Encoded values are already bytes, so they stay out of the body cache.
+    assert api.response_cache.stats()["entries"] == 0
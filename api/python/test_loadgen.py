@@ -0,0 +1,42 @@
+import pytest
+
+from loadgen import Histogram, check_thresholds, parse_mix
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in range(1, 10001):
+        histogram.record(value / 1000000)
+    summary = histogram.summary()
+    assert summary["count"] == 10000
+    assert summary["min_us"] == 1
+    assert summary["max_us"] == 10000
+    for name, expected in (("p50", 5000), ("p99", 9900), ("p99.99", 9999)):
+        assert abs(summary["percentiles_us"][name] - expected) <= expected / 64
+    assert sum(count for _, count in summary["buckets"]) == 10000
+
+
+def test_histogram_merge():
+    first, second = Histogram(), Histogram()
+    first.record(0.001)
+    second.record(0.003)
+    first.merge(second)
+    assert first.count == 2
+    assert first.min == 1000
+    assert first.max == 3000
+
+
+def test_parse_mix():
+    assert parse_mix("get=80, put=20") == {"get": 80.0, "put": 20.0}
+    with pytest.raises(ValueError):
+        parse_mix("patch=1")
+
+
+def test_check_thresholds():
+    report = {
+        "latency": {"percentiles_us": {"p99": 5000}},
+        "throughput": 100.0,
+        "errors": 2,
+    }
+    assert check_thresholds(report, max_p99_ms=10, min_throughput=50) == []
+    assert len(check_thresholds(report, max_p99_ms=1, max_errors=0)) == 2
@@ -0,0 +1,65 @@
+import re
+import threading
+import time
+
+import app as api
+from metrics import RequestMetrics, sample_stacks
+
+
+def test_metrics_endpoint(client):
+    client.post("/api/data", json={"a": "value"})
+    client.get("/api/data/a")
+    client.get("/api/data/missing")
+
+    response = client.get("/metrics")
+    assert response.content_type.startswith("text/plain")
+    text = response.get_data(as_text=True)
+    route = 'method="GET",route="/api/data/<string:key>"'
+    assert 'kv_http_requests_total{%s,status="200"} 1' % route in text
+    assert 'kv_http_requests_total{%s,status="404"} 1' % route in text
+    assert 'kv_http_request_duration_seconds_bucket{%s,le="+Inf"} 2' % route in text
+    assert "kv_http_request_duration_seconds_count{%s} 2" % route in text
+    assert "kv_http_requests_in_flight 1" in text
+    assert "kv_data_store_keys 1" in text
+    assert re.search(r"^kv_data_store_memory_bytes \d+$", text, re.M)
+    assert 'kv_response_cache_total{outcome="misses"} 1' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = RequestMetrics()
+    for elapsed in (0.0001, 0.003, 0.2):
+        metrics.observe("GET", "/r", 200, time.perf_counter() - elapsed)
+    buckets = re.findall(r'le="([^"]+)"\} (\d+)', metrics.render())
+    counts = [int(count) for _, count in buckets]
+    assert counts == sorted(counts)
+    assert buckets[-1] == ("+Inf", "3")
+
+
+def test_profiler_is_opt_in(client, monkeypatch):
+    assert client.get("/debug/profile?seconds=0").status_code == 404
+
+    monkeypatch.setattr(api, "PROFILER_ENABLED", True)
+    response = client.get("/debug/profile?seconds=0.05&interval=0.01")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sample_stacks_collapsed_format():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    thread.start()
+    try:
+        output = sample_stacks(0.1, interval=0.005)
+    finally:
+        stop.set()
+        thread.join()
+    lines = output.splitlines()
+    assert all(re.match(r"^\S.* \d+$", line) for line in lines)
+    busy = [line for line in lines if line.startswith("busy;")]
+    assert busy
+    assert "busy_loop (test_metrics.py:" in busy[0]
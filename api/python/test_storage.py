@@ -0,0 +1,216 @@
+import threading
+
+import pytest
+
+from storage import SortedKeyIndex, create_storage
+
+BACKENDS = ["dict", "sharded", "log", "sqlite"]
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, tmp_path):
+    store = create_storage(request.param, str(tmp_path / "data_store"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def inner(store):
+    # The route tests run against every backend.
+    return store
+
+
+def test_mapping_contract(store):
+    store.update({"a": 1, "b": {"nested": [1, 2]}})
+    store["c"] = "three"
+    assert store["b"] == {"nested": [1, 2]}
+    assert "a" in store
+    assert "missing" not in store
+    assert sorted(store) == ["a", "b", "c"]
+    assert len(store) == 3
+    assert store.get("missing") is None
+
+    assert store.replace("a", 10)
+    assert not store.replace("missing", 10)
+    assert store["a"] == 10
+
+    assert store.pop("c") == "three"
+    assert store.pop("c", None) is None
+    del store["b"]
+    with pytest.raises(KeyError):
+        store["b"]
+    with pytest.raises(KeyError):
+        del store["b"]
+    assert dict(store.items()) == {"a": 10}
+
+
+def test_log_storage_rebuilds_index(tmp_path):
+    path = str(tmp_path / "data_store.log")
+    store = create_storage("log", path)
+    store.update({"a": 1, "b": 2})
+    store.replace("a", 3)
+    del store["b"]
+    store.close()
+
+    reopened = create_storage("log", path)
+    assert dict(reopened.items()) == {"a": 3}
+    reopened.close()
+
+
+def test_log_storage_sees_other_writers(tmp_path):
+    path = str(tmp_path / "data_store.log")
+    first = create_storage("log", path)
+    second = create_storage("log", path)
+    first["a"] = 1
+    assert second["a"] == 1
+    second.pop("a")
+    assert "a" not in first
+    first.close()
+    second.close()
+
+
+def test_routes(client):
+    response = client.post("/api/data", json={"test_key": "test_value"})
+    assert response.status_code == 201
+    assert response.get_json() == {"test_key": "test_value"}
+
+    response = client.get("/api/data/test_key")
+    assert response.status_code == 200
+    assert response.get_json() == {"test_key": "test_value"}
+
+    response = client.put("/api/data/test_key", json={"value": "new_value"})
+    assert response.status_code == 200
+    assert response.get_json() == {"test_key": "new_value"}
+
+    response = client.delete("/api/data/test_key")
+    assert response.status_code == 200
+    assert response.get_json() == {"message": "Deleted"}
+
+    assert client.get("/api/data/test_key").status_code == 404
+    assert client.put("/api/data/test_key", json={"value": 1}).status_code == 404
+    assert client.delete("/api/data/test_key").status_code == 404
+
+
+def test_scan(store):
+    store.update({"user:1": 1, "user:2": 2, "user:3": 3, "order:1": 4})
+    assert store.scan(prefix="user:") == [("user:1", 1), ("user:2", 2), ("user:3", 3)]
+    assert store.scan(prefix="user:", start="user:2", limit=1) == [("user:2", 2)]
+    assert store.scan(start="order:1", end="user:2") == [("order:1", 4), ("user:1", 1)]
+
+
+def test_scan_follows_writes(store):
+    expected = {"k%03d" % i: i for i in range(100)}
+    store.update(expected)
+    assert store.scan() == sorted(expected.items())
+    for i in range(0, 100, 3):
+        del store["k%03d" % i]
+        del expected["k%03d" % i]
+    store["k000"] = expected["k000"] = "again"
+    store["k050"] = expected["k050"] = "new"
+    store["a"] = expected["a"] = 0
+    assert store.scan() == sorted(expected.items())
+    assert store.scan(start="k010", limit=3) == [
+        ("k010", 10),
+        ("k011", 11),
+        ("k013", 13),
+    ]
+    for key in list(expected)[:80]:
+        store.pop(key)
+        del expected[key]
+    assert store.scan() == sorted(expected.items())
+
+
+def test_batch_routes(client):
+    client.post("/api/data", json={"a": 1, "b": 2, "c": 3})
+
+    response = client.post("/api/data/batch/get", json={"keys": ["a", "x", "c"]})
+    assert response.status_code == 200
+    assert response.get_json() == {"found": {"a": 1, "c": 3}, "missing": ["x"]}
+
+    response = client.post("/api/data/batch/put", json={"a": 10, "x": 0})
+    assert response.get_json() == {"updated": ["a"], "missing": ["x"]}
+    assert client.get("/api/data/a").get_json() == {"a": 10}
+    assert client.get("/api/data/x").status_code == 404
+
+    response = client.post("/api/data/batch/delete", json={"keys": ["b", "x"]})
+    assert response.get_json() == {"deleted": ["b"], "missing": ["x"]}
+
+    assert client.post("/api/data/batch/get", json={"keys": "a"}).status_code == 400
+    assert client.post("/api/data/batch/put", json=["a"]).status_code == 400
+
+
+def test_key_index_keeps_keys_added_while_compacting():
+    index = SortedKeyIndex(["a", "b", "c"])
+    for key in "bc":
+        index.discard(key)
+
+    def live_keys():
+        # A writer adds a key while the index is being rebuilt.
+        index.add("d")
+        return ["a"]
+
+    assert list(index.keys_from("", live_keys)) == ["a", "d"]
+    assert list(index.keys_from("", live_keys)) == ["a", "d"]
+
+
+@pytest.mark.parametrize("backend", ["dict", "sharded", "log"])
+def test_scans_and_deletes_run_concurrently(backend, tmp_path):
+    # Compacting the key index used to take the store's lock under the
+    # index lock, the opposite order to writers.
+    store = create_storage(backend, str(tmp_path / "data_store"))
+    errors = []
+
+    def run(action):
+        try:
+            for round in range(20):
+                action(round)
+        except Exception as e:
+            errors.append(e)
+
+    def write(round):
+        store.update({"k%03d" % i: round for i in range(200)})
+        for i in range(200):
+            store.pop("k%03d" % i, None)
+
+    def scan(round):
+        for _ in range(20):
+            store.scan(limit=50)
+
+    threads = [
+        threading.Thread(target=run, args=(action,), daemon=True)
+        for action in (write, write, scan, scan)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+        assert not thread.is_alive(), "scan and delete deadlocked"
+    assert errors == []
+    store["last"] = 1
+    assert store.scan() == [("last", 1)]
+    store.close()
+
+
+def test_scan_route_pages(client):
+    client.post("/api/data", json={"k%d" % i: i for i in range(5)})
+
+    response = client.get("/api/data?prefix=k&limit=2")
+    assert response.get_json() == {"items": {"k0": 0, "k1": 1}, "next": "k2"}
+    response = client.get("/api/data?prefix=k&limit=2&start=k4")
+    assert response.get_json() == {"items": {"k4": 4}, "next": None}
+
+
+def test_import_route(client):
+    body = b'{"a": 1}\n\n{"b": 2, "c": 3}\nnot json\n[1]\n'
+    response = client.post(
+        "/api/data/import", data=body, content_type="application/x-ndjson"
+    )
+    assert response.status_code == 201
+    assert response.get_json() == {
+        "imported": 3,
+        "errors": [
+            {"line": 4, "error": "Invalid JSON"},
+            {"line": 5, "error": "Expected an object"},
+        ],
+    }
+    assert client.get("/api/data/c").get_json() == {"c": 3}
@@ -0,0 +1,194 @@
+import gzip
+
+import pytest
+
+import wire_format
+
+msgpack = pytest.importorskip("msgpack")
+
+HEADERS = {"Accept": wire_format.MSGPACK, "Accept-Encoding": "identity"}
+
+
+@pytest.mark.parametrize(
+    "accept, accept_encoding, expected",
+    [
+        (None, None, (wire_format.JSON, None)),
+        ("application/msgpack", "gzip", (wire_format.MSGPACK, "gzip")),
+        ("application/x-msgpack, */*;q=0.1", "", (wire_format.MSGPACK, None)),
+        ("application/json, application/msgpack", "br", (wire_format.JSON, None)),
+        ("*/*", "gzip;q=0, identity", (wire_format.JSON, None)),
+        ("application/msgpack;q=0.5, application/json", None, (wire_format.JSON, None)),
+    ],
+)
+def test_negotiate(accept, accept_encoding, expected):
+    assert wire_format.negotiate(accept, accept_encoding) == expected
+
+
+def _msgpack_request(method, url, data=None):
+    kwargs = {"headers": dict(HEADERS)}
+    if data is not None:
+        kwargs["headers"]["Content-Type"] = wire_format.MSGPACK
+        kwargs["data"] = msgpack.packb(data)
+    return method, url, kwargs
+
+
+REQUESTS = [
+    _msgpack_request("POST", "/api/data", {"a": [1, "é", {"b": None}], "c": 1.5}),
+    _msgpack_request("GET", "/api/data/a"),
+    _msgpack_request("GET", "/api/data/missing"),
+    _msgpack_request("PUT", "/api/data/a", {"value": {"nested": True}}),
+    _msgpack_request("PUT", "/api/data/missing", {"value": 1}),
+    _msgpack_request("PUT", "/api/data/a?ttl=-1", {"value": 1}),
+    _msgpack_request("DELETE", "/api/data/a"),
+    _msgpack_request("DELETE", "/api/data/a"),
+]
+
+
+def test_msgpack_matches_between_servers(clients):
+    flask_client, asgi_client = clients
+    for method, url, kwargs in REQUESTS:
+        expected = flask_client.open(url, method=method, **kwargs)
+        actual = asgi_client.request(
+            method, url, headers=kwargs["headers"], content=kwargs.get("data")
+        )
+        assert actual.status_code == expected.status_code, (method, url)
+        assert actual.content == expected.data, (method, url)
+        assert actual.headers["content-type"] == wire_format.MSGPACK
+
+
+BATCH_REQUESTS = [
+    _msgpack_request("POST", "/api/data/batch/put", {"a": 2, "missing": 3}),
+    _msgpack_request("POST", "/api/data/batch/get", {"keys": ["a", "missing"]}),
+    _msgpack_request("POST", "/api/data/batch/delete", {"keys": ["a", "missing"]}),
+    _msgpack_request("POST", "/api/data/batch/get", {"keys": "a"}),
+    (
+        "POST",
+        "/api/data/batch/get",
+        {
+            "headers": {"Content-Type": wire_format.MSGPACK},
+            "data": msgpack.packb({"keys": ["a"]})[:-1],
+        },
+    ),
+    (
+        "POST",
+        "/api/data/batch/get",
+        {
+            "headers": {"Content-Type": "application/json", "Content-Encoding": "gzip"},
+            "data": gzip.compress(b'{"keys": ["a"]}'),
+        },
+    ),
+    (
+        "POST",
+        "/api/data",
+        {
+            "headers": {"Content-Type": wire_format.MSGPACK},
+            "data": b"\xc1",
+        },
+    ),
+    (
+        "POST",
+        "/api/data/batch/put",
+        {"headers": {"Content-Type": "text/plain"}, "data": b"{}"},
+    ),
+]
+
+
+def test_batch_and_errors_match_between_servers(clients):
+    flask_client, asgi_client = clients
+    flask_client.post("/api/data", json={"a": 1})
+    asgi_client.post("/api/data", json={"a": 1})
+    statuses = []
+    for method, url, kwargs in BATCH_REQUESTS:
+        expected = flask_client.open(url, method=method, **kwargs)
+        actual = asgi_client.request(
+            method, url, headers=kwargs["headers"], content=kwargs.get("data")
+        )
+        assert actual.status_code == expected.status_code, (method, url)
+        assert actual.content == expected.data, (method, url)
+        statuses.append(actual.status_code)
+    assert statuses == [200, 200, 200, 400, 400, 200, 400, 415]
+
+
+def test_msgpack_and_json_share_data(clients):
+    client = clients[0]
+    method, url, kwargs = _msgpack_request("POST", "/api/data", {"a": {"b": [1, 2]}})
+    assert client.open(url, method=method, **kwargs).status_code == 201
+    assert client.get("/api/data/a").get_json() == {"a": {"b": [1, 2]}}
+
+    client.put("/api/data/a", json={"value": "json"})
+    response = client.get("/api/data/a", headers=HEADERS)
+    assert msgpack.unpackb(response.data) == {"a": "json"}
+    assert response.headers["Vary"] == wire_format.VARY
+
+
+@pytest.mark.parametrize("encoding", wire_format.encodings())
+def test_large_bodies_are_compressed(clients, encoding):
+    client = clients[0]
+    value = "x" * 5000
+    client.post("/api/data", json={"a": value, "b": "small"})
+    plain = client.get("/api/data/a")
+
+    response = client.get("/api/data/a", headers={"Accept-Encoding": encoding})
+    assert response.headers["Content-Encoding"] == encoding
+    assert len(response.data) < 200
+    if encoding == "gzip":
+        assert gzip.decompress(response.data) == plain.data
+    # Each representation has its own strong ETag.
+    etag = response.headers["ETag"]
+    assert etag != plain.headers["ETag"]
+    cached = client.get(
+        "/api/data/a", headers={"Accept-Encoding": encoding, "If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+    assert client.get("/api/data/a", headers={"If-None-Match": etag}).status_code == 200
+
+    small = client.get("/api/data/b", headers={"Accept-Encoding": encoding})
+    assert "Content-Encoding" not in small.headers
+    assert small.get_json() == {"b": "small"}
+
+
+def test_compressed_request_bodies(clients):
+    flask_client, asgi_client = clients
+    body = gzip.compress(msgpack.packb({"a": "x" * 5000}))
+    headers = {"Content-Type": wire_format.MSGPACK, "Content-Encoding": "gzip"}
+    response = flask_client.post("/api/data", data=body, headers=headers)
+    assert response.status_code == 201
+    assert flask_client.get("/api/data/a").get_json() == {"a": "x" * 5000}
+    response = asgi_client.post("/api/data", content=body, headers=headers)
+    assert response.status_code == 201
+    assert asgi_client.get("/api/data/a").json() == {"a": "x" * 5000}
+
+
+@pytest.mark.parametrize(
+    "content_type, content_encoding, body",
+    [
+        (wire_format.MSGPACK, None, b"\x81"),
+        (wire_format.MSGPACK, None, b"\x81\xa1a\xc4\x01x"),
+        (wire_format.JSON, "gzip", b"not gzip"),
+        pytest.param(
+            wire_format.JSON,
+            "zstd",
+            b"not zstd",
+            marks=pytest.mark.skipif(
+                wire_format.zstandard is None, reason="zstandard is not installed"
+            ),
+        ),
+    ],
+)
+def test_invalid_bodies_are_rejected(clients, content_type, content_encoding, body):
+    flask_client, asgi_client = clients
+    headers = {"Content-Type": content_type}
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    response = flask_client.post("/api/data", data=body, headers=headers)
+    assert response.status_code == 400
+    response = asgi_client.post("/api/data", content=body, headers=headers)
+    assert response.status_code == 400
+    assert flask_client.get("/api/stats").get_json()["keys"] == 0
+
+
+def test_unsupported_media_type():
+    with pytest.raises(wire_format.UnsupportedMediaType):
+        wire_format.loads("text/plain", None, b"x")
+    with pytest.raises(wire_format.UnsupportedMediaType):
+        wire_format.loads(wire_format.JSON, "br", b"x")
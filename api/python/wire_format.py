@@ -0,0 +1,150 @@
+import gzip
+import zlib
+
+import json_codec
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+VARY = "Accept, Accept-Encoding"
+
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# Guards against small request bodies that expand without limit.
+MAX_DECOMPRESSED_BYTES = 64 * 1024 * 1024
+
+_DECODE_ERRORS = (ValueError, TypeError, EOFError, zlib.error)
+if msgpack is not None:
+    _DECODE_ERRORS += (msgpack.UnpackException,)
+if zstandard is not None:
+    _DECODE_ERRORS += (zstandard.ZstdError,)
+
+
+class UnsupportedMediaType(ValueError):
+    pass
+
+
+def encodings():
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def _preferences(header):
+    preferences = {}
+    for item in (header or "").split(","):
+        value, *params = item.split(";")
+        value = value.strip().lower()
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        preferences[value] = quality
+    return preferences
+
+
+def negotiate(accept, accept_encoding):
+    # JSON wins ties, so clients that don't ask for MessagePack never get it.
+    media_type = JSON
+    preferences = _preferences(accept)
+    if msgpack is not None and preferences:
+        msgpack_quality = max(preferences.get(name, 0.0) for name in MSGPACK_TYPES)
+        json_quality = max(
+            preferences.get(JSON, 0.0),
+            preferences.get("application/*", 0.0),
+            preferences.get("*/*", 0.0),
+        )
+        if msgpack_quality > json_quality:
+            media_type = MSGPACK
+    encoding = None
+    preferences = _preferences(accept_encoding)
+    best = 0.0
+    for name in encodings():
+        quality = preferences.get(name, 0.0)
+        if quality > best:
+            encoding, best = name, quality
+    return media_type, encoding
+
+
+def variant(media_type, encoding):
+    # Suffix for version ETags; each representation needs its own strong tag.
+    suffix = "-m" if media_type == MSGPACK else ""
+    return suffix + ("-" + encoding if encoding else "")
+
+
+def dumps(media_type, data):
+    if media_type == MSGPACK:
+        return msgpack.packb(data)
+    return json_codec.dumps(data) + b"\n"
+
+
+def dumps_entry(media_type, key, value, encoded=None):
+    if media_type == MSGPACK:
+        return msgpack.packb({key: value})
+    return json_codec.dumps_entry(key, value, encoded) + b"\n"
+
+
+def compress(body, encoding):
+    # Returns the body to send and the Content-Encoding it carries, if any.
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), encoding
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), encoding
+
+
+def _decompress(body, encoding):
+    if encoding == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = decompressor.decompress(body, MAX_DECOMPRESSED_BYTES)
+    elif encoding == "zstd" and zstandard is not None:
+        reader = zstandard.ZstdDecompressor().stream_reader(body)
+        data = reader.read(MAX_DECOMPRESSED_BYTES + 1)
+        chunk = data
+        while chunk and len(data) <= MAX_DECOMPRESSED_BYTES:
+            chunk = reader.read(MAX_DECOMPRESSED_BYTES + 1 - len(data))
+            data += chunk
+    else:
+        raise UnsupportedMediaType("Unsupported Content-Encoding: %s" % encoding)
+    if len(data) >= MAX_DECOMPRESSED_BYTES:
+        raise ValueError("Decompressed body too large")
+    return data
+
+
+def loads(content_type, content_encoding, body):
+    encoding = (content_encoding or "identity").strip().lower()
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type != JSON and (media_type not in MSGPACK_TYPES or msgpack is None):
+        raise UnsupportedMediaType("Unsupported Content-Type: %s" % media_type)
+    try:
+        if encoding != "identity":
+            body = _decompress(body, encoding)
+        if media_type == JSON:
+            return json_codec.loads(body)
+        data = msgpack.unpackb(body)
+        # Everything stored must still be readable as JSON.
+        json_codec.check(data)
+        return data
+    except UnsupportedMediaType:
+        raise
+    except _DECODE_ERRORS as e:
+        raise ValueError(str(e)) from e
+
+
+def is_plain_json(content_type, content_encoding):
+    return not content_encoding and (content_type or "").split(";")[0].strip() == JSON